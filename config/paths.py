@@ -49,6 +49,7 @@ PREMIUM_DB_FILE = os.path.join(SQLITE_DATA_DIR, "premium_system.db")
 USER_REQUESTS_DB_FILE = os.path.join(SQLITE_DATA_DIR, "user_requests.db")
 ANALYTICS_DB_FILE = os.path.join(SQLITE_DATA_DIR, "analytics.db")
 HISTORICAL_PRICES_DB_FILE = os.path.join(SQLITE_DATA_DIR, "historical_prices.db")
+FRESHNESS_DB_FILE = os.path.join(SQLITE_DATA_DIR, "freshness.db")
 
 # =============================================================================
 # Config and Auth Files
@@ -62,9 +63,13 @@ ACCOUNT_SESSION_FILE = os.path.join(PROJECT_ROOT, "account.session")
 # Cache/Result Files
 # =============================================================================
 STICKER_PRICE_RESULTS_FILE = os.path.join(CACHE_DIR, "sticker_price_results.json")
+STICKER_PRICE_SNAPSHOT_FILE = os.path.join(CACHE_DIR, "sticker_prices.snapshot")
 ALL_STATS_FILE = os.path.join(CACHE_DIR, "all_stats.json")
 STATS_FILE = os.path.join(CACHE_DIR, "stats.json")
 MRKT_COLLECTIONS_FILE = os.path.join(CACHE_DIR, "full_mrkt_collections.json")
+IMAGE_VARIANTS_DIR = os.path.join(CACHE_DIR, "image_variants")
+REFRESH_STATUS_FILE = os.path.join(CACHE_DIR, "refresh_status.json")
+PUBLICATION_MANIFEST_FILE = os.path.join(CACHE_DIR, "publication_manifest.json")
 
 # =============================================================================
 # Font Files
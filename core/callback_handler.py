@@ -464,7 +464,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
                 
                 # Generate a fresh gift card with timestamp to ensure it's new
                 from core.telegram_bot import generate_timestamped_card
-                card_path = generate_timestamped_card(gift_file_name)
+                card_path = await generate_timestamped_card(gift_file_name)
                 
                 if not card_path:
                     # If we failed to generate the card, update the message
@@ -661,7 +661,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         chat_id = update.effective_chat.id
         
         # Check if this is a premium group and use custom links
-        from premium_system import premium_system
+        from core.premium_system import premium_system
         buy_sell_link = DEFAULT_BUY_SELL_LINK
         portal_link = None
         
@@ -956,7 +956,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             return
         
         from telegram_bot import get_markets_submenu_keyboard
-        from premium_system import premium_system
+        from core.premium_system import premium_system
         chat_id = update.effective_chat.id
         links = premium_system.get_premium_links(chat_id)
         mrkt_link = links.get('mrkt_link') if links else DEFAULT_MRKT_LINK
@@ -1000,11 +1000,11 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             return
         
         from telegram_bot import get_gift_price_card_keyboard
-        from premium_system import premium_system
+        from core.premium_system import premium_system
         chat_id = update.effective_chat.id
         
         # Get the user who owns this message
-        from rate_limiter import get_message_owner
+        from core.rate_limiter import get_message_owner
         try:
             message_owner_id = get_message_owner(chat_id, query.message.message_id)
         except Exception as e:
@@ -1029,13 +1029,13 @@ async def regular_message_delete(update, context, user_id):
     
     try:
         # Check if this user can delete this message
-        from rate_limiter import can_delete_message, get_linked_messages
+        from core.rate_limiter import can_delete_message, get_linked_messages
         can_delete = can_delete_message(user_id, chat_id, message_id)
         logger.info(f"User {user_id} attempting to delete message {message_id}, allowed: {can_delete}")
         
         if can_delete:
             # Get any linked messages (like promotional messages) that should be deleted too
-            linked_messages = get_linked_messages(chat_id, message_id)
+            linked_messages = await asyncio.to_thread(get_linked_messages, chat_id, message_id)
             
             # Delete linked messages first
             for linked_message_id in linked_messages:
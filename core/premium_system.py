@@ -16,7 +16,6 @@ if os.path.basename(_project_root) != 'giftschart':
 if _project_root not in sys.path:
     sys.path.insert(0, _project_root)
 
-import sqlite3
 import logging
 import time
 import json
@@ -44,10 +43,16 @@ logger = logging.getLogger(__name__)
 
 # Import centralized paths
 from config.paths import PREMIUM_DB_FILE
+from core import storage
 
 # Premium subscription price (in Telegram Stars)
 PREMIUM_PRICE_STARS = 99  # Number of Stars to charge (99 Stars = 9900 units)
 
+# Upper bound on how long a cached premium lookup is trusted (seconds).
+# Writes made through PremiumSystem invalidate the cache immediately; the TTL
+# only bounds staleness from writes made by other processes.
+PREMIUM_CACHE_TTL = 300
+
 # Define link validation patterns
 def is_valid_link(link, kind, debug=False):
     """Validate referral links based on their type with flexible patterns and detailed debug info."""
@@ -179,11 +184,64 @@ def get_detailed_help_message(kind, invalid_link=None):
 
 class PremiumSystem:
     def __init__(self):
-        self.ensure_database()
+        # group_id -> (links dict or None, valid_until)
+        self._premium_cache = {}
+        self._premium_cache_lock = threading.Lock()
+        storage.run_migration(PREMIUM_DB_FILE, "premium_tables", self.ensure_database)
+    
+    def invalidate_premium_cache(self, group_id: int = None):
+        """Drop cached premium state for one group, or for all groups."""
+        with self._premium_cache_lock:
+            if group_id is None:
+                self._premium_cache.clear()
+            else:
+                self._premium_cache.pop(group_id, None)
+    
+    def _get_premium_state(self, group_id: int):
+        """Return the active subscription links for a group (None if not premium).
+        
+        Served from memory; an entry expires at the subscription's expires_at
+        or after PREMIUM_CACHE_TTL, whichever comes first.
+        """
+        now = time.time()
+        with self._premium_cache_lock:
+            entry = self._premium_cache.get(group_id)
+        if entry and entry[1] > now:
+            return entry[0]
+        
+        conn = storage.connect(PREMIUM_DB_FILE)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT mrkt_link, palace_link, tonnel_link, portal_link, is_active, expires_at
+        FROM premium_subscriptions 
+        WHERE group_id = ? AND is_active = 1 AND expires_at > ?
+        ''', (group_id, int(now)))
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        links = None
+        valid_until = now + PREMIUM_CACHE_TTL
+        if result:
+            mrkt_link, palace_link, tonnel_link, portal_link, is_active, expires_at = result
+            links = {
+                "mrkt_link": mrkt_link,
+                "palace_link": palace_link,
+                "tonnel_link": tonnel_link,
+                "portal_link": portal_link,
+                "is_active": bool(is_active),
+                "expires_at": expires_at
+            }
+            valid_until = min(valid_until, expires_at)
+        
+        with self._premium_cache_lock:
+            self._premium_cache[group_id] = (links, valid_until)
+        return links
     
     def ensure_database(self):
         """Ensure premium database exists with required tables."""
-        conn = sqlite3.connect(PREMIUM_DB_FILE)
+        conn = storage.connect(PREMIUM_DB_FILE)
         cursor = conn.cursor()
         
         # Create premium subscriptions table
@@ -265,7 +323,7 @@ class PremiumSystem:
     def create_payment_request(self, owner_id: int) -> dict:
         """Create a new payment request for premium subscription."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Generate unique payment ID
@@ -295,7 +353,7 @@ class PremiumSystem:
     def verify_payment_exists(self, payment_id: str) -> bool:
         """Check if a payment request exists and is not expired."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -315,7 +373,7 @@ class PremiumSystem:
     def mark_payment_completed(self, payment_id: str) -> bool:
         """Mark a payment as completed and move to payment history."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Get payment details
@@ -354,7 +412,7 @@ class PremiumSystem:
                                 tonnel_link: str = None, portal_link: str = None) -> bool:
         """Add a new premium subscription for a group."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Set expiration (30 days from now)
@@ -368,6 +426,7 @@ class PremiumSystem:
             
             conn.commit()
             conn.close()
+            self.invalidate_premium_cache(group_id)
             logger.info(f"Premium subscription added for owner {owner_id}, group {group_id}")
             return True
             
@@ -379,7 +438,7 @@ class PremiumSystem:
                            tonnel_link: str = None, portal_link: str = None) -> bool:
         """Update referral links for an existing premium subscription."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Build the update query dynamically based on which links are provided
@@ -416,6 +475,7 @@ class PremiumSystem:
             cursor.execute(query, params)
             conn.commit()
             conn.close()
+            self.invalidate_premium_cache(group_id)
             
             logger.info(f"Premium links updated for group {group_id}")
             return True
@@ -427,30 +487,8 @@ class PremiumSystem:
     def get_premium_links(self, group_id: int) -> dict:
         """Get custom referral links for a premium group."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT mrkt_link, palace_link, tonnel_link, portal_link, is_active, expires_at
-            FROM premium_subscriptions 
-            WHERE group_id = ? AND is_active = 1 AND expires_at > ?
-            ''', (group_id, int(time.time())))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                mrkt_link, palace_link, tonnel_link, portal_link, is_active, expires_at = result
-                return {
-                    "mrkt_link": mrkt_link,
-                    "palace_link": palace_link,
-                    "tonnel_link": tonnel_link,
-                    "portal_link": portal_link,
-                    "is_active": bool(is_active),
-                    "expires_at": expires_at
-                }
-            
-            return None
+            links = self._get_premium_state(group_id)
+            return dict(links) if links else None
             
         except Exception as e:
             logger.error(f"Error getting premium links: {e}")
@@ -459,18 +497,7 @@ class PremiumSystem:
     def is_group_premium(self, group_id: int) -> bool:
         """Check if a group has an active premium subscription."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT COUNT(*) FROM premium_subscriptions 
-            WHERE group_id = ? AND is_active = 1 AND expires_at > ?
-            ''', (group_id, int(time.time())))
-            
-            count = cursor.fetchone()[0]
-            conn.close()
-            
-            return count > 0
+            return self._get_premium_state(group_id) is not None
             
         except Exception as e:
             logger.error(f"Error checking premium status: {e}")
@@ -479,7 +506,7 @@ class PremiumSystem:
     def get_user_premium_groups(self, owner_id: int) -> list:
         """Get all premium groups owned by a user."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -513,7 +540,7 @@ class PremiumSystem:
     def is_group_refunded(self, group_id: int) -> bool:
         """Check if a group has been refunded before."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -532,7 +559,7 @@ class PremiumSystem:
     def can_request_refund(self, owner_id: int, group_id: int) -> dict:
         """Check if a user can request a refund for a group."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Check if group has active premium subscription
@@ -603,7 +630,7 @@ class PremiumSystem:
             if not eligibility["can_refund"]:
                 return {"success": False, "reason": eligibility["reason"]}
             
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Create refund record
@@ -637,7 +664,7 @@ class PremiumSystem:
     def process_refund(self, refund_id: int, processed_by: str) -> dict:
         """Process a refund request and mark it as completed."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             # Get refund details
@@ -671,6 +698,7 @@ class PremiumSystem:
             
             conn.commit()
             conn.close()
+            self.invalidate_premium_cache(group_id)
             
             return {
                 "success": True,
@@ -687,7 +715,7 @@ class PremiumSystem:
     def get_pending_refunds(self) -> list:
         """Get all pending refund requests."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -723,7 +751,7 @@ class PremiumSystem:
     def get_user_refunds(self, owner_id: int) -> list:
         """Get all refunds for a user."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -758,7 +786,7 @@ class PremiumSystem:
     def get_payment_details_for_refund(self, refund_id: int) -> dict:
         """Get payment details needed for Telegram Stars refund."""
         try:
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -819,7 +847,7 @@ async def handle_premium_button(update: Update, context: ContextTypes.DEFAULT_TY
 
         # Rate limiting for premium button clicks
         try:
-            from rate_limiter import can_user_use_command
+            from core.rate_limiter import can_user_use_command
             can_use, seconds_remaining = can_user_use_command(user_id, chat_id, "premium_button")
             
             if not can_use:
@@ -1493,7 +1521,7 @@ async def handle_premium_status(update: Update, context: ContextTypes.DEFAULT_TY
         # Query database for user's premium subscriptions
         try:
             logger.info(f"Connecting to premium_subscriptions.db")
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             
             logger.info(f"Executing query for owner_id={user_id}")
@@ -1614,7 +1642,7 @@ async def pending_payment_monitor(application, reminder_minutes=25, check_interv
     while True:
         try:
             now = int(time.time())
-            conn = sqlite3.connect(PREMIUM_DB_FILE)
+            conn = storage.connect(PREMIUM_DB_FILE)
             cursor = conn.cursor()
             # Reminders: payments expiring in 5 minutes (25 minutes old)
             reminder_time = now + (5 * 60)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Atomic, Versioned Publication of Price Files and Cards
+
+The refresh pipeline rewrites price JSON and card images while the bot and
+CDN are reading them. Everything published here is written to a temp file in
+the same directory and renamed over the target, so a reader sees either the
+old file or the new one, never a half-written one.
+
+Published files are recorded in a manifest (PUBLICATION_MANIFEST_FILE) with a
+content hash and the generation in which they last changed. The manifest's
+generation goes up by one for every publish that changes something, so
+readers can ask "has anything changed since generation N" without touching
+the files themselves:
+
+    generation = publication.current_generation()
+    ...
+    if publication.changed_since(generation, [STICKER_PRICE_RESULTS_FILE]):
+        ...
+
+load_json() caches parsed files until they are replaced. Each publish is a
+rename to a new inode, so the cache check is a single stat.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only threads in this process are serialized
+    fcntl = None
+
+from config.paths import PROJECT_ROOT, PUBLICATION_MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per hash update
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Serializes manifest updates between threads; the lock file does it between processes
+_manifest_lock = threading.Lock()
+
+# Last manifest read: (stat signature, manifest)
+_manifest_cache = (None, None)
+
+# Parsed JSON files: path -> (stat signature, data)
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+
+def _signature(path):
+    """Changes whenever the file is replaced or rewritten."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def hash_file(path):
+    """Short content hash of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_key(path):
+    return os.path.relpath(os.path.abspath(path), PROJECT_ROOT).replace(os.sep, "/")
+
+
+def _temp_path(path):
+    # Hidden and per-process, so concurrent writers and the CDN listing never collide with it
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+@contextmanager
+def _atomic_target(path):
+    """Yields a temp path to write; renames it over path if the block succeeds."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = _temp_path(path)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_json(path, data, indent=2):
+    """Atomically replace a JSON file (not recorded in the manifest)."""
+    with _atomic_target(path) as tmp_path:
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=indent)
+
+
+def write_bytes(path, data):
+    """Atomically replace a binary file (not recorded in the manifest)."""
+    with _atomic_target(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+
+def save_image(image, path, format='WEBP', **save_kwargs):
+    """Atomically replace an image file with a PIL image (not recorded in the manifest)."""
+    with _atomic_target(path) as tmp_path:
+        image.save(tmp_path, format, **save_kwargs)
+
+
+def publish_json(path, data, indent=2):
+    """Atomically write a JSON file and record it. Returns the manifest generation."""
+    write_json(path, data, indent=indent)
+    return record([path])
+
+
+@contextmanager
+def _locked_manifest():
+    with _manifest_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(PUBLICATION_MANIFEST_FILE), exist_ok=True)
+        with open(f"{PUBLICATION_MANIFEST_FILE}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest():
+    """The current manifest, re-read only when the manifest file was replaced."""
+    global _manifest_cache
+    signature = _signature(PUBLICATION_MANIFEST_FILE)
+    cached_signature, manifest = _manifest_cache
+    if signature is not None and signature == cached_signature:
+        return manifest
+    manifest = {"generation": 0, "files": {}}
+    if signature is not None:
+        try:
+            with open(PUBLICATION_MANIFEST_FILE, 'r') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading publication manifest: {e}")
+            return manifest
+    _manifest_cache = (signature, manifest)
+    return manifest
+
+
+def record(paths):
+    """Hash published files into the manifest.
+
+    Files whose content changed are stamped with a new generation; if nothing
+    changed, the generation stays the same. Returns the manifest generation.
+    """
+    hashes = {}
+    for path in paths:
+        try:
+            hashes[_manifest_key(path)] = (hash_file(path), os.path.getsize(path))
+        except OSError as e:
+            logger.warning(f"Not recording {path}: {e}")
+
+    with _locked_manifest():
+        manifest = read_manifest()
+        files = dict(manifest.get("files", {}))
+        changed = [key for key, (content_hash, _) in hashes.items()
+                   if files.get(key, {}).get("hash") != content_hash]
+        if not changed:
+            return manifest.get("generation", 0)
+
+        generation = manifest.get("generation", 0) + 1
+        now = time.time()
+        for key in changed:
+            content_hash, size = hashes[key]
+            files[key] = {"hash": content_hash, "size": size, "generation": generation, "published_at": now}
+        write_json(PUBLICATION_MANIFEST_FILE, {"generation": generation, "updated_at": now, "files": files})
+
+    logger.info(f"📦 Published generation {generation} ({len(changed)} changed file(s))")
+    return generation
+
+
+def current_generation():
+    return read_manifest().get("generation", 0)
+
+
+def file_generation(path):
+    """Generation in which path last changed, or None if it was never published."""
+    entry = read_manifest().get("files", {}).get(_manifest_key(path))
+    return entry["generation"] if entry else None
+
+
+def changed_since(generation, paths=None):
+    """Whether anything (or any of paths) was published after generation."""
+    if paths is None:
+        return current_generation() > generation
+    return any((file_generation(path) or 0) > generation for path in paths)
+
+
+def load_json(path, default=None):
+    """Parsed contents of a JSON file, cached until the file is replaced.
+
+    The cached object is shared between callers and must not be modified.
+    Returns default if the file is missing or unreadable.
+    """
+    signature = _signature(path)
+    if signature is None:
+        return default
+    with _json_cache_lock:
+        cached = _json_cache.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading {path}: {e}")
+        return default
+    with _json_cache_lock:
+        _json_cache[path] = (signature, data)
+    return data
@@ -1,12 +1,14 @@
 # Remove all Supabase imports and wrappers. Only keep the SQLite implementation and local function definitions.
 # (The rest of the file is already correct from previous steps.)
 
-import sqlite3
 import time
 import sys
 import os
+import atexit
 import logging
 import datetime
+import threading
+from collections import OrderedDict
 # Add project root to path for config imports
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _project_root not in sys.path:
@@ -14,7 +16,7 @@ if _project_root not in sys.path:
 
 # Integrate premium system for future flexibility (but always enforce rate limit)
 try:
-    from premium_system import premium_system
+    from core.premium_system import premium_system
 except ImportError:
     premium_system = None
 
@@ -27,11 +29,18 @@ logger = logging.getLogger(__name__)
 
 # Import centralized paths
 from config.paths import USER_REQUESTS_DB_FILE
+from core import storage
 DB_FILE = USER_REQUESTS_DB_FILE
 
 def ensure_tables_exist():
-    """Check if all required tables exist, and create them if they don't."""
-    conn = sqlite3.connect(DB_FILE)
+    """Check if all required tables exist, and create them if they don't.
+    
+    The schema check only runs once per process; later calls are free.
+    """
+    storage.run_migration(DB_FILE, "rate_limiter_tables", _create_tables)
+
+def _create_tables():
+    conn = storage.connect(DB_FILE)
     cursor = conn.cursor()
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user_requests'")
     if not cursor.fetchone():
@@ -77,6 +86,19 @@ def ensure_tables_exist():
             PRIMARY KEY (message_id, chat_id)
         )
         ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS linked_messages (
+            original_message_id INTEGER,
+            chat_id INTEGER,
+            linked_message_id INTEGER,
+            user_id INTEGER,
+            timestamp INTEGER,
+            PRIMARY KEY (original_message_id, chat_id, linked_message_id)
+        )
+    ''')
+    # Age-ordered indexes so cleanup walks only the expired range
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_owners_timestamp ON message_owners (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_linked_messages_timestamp ON linked_messages (timestamp)")
     conn.commit()
     conn.close()
     logger.info("All required tables verified or created")
@@ -94,32 +116,177 @@ def is_premium_group(chat_id):
             return False
     return False
 
+# How often buffered rate limit state is written to SQLite (seconds)
+PERSIST_INTERVAL_SECONDS = 5
+
+# In-memory entries older than this are dropped; every cooldown is shorter
+STATE_RETENTION_SECONDS = 3600
+
+
+class RateLimitStore:
+    """
+    In-memory last-request store keyed by (table, user_id, chat_id, name).
+    
+    Checks and updates are dict operations under a lock, so they are safe to
+    call from async handlers. Changes are written behind to SQLite in one
+    transaction every PERSIST_INTERVAL_SECONDS by a background thread.
+    """
+    
+    def __init__(self, persist_interval=PERSIST_INTERVAL_SECONDS):
+        self.persist_interval = persist_interval
+        self._last_seen = {}
+        self._dirty = {}
+        self._deletes = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._loaded = False
+    
+    def get(self, table, user_id, chat_id, name):
+        """Return the last recorded timestamp for a key, or None."""
+        self._ensure_started()
+        with self._lock:
+            return self._last_seen.get((table, user_id, chat_id, name))
+    
+    def record(self, table, user_id, chat_id, name, timestamp):
+        """Record a request in memory and queue it for persistence."""
+        self._ensure_started()
+        key = (table, user_id, chat_id, name)
+        with self._lock:
+            self._last_seen[key] = timestamp
+            self._dirty[key] = timestamp
+    
+    def check_and_record(self, table, user_id, chat_id, name, now, is_blocked):
+        """Atomically check a key against is_blocked(last, now) and record it if allowed.
+        
+        Returns the last timestamp when blocked, otherwise None.
+        """
+        self._ensure_started()
+        key = (table, user_id, chat_id, name)
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None and is_blocked(last, now):
+                return last
+            self._last_seen[key] = now
+            self._dirty[key] = now
+            return None
+    
+    def delete(self, table, user_id, chat_id, name=None):
+        """Forget one key, or every key for (user_id, chat_id) when name is None."""
+        self._ensure_started()
+        with self._lock:
+            for key in list(self._last_seen):
+                if key[0] == table and key[1] == user_id and key[2] == chat_id and (name is None or key[3] == name):
+                    self._last_seen.pop(key, None)
+                    self._dirty.pop(key, None)
+            self._deletes.append((table, user_id, chat_id, name))
+    
+    def flush(self):
+        """Write buffered changes to SQLite in a single transaction."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            deletes, self._deletes = self._deletes, []
+            cutoff = time.time() - STATE_RETENTION_SECONDS
+            for key in [k for k, ts in self._last_seen.items() if ts < cutoff]:
+                del self._last_seen[key]
+        
+        if not dirty and not deletes:
+            return 0
+        
+        try:
+            ensure_tables_exist()
+            conn = storage.connect(DB_FILE)
+            cursor = conn.cursor()
+            for table, user_id, chat_id, name in deletes:
+                column = "gift_name" if table == "user_requests" else "command_name"
+                if name is None:
+                    cursor.execute(f"DELETE FROM {table} WHERE user_id = ? AND chat_id = ?", (user_id, chat_id))
+                else:
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE user_id = ? AND chat_id = ? AND {column} = ?",
+                        (user_id, chat_id, name)
+                    )
+            
+            user_rows = []
+            command_rows = []
+            for (table, user_id, chat_id, name), timestamp in dirty.items():
+                minute = datetime.datetime.fromtimestamp(timestamp).minute
+                if table == "user_requests":
+                    user_rows.append((user_id, chat_id, name, minute))
+                else:
+                    command_rows.append((user_id, chat_id, name, minute, int(timestamp)))
+            
+            cursor.executemany(
+                "INSERT OR REPLACE INTO user_requests (user_id, chat_id, gift_name, minute) VALUES (?, ?, ?, ?)",
+                user_rows
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO command_requests (user_id, chat_id, command_name, minute, timestamp) VALUES (?, ?, ?, ?, ?)",
+                command_rows
+            )
+            conn.commit()
+            conn.close()
+            return len(dirty) + len(deletes)
+        except Exception as e:
+            logger.error(f"Error persisting rate limit state: {e}")
+            # Put the changes back so the next flush retries them
+            with self._lock:
+                for key, timestamp in dirty.items():
+                    self._dirty.setdefault(key, timestamp)
+                self._deletes[:0] = deletes
+            return 0
+    
+    def _ensure_started(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="rate-limit-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+        threading.Thread(target=self._load_recent_commands, daemon=True).start()
+    
+    def _load_recent_commands(self):
+        """Warm command cooldowns from disk so a restart does not reset them."""
+        try:
+            if not os.path.exists(DB_FILE):
+                return
+            ensure_tables_exist()
+            conn = storage.connect(DB_FILE)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT user_id, chat_id, command_name, timestamp FROM command_requests WHERE timestamp > ?",
+                (int(time.time()) - 60,)
+            )
+            rows = cursor.fetchall()
+            conn.close()
+            with self._lock:
+                for user_id, chat_id, command_name, timestamp in rows:
+                    self._last_seen.setdefault(("command_requests", user_id, chat_id, command_name), timestamp)
+            self._loaded = True
+        except Exception as e:
+            logger.error(f"Error loading rate limit state: {e}")
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.persist_interval)
+            self.flush()
+
+
+# Global rate limit store instance
+rate_limit_store = RateLimitStore()
+
 # NOTE: Premium groups are NOT exempt from rate limiting. Strict rate limiting applies to all groups.
 def can_user_request(user_id, chat_id, gift_name, cooldown_seconds=None):
-    now = datetime.datetime.now()
-    current_minute = now.minute
-    current_second = now.second
-    if not os.path.exists(DB_FILE):
-        init_db()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT minute FROM user_requests WHERE user_id = ? AND chat_id = ? AND gift_name = ?", 
-        (user_id, chat_id, gift_name)
-    )
-    result = cursor.fetchone()
-    if result:
-        last_minute = result[0]
-        if last_minute == current_minute:
-            seconds_remaining = 60 - current_second
-            conn.close()
-            return False, seconds_remaining
-    cursor.execute(
-        "INSERT OR REPLACE INTO user_requests (user_id, chat_id, gift_name, minute) VALUES (?, ?, ?, ?)",
-        (user_id, chat_id, gift_name, current_minute)
+    """One request per gift per user per clock minute. In-memory; never touches disk."""
+    now = time.time()
+    last = rate_limit_store.check_and_record(
+        "user_requests", user_id, chat_id, gift_name, now,
+        lambda last, now: int(last // 60) == int(now // 60)
     )
-    conn.commit()
-    conn.close()
+    if last is not None:
+        seconds_remaining = 60 - datetime.datetime.fromtimestamp(now).second
+        return False, seconds_remaining
     return True, 0
 
 def can_user_use_command(user_id, chat_id, command_name):
@@ -131,113 +298,176 @@ def can_user_use_command(user_id, chat_id, command_name):
     else:
         cooldown_seconds = 60  # 60 seconds for other commands
     
-    if not os.path.exists(DB_FILE):
-        init_db()
-    else:
-        ensure_tables_exist()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
     # Use timestamp-based rate limiting for more precision
-    cursor.execute(
-        "SELECT timestamp FROM command_requests WHERE user_id = ? AND chat_id = ? AND command_name = ?", 
-        (user_id, chat_id, command_name)
+    last_timestamp = rate_limit_store.check_and_record(
+        "command_requests", user_id, chat_id, command_name, current_time,
+        lambda last, now: now - last < cooldown_seconds
     )
-    result = cursor.fetchone()
-    if result:
-        last_timestamp = result[0]
-        time_diff = current_time - last_timestamp
-        if time_diff < cooldown_seconds:
-            seconds_remaining = cooldown_seconds - time_diff
-            conn.close()
-            logger.info(f"Rate limit hit for user {user_id}, command {command_name}: {seconds_remaining}s remaining")
-            return False, seconds_remaining
+    if last_timestamp is not None:
+        seconds_remaining = cooldown_seconds - (current_time - int(last_timestamp))
+        logger.info(f"Rate limit hit for user {user_id}, command {command_name}: {seconds_remaining}s remaining")
+        return False, seconds_remaining
     
-    # Update with current timestamp
-    cursor.execute(
-        "INSERT OR REPLACE INTO command_requests (user_id, chat_id, command_name, minute, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (user_id, chat_id, command_name, datetime.datetime.now().minute, current_time)
-    )
-    conn.commit()
-    conn.close()
     logger.info(f"Rate limit passed for user {user_id}, command {command_name}")
     return True, 0
 
 def reset_user_cooldown(user_id, chat_id, gift_name=None):
-    if not os.path.exists(DB_FILE):
-        return
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    if gift_name:
-        cursor.execute(
-            "DELETE FROM user_requests WHERE user_id = ? AND chat_id = ? AND gift_name = ?",
-            (user_id, chat_id, gift_name)
-        )
-    else:
-        cursor.execute(
-            "DELETE FROM user_requests WHERE user_id = ? AND chat_id = ?",
-            (user_id, chat_id)
-        )
-    conn.commit()
-    conn.close()
+    rate_limit_store.delete("user_requests", user_id, chat_id, gift_name)
+
+# Buffered ownership rows are written when this many are pending...
+OWNERSHIP_FLUSH_ROWS = 200
+
+# ...or after this long, whichever comes first (milliseconds)
+OWNERSHIP_FLUSH_INTERVAL_MS = 500
+
+# Number of (chat_id, message_id) owners kept in memory
+OWNER_CACHE_SIZE = 10000
+
+# Rows removed per transaction by cleanup_old_message_ownership
+CLEANUP_CHUNK_ROWS = 5000
+
+
+class MessageOwnershipWriter:
+    """
+    Buffers message_owners and linked_messages inserts and writes them in one
+    transaction every OWNERSHIP_FLUSH_INTERVAL_MS or OWNERSHIP_FLUSH_ROWS rows.
+    
+    Owners of recently registered or looked-up messages are kept in an LRU,
+    so ownership checks on the delete button rarely reach SQLite.
+    """
+    
+    def __init__(self, flush_rows=OWNERSHIP_FLUSH_ROWS, flush_interval_ms=OWNERSHIP_FLUSH_INTERVAL_MS,
+                 cache_size=OWNER_CACHE_SIZE):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.cache_size = cache_size
+        self._owner_rows = []
+        self._linked_rows = []
+        self._owners = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+    
+    def add_owner(self, message_id, chat_id, user_id, timestamp):
+        with self._lock:
+            self._owner_rows.append((message_id, chat_id, user_id, timestamp))
+            self._cache_owner((chat_id, message_id), user_id, timestamp)
+            pending = len(self._owner_rows) + len(self._linked_rows)
+        self._after_add(pending)
+    
+    def add_linked(self, original_message_id, chat_id, linked_message_id, user_id, timestamp):
+        with self._lock:
+            self._linked_rows.append((original_message_id, chat_id, linked_message_id, user_id, timestamp))
+            pending = len(self._owner_rows) + len(self._linked_rows)
+        self._after_add(pending)
+    
+    def cached_owner(self, chat_id, message_id):
+        """Return (found, user_id) from the LRU without touching disk."""
+        key = (chat_id, message_id)
+        with self._lock:
+            entry = self._owners.get(key)
+            if entry is None:
+                return False, None
+            self._owners.move_to_end(key)
+            return True, entry[0]
+    
+    def remember_owner(self, chat_id, message_id, user_id, timestamp):
+        with self._lock:
+            self._cache_owner((chat_id, message_id), user_id, timestamp)
+    
+    def pending_linked(self, chat_id, original_message_id):
+        """Linked message ids registered for a message but not yet written."""
+        with self._lock:
+            return [linked_id for original_id, linked_chat_id, linked_id, _, _ in self._linked_rows
+                    if original_id == original_message_id and linked_chat_id == chat_id]
+    
+    def forget_older_than(self, cutoff_timestamp):
+        with self._lock:
+            for key in [k for k, (_, ts) in self._owners.items() if ts < cutoff_timestamp]:
+                del self._owners[key]
+    
+    def flush(self):
+        """Write all buffered rows in a single transaction. Returns rows written."""
+        with self._write_lock:
+            with self._lock:
+                owner_rows, self._owner_rows = self._owner_rows, []
+                linked_rows, self._linked_rows = self._linked_rows, []
+            if not owner_rows and not linked_rows:
+                return 0
+            
+            try:
+                ensure_tables_exist()
+                conn = storage.connect(DB_FILE)
+                cursor = conn.cursor()
+                cursor.executemany("INSERT OR REPLACE INTO message_owners VALUES (?, ?, ?, ?)", owner_rows)
+                cursor.executemany("INSERT OR REPLACE INTO linked_messages VALUES (?, ?, ?, ?, ?)", linked_rows)
+                conn.commit()
+                conn.close()
+                logger.info(f"Registered {len(owner_rows)} messages and {len(linked_rows)} linked messages")
+                return len(owner_rows) + len(linked_rows)
+            except Exception as e:
+                logger.error(f"Error writing message ownership batch: {e}")
+                with self._lock:
+                    self._owner_rows[:0] = owner_rows
+                    self._linked_rows[:0] = linked_rows
+                return 0
+    
+    def _cache_owner(self, key, user_id, timestamp):
+        self._owners[key] = (user_id, timestamp)
+        self._owners.move_to_end(key)
+        while len(self._owners) > self.cache_size:
+            self._owners.popitem(last=False)
+    
+    def _after_add(self, pending):
+        self._ensure_started()
+        if pending >= self.flush_rows:
+            self._wakeup.set()
+    
+    def _ensure_started(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="ownership-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+    
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+# Global ownership writer instance
+message_writer = MessageOwnershipWriter()
+
 
 def register_message(user_id, chat_id, message_id):
-    if not os.path.exists(DB_FILE):
-        init_db()
-    else:
-        ensure_tables_exist()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR REPLACE INTO message_owners VALUES (?, ?, ?, ?)",
-        (message_id, chat_id, user_id, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
-    logger.info(f"Registered message {message_id} in chat {chat_id} to user {user_id}")
+    message_writer.add_owner(message_id, chat_id, user_id, int(time.time()))
 
 def register_linked_message(user_id, chat_id, original_message_id, linked_message_id):
     """Register a linked message (like promotion message) that should be deleted with original message"""
-    if not os.path.exists(DB_FILE):
-        init_db()
-    else:
-        ensure_tables_exist()
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Ensure linked_messages table exists
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS linked_messages (
-            original_message_id INTEGER,
-            chat_id INTEGER,
-            linked_message_id INTEGER,
-            user_id INTEGER,
-            timestamp INTEGER,
-            PRIMARY KEY (original_message_id, chat_id, linked_message_id)
-        )
-    ''')
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO linked_messages VALUES (?, ?, ?, ?, ?)",
-        (original_message_id, chat_id, linked_message_id, user_id, int(time.time()))
-    )
-    conn.commit()
-    conn.close()
-    logger.info(f"Registered linked message {linked_message_id} to original {original_message_id} in chat {chat_id}")
+    message_writer.add_linked(original_message_id, chat_id, linked_message_id, user_id, int(time.time()))
 
 def get_linked_messages(chat_id, original_message_id):
-    """Get all linked messages for a given original message"""
+    """Get all linked messages for a given original message (reads SQLite; keep off the event loop)"""
+    # Links registered moments ago may still be buffered; read them without forcing a write
+    pending = message_writer.pending_linked(chat_id, original_message_id)
+    
     if not os.path.exists(DB_FILE):
-        return []
+        return pending
     
-    conn = sqlite3.connect(DB_FILE)
+    conn = storage.connect(DB_FILE)
     cursor = conn.cursor()
     
     # Check if table exists
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='linked_messages'")
     if not cursor.fetchone():
         conn.close()
-        return []
+        return pending
     
     cursor.execute(
         "SELECT linked_message_id FROM linked_messages WHERE original_message_id = ? AND chat_id = ?",
@@ -245,7 +475,29 @@ def get_linked_messages(chat_id, original_message_id):
     )
     linked_messages = [row[0] for row in cursor.fetchall()]
     conn.close()
-    return linked_messages
+    return linked_messages + [linked_id for linked_id in pending if linked_id not in linked_messages]
+
+def _lookup_owner(chat_id, message_id):
+    """Read-through owner lookup: LRU first, then SQLite. Returns user_id or None."""
+    found, owner_id = message_writer.cached_owner(chat_id, message_id)
+    if found:
+        return owner_id
+    
+    if not os.path.exists(DB_FILE):
+        return None
+    ensure_tables_exist()
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT user_id, timestamp FROM message_owners WHERE message_id = ? AND chat_id = ?",
+        (message_id, chat_id)
+    )
+    result = cursor.fetchone()
+    conn.close()
+    if not result:
+        return None
+    message_writer.remember_owner(chat_id, message_id, result[0], result[1])
+    return result[0]
 
 def can_delete_message(user_id, chat_id, message_id):
     """
@@ -260,33 +512,12 @@ def can_delete_message(user_id, chat_id, message_id):
         bool: True if user is allowed to delete the message
     """
     try:
-        # Initialize the database if it doesn't exist
-        if not os.path.exists(DB_FILE):
-            init_db()
-            # New DB won't have any messages registered, but we'll allow deletion for compatibility
-            logger.info(f"DB not found, allowing deletion of message {message_id}")
-            return True
-        else:
-            # Ensure the message_owners table exists
-            ensure_tables_exist()
+        owner_id = _lookup_owner(chat_id, message_id)
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if this message is registered
-        cursor.execute(
-            "SELECT user_id FROM message_owners WHERE message_id = ? AND chat_id = ?",
-            (message_id, chat_id)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        if not result:
+        if owner_id is None:
             # Message not in database, allow deletion for compatibility with older messages
             logger.info(f"Message {message_id} not found in database, allowing deletion")
             return True
-            
-        owner_id = result[0]
         
         # Check if this user is the owner of the message
         # We could add a check for admin status here as well, but for now we'll just check for ownership
@@ -304,26 +535,26 @@ def can_delete_message(user_id, chat_id, message_id):
 def get_message_owner(chat_id, message_id):
     """Get the user ID of the message owner."""
     try:
-        if not os.path.exists(DB_FILE):
-            init_db()
-            return None
-        else:
-            ensure_tables_exist()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT user_id FROM message_owners WHERE message_id = ? AND chat_id = ?",
-            (message_id, chat_id)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            return result[0]
-        return None
+        return _lookup_owner(chat_id, message_id)
     except Exception as e:
         logger.error(f"Error getting message owner: {e}")
         return None
 
+def _delete_expired(cursor, table, cutoff_timestamp):
+    """Delete expired rows in index-ordered chunks so each transaction stays short."""
+    deleted = 0
+    while True:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE rowid IN "
+            f"(SELECT rowid FROM {table} WHERE timestamp < ? ORDER BY timestamp LIMIT ?)",
+            (cutoff_timestamp, CLEANUP_CHUNK_ROWS)
+        )
+        chunk = cursor.rowcount
+        cursor.connection.commit()
+        deleted += chunk
+        if chunk < CLEANUP_CHUNK_ROWS:
+            return deleted
+
 def cleanup_old_message_ownership(max_age_hours=24):
     """
     Clean up old message ownership records to prevent database bloat.
@@ -336,29 +567,18 @@ def cleanup_old_message_ownership(max_age_hours=24):
             return
         
         ensure_tables_exist()
-        conn = sqlite3.connect(DB_FILE)
+        conn = storage.connect(DB_FILE)
         cursor = conn.cursor()
         
         # Calculate cutoff timestamp (current time - max_age_hours)
         cutoff_timestamp = int(time.time()) - (max_age_hours * 3600)
         
-        # Delete old message ownership records
-        cursor.execute(
-            "DELETE FROM message_owners WHERE timestamp < ?",
-            (cutoff_timestamp,)
-        )
-        deleted_count = cursor.rowcount
-        
-        # Delete old linked messages records
-        cursor.execute(
-            "DELETE FROM linked_messages WHERE timestamp < ?",
-            (cutoff_timestamp,)
-        )
-        deleted_linked_count = cursor.rowcount
-        
-        conn.commit()
+        deleted_count = _delete_expired(cursor, "message_owners", cutoff_timestamp)
+        deleted_linked_count = _delete_expired(cursor, "linked_messages", cutoff_timestamp)
         conn.close()
         
+        message_writer.forget_older_than(cutoff_timestamp)
+        
         if deleted_count > 0 or deleted_linked_count > 0:
             logger.info(f"Cleaned up {deleted_count} old message ownership records and {deleted_linked_count} linked message records")
         
@@ -376,41 +596,20 @@ def retroactively_register_message(user_id, chat_id, message_id):
         message_id: ID of the message to register
     """
     try:
-        if not os.path.exists(DB_FILE):
-            init_db()
-        else:
-            ensure_tables_exist()
+        existing_owner = get_message_owner(chat_id, message_id)
         
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if message already exists
-        cursor.execute(
-            "SELECT user_id FROM message_owners WHERE message_id = ? AND chat_id = ?",
-            (message_id, chat_id)
-        )
-        existing = cursor.fetchone()
-        
-        if existing:
+        if existing_owner is not None:
             # Message already registered, update ownership if different
-            if existing[0] != user_id:
-                cursor.execute(
-                    "UPDATE message_owners SET user_id = ?, timestamp = ? WHERE message_id = ? AND chat_id = ?",
-                    (user_id, int(time.time()), message_id, chat_id)
-                )
-                logger.info(f"Updated ownership of message {message_id} from user {existing[0]} to user {user_id}")
+            if existing_owner != user_id:
+                message_writer.add_owner(message_id, chat_id, user_id, int(time.time()))
+                logger.info(f"Updated ownership of message {message_id} from user {existing_owner} to user {user_id}")
             else:
                 logger.info(f"Message {message_id} already owned by user {user_id}")
         else:
             # Register new message ownership
-            cursor.execute(
-                "INSERT INTO message_owners VALUES (?, ?, ?, ?)",
-                (message_id, chat_id, user_id, int(time.time()))
-            )
+            message_writer.add_owner(message_id, chat_id, user_id, int(time.time()))
             logger.info(f"Retroactively registered message {message_id} in chat {chat_id} to user {user_id}")
         
-        conn.commit()
-        conn.close()
         return True
         
     except Exception as e:
@@ -425,11 +624,12 @@ def get_message_ownership_stats():
         dict: Statistics about message ownership records
     """
     try:
+        message_writer.flush()
         if not os.path.exists(DB_FILE):
             return {"total_messages": 0, "total_linked_messages": 0}
         
         ensure_tables_exist()
-        conn = sqlite3.connect(DB_FILE)
+        conn = storage.connect(DB_FILE)
         cursor = conn.cursor()
         
         # Count message ownership records
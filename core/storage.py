@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite Storage
+
+Hands out one long-lived connection per thread and database file instead of
+opening a new connection on every call. Connections use WAL journaling with
+synchronous=NORMAL and a busy timeout, so the bot, schedulers and CDN can read
+and write the same files without "database is locked" stalls.
+
+Callers keep the usual pattern:
+
+    conn = storage.connect(PREMIUM_DB_FILE)
+    cursor = conn.cursor()
+    ...
+    conn.commit()
+    conn.close()
+
+close() only ends the current transaction; the connection stays open for the
+next call on the same thread.
+
+Every coroutine on an event loop runs on the loop's thread and so shares one
+connection per database. Never hold a connection with uncommitted writes
+across an await: connect, write, commit and close between two awaits (or do
+the work in asyncio.to_thread). A transaction left open is rolled back, with
+a warning, by the next connect() on that thread.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How long a writer waits for a lock held by another process (seconds)
+BUSY_TIMEOUT_SECONDS = 10
+
+# Per-thread {db_file: SharedConnection}
+_local = threading.local()
+
+# (db_file, name) pairs whose migration already ran in this process
+_migrations_done = set()
+_migrations_lock = threading.Lock()
+
+
+class SharedConnection(sqlite3.Connection):
+    """A thread's reusable connection. close() rolls back instead of closing."""
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+def _open(db_file):
+    directory = os.path.dirname(db_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_SECONDS, factory=SharedConnection)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_SECONDS * 1000)}")
+    return conn
+
+
+def connect(db_file):
+    """Return this thread's connection to db_file, opening it on first use."""
+    db_file = os.path.abspath(db_file)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(db_file)
+    if conn is not None and not os.path.exists(db_file):
+        # The file was removed underneath us; start over with a fresh one
+        conn.really_close()
+        conn = None
+    if conn is None:
+        conn = connections[db_file] = _open(db_file)
+    elif conn.in_transaction:
+        # Leftover from a caller that failed before commit/close, or one that
+        # awaited while holding the connection
+        logger.warning(f"Rolling back uncommitted changes left on the shared connection to "
+                       f"{os.path.basename(db_file)} (not committed, or held across an await)")
+        conn.rollback()
+    conn.row_factory = None
+    return conn
+
+
+def close_thread_connections():
+    """Close every connection opened by the calling thread."""
+    connections = getattr(_local, "connections", None) or {}
+    for conn in connections.values():
+        try:
+            conn.really_close()
+        except Exception as e:
+            logger.error(f"Error closing SQLite connection: {e}")
+    connections.clear()
+
+
+def run_migration(db_file, name, migrate):
+    """Run migrate() for db_file once per process; later calls are free.
+
+    The migration is retried on the next call if it raises.
+    """
+    key = (os.path.abspath(db_file), name)
+    if key in _migrations_done and os.path.exists(key[0]):
+        return
+    with _migrations_lock:
+        if key in _migrations_done and os.path.exists(key[0]):
+            return
+        migrate()
+        _migrations_done.add(key)
+
+
+def checkpoint(db_file):
+    """Fold the WAL back into the main database file (e.g. before copying it)."""
+    try:
+        conn = connect(db_file)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error checkpointing {db_file}: {e}")
+
+
+def snapshot(db_file, dest_file):
+    """Write a consistent point-in-time copy of db_file to dest_file.
+
+    Uses the SQLite online backup API in a single step; under WAL this only
+    holds a read transaction, so writers are not blocked and the copy never
+    contains a half-written page.
+    """
+    source = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT_SECONDS)
+    dest = sqlite3.connect(dest_file)
+    try:
+        source.backup(dest)
+    finally:
+        dest.close()
+        source.close()
+
+
+def content_signature(db_file):
+    """Cheap change marker for a database: size and mtime of the file and its WAL."""
+    signature = []
+    for path in (db_file, db_file + "-wal"):
+        try:
+            stat = os.stat(path)
+            signature.extend([stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            signature.extend([0, 0])
+    return signature
@@ -15,10 +15,7 @@ import logging
 import re
 import time
 import datetime
-import asyncio
 import socket
-import subprocess
-import threading
 import signal
 from difflib import get_close_matches
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultPhoto, InputMediaPhoto, InlineQueryResultArticle, InputTextMessageContent, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -30,7 +27,15 @@ from urllib.parse import quote
 from httpx import HTTPError, ConnectError, ProxyError
 
 # Import centralized paths
-from config.paths import PROJECT_ROOT, GIFT_CARDS_DIR, ASSETS_DIR, CACHE_DIR
+from config.paths import GIFT_CARDS_DIR, ASSETS_DIR, CACHE_DIR, STICKER_PRICE_SNAPSHOT_FILE
+
+# Async card lookup and on-demand rendering
+from services.card_service import card_service
+from services.image_variants import THUMBNAIL_SIZE
+
+# Price files published atomically by the refresh pipeline
+from core import publication
+from services import price_snapshot
 
 # Import premium system functions
 try:
@@ -390,6 +395,10 @@ def create_safe_cdn_url(base_path, filename, file_type="general"):
     encoded_filename = quote(normalized_filename)
     return f"{CDN_BASE_URL}/{base_path}/{encoded_filename}"
 
+def create_thumbnail_cdn_url(base_path, filename, file_type="general"):
+    """CDN URL of the small variant of a file, for inline result thumbnails"""
+    return create_safe_cdn_url(base_path, filename, file_type) + f"?size={THUMBNAIL_SIZE}"
+
 def normalize_gift_filename(gift_name):
     # Handles all special and general cases for gift card filenames
     if gift_name == "Jack-in-the-Box":
@@ -584,116 +593,6 @@ def get_sticker_image_number(collection, sticker):
     # Default to 1_png if not found
     return "1_png"
 
-# Function to get a gift card by name
-def get_gift_card_by_name(gift_name):
-    # Normalize gift name for file matching
-    normalized_name = normalize_gift_filename(gift_name)
-    
-    # Check if this is a plus premarket gift (uses different filename format)
-    is_plus_premarket = False
-    try:
-        from plus_premarket_gifts import is_plus_premarket_gift
-        is_plus_premarket = is_plus_premarket_gift(gift_name)
-    except ImportError:
-        pass
-    
-    # Plus premarket gifts use filename without _card suffix
-    if is_plus_premarket:
-        filename = f"{normalized_name}.webp"
-    else:
-        filename = f"{normalized_name}_card.webp"
-    
-    filepath = os.path.join(GIFT_CARDS_DIR, filename)
-    
-    # Check if file exists
-    if os.path.exists(filepath):
-        logger.info(f"Found existing card for {gift_name}: {filepath}")
-        return filepath
-    
-    # If not found, try the alternative format (for backward compatibility)
-    if is_plus_premarket:
-        # Try with _card suffix as fallback
-        alt_filename = f"{normalized_name}_card.webp"
-        alt_filepath = os.path.join(GIFT_CARDS_DIR, alt_filename)
-        if os.path.exists(alt_filepath):
-            logger.info(f"Found existing card for {gift_name} (alt format): {alt_filepath}")
-            return alt_filepath
-    else:
-        # Try without _card suffix as fallback
-        alt_filename = f"{normalized_name}.webp"
-        alt_filepath = os.path.join(GIFT_CARDS_DIR, alt_filename)
-        if os.path.exists(alt_filepath):
-            logger.info(f"Found existing card for {gift_name} (alt format): {alt_filepath}")
-            return alt_filepath
-    
-    # If not found, log for debugging
-    logger.info(f"Card not found for {gift_name} at {filepath}")
-    
-    # If not, it might be a name we need to generate
-    return None
-
-# Get pre-generated gift card (no on-demand generation)
-def generate_gift_card(gift_file_name):
-    try:
-        logger.info(f"generate_gift_card called for: {gift_file_name}")
-        
-        # Convert file_name to display name for the card generator
-        gift_display_name = gift_file_name.replace("_", " ")
-        
-        normalized_filename = normalize_gift_filename(gift_file_name)
-        logger.info(f"Normalized filename: {normalized_filename}")
-        
-        # Check if the pre-generated card exists
-        card_path = get_gift_card_by_name(gift_file_name)
-        if card_path:
-            logger.info(f"Found pre-generated card: {card_path}")
-            return card_path
-            
-        logger.info(f"No pre-generated card found for {gift_file_name}, checking timestamp...")
-        
-        # If card doesn't exist, check if we need to regenerate all cards
-        from config.paths import LAST_GENERATION_TIME_FILE
-        timestamp_file = LAST_GENERATION_TIME_FILE
-        current_time = int(time.time())
-        
-        if os.path.exists(timestamp_file):
-            try:
-                with open(timestamp_file, 'r') as f:
-                    last_time = int(f.read().strip())
-                
-                elapsed_minutes = (current_time - last_time) / 60
-                
-                # If more than 32 minutes have passed, regenerate cards
-                if elapsed_minutes >= 32:
-                    logging.info("Cards are stale, triggering regeneration")
-                    # Run the pregeneration script in the background
-                    subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "pregenerate_gift_cards.py")])
-            except Exception as e:
-                logging.error(f"Error checking timestamp: {e}")
-        else:
-            # No timestamp file, trigger regeneration
-            logging.info("No timestamp file found, triggering regeneration")
-            subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "pregenerate_gift_cards.py")])
-        
-        # Try one more time to get the card (it might exist now)
-        card_path = get_gift_card_by_name(gift_file_name)
-        if card_path:
-            logger.info(f"Found card after regeneration check: {card_path}")
-            return card_path
-            
-        # If we still don't have the card, generate it on demand as a fallback
-        logging.info(f"Pre-generated card not found for {gift_file_name}, generating on demand")
-        import gift_card_generator
-        gift_card_generator.generate_specific_gift(gift_display_name)
-        
-        # Get the card path using the file_name format
-        final_card_path = get_gift_card_by_name(gift_file_name)
-        logger.info(f"Final card path after on-demand generation: {final_card_path}")
-        return final_card_path
-    except Exception as e:
-        logging.error(f"Error getting gift card for {gift_file_name}: {e}")
-        return None
-
 # Get list of all available gift cards in the directory
 def get_available_gift_cards():
     """Get all available gift cards including both _card.webp and .png files"""
@@ -909,27 +808,11 @@ def get_gift_keyboard(category=None, page=0):
     return InlineKeyboardMarkup(keyboard)
 
 # Generate a timestamped card for refresh functionality
-def generate_timestamped_card(gift_file_name):
+async def generate_timestamped_card(gift_file_name):
     try:
-        # Convert file_name to display name for the card generator
-        gift_display_name = gift_file_name.replace("_", " ")
-        
-        # Normalize the filename for file system compatibility
-        # First, fix specific problematic gift names
-        if gift_file_name == "Jack-in-the-Box":
-            normalized_filename = "Jack_in_the_Box"
-        elif gift_file_name == "Durov's Cap":
-            normalized_filename = "Durovs_Cap"
-        else:
-            # General normalization for other names
-            normalized_filename = gift_file_name.replace("-", "_").replace("'", "")
-        
         # Generate with timestamp suffix to ensure it's fresh
-        import gift_card_generator
         timestamp = int(time.time())
-        output_path = gift_card_generator.generate_specific_gift(gift_display_name, f"_{timestamp}")
-        
-        return output_path
+        return await card_service.render_fresh_card(gift_file_name, f"_{timestamp}")
     except Exception as e:
         logging.error(f"Error generating timestamped card for {gift_file_name}: {e}")
         return None
@@ -939,10 +822,10 @@ async def generate_gift_price_card(gift_file_name, refresh=False):
     """Generate a price card for a gift with option to refresh."""
     if refresh:
         # Generate with timestamp to ensure it's fresh
-        return generate_timestamped_card(gift_file_name)
+        return await generate_timestamped_card(gift_file_name)
     else:
         # Use standard generation
-        return generate_gift_card(gift_file_name)
+        return await card_service.get_gift_card(gift_file_name)
 
 # Function to refresh a price card
 async def refresh_price_card(update: Update, context: ContextTypes.DEFAULT_TYPE, gift_name):
@@ -958,7 +841,7 @@ async def refresh_price_card(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 # Function to generate gift card with buttons
 async def send_gift_card(update: Update, context: ContextTypes.DEFAULT_TYPE, gift_name, edit_message_id=None, chat_id=None):
-    from premium_system import premium_system
+    from core.premium_system import premium_system
     is_premium = premium_system.is_group_premium(chat_id or update.effective_chat.id)
     links = premium_system.get_premium_links(chat_id or update.effective_chat.id) if is_premium else None
     mrkt_link = links.get('mrkt_link') if links else DEFAULT_MRKT_LINK
@@ -968,10 +851,10 @@ async def send_gift_card(update: Update, context: ContextTypes.DEFAULT_TYPE, gif
     reply_markup = get_gift_price_card_keyboard(is_premium, mrkt_link, tonnel_link, portal_link, palace_link, update.effective_user.id)
 
     logger.info(f"Attempting to send gift card for: {gift_name}")
-    card_path = generate_gift_card(gift_name)
+    card_path = await card_service.get_gift_card(gift_name)
     logger.info(f"Card path returned for {gift_name}: {card_path}")
     
-    if card_path and os.path.exists(card_path):
+    if card_path:
         logger.info(f"Card exists and will be sent: {card_path}")
         # Create caption based on premium status
         if is_premium:
@@ -989,7 +872,7 @@ async def send_gift_card(update: Update, context: ContextTypes.DEFAULT_TYPE, gif
         )
         # Register the message owner in the database for delete permission tracking
         try:
-            from rate_limiter import register_message
+            from core.rate_limiter import register_message
             user_id = update.effective_user.id
             chat_id = update.effective_chat.id
             register_message(user_id, chat_id, sent_message.message_id)
@@ -1015,7 +898,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     # Apply rate limiting for start command
     try:
-        from rate_limiter import can_user_use_command
+        from core.rate_limiter import can_user_use_command
         can_use, seconds_remaining = can_user_use_command(user_id, chat_id, "start")
         
         if not can_use:
@@ -1072,7 +955,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     
     # Apply rate limiting for help command
     try:
-        from rate_limiter import can_user_use_command
+        from core.rate_limiter import can_user_use_command
         can_use, seconds_remaining = can_user_use_command(user_id, chat_id, "help")
         
         if not can_use:
@@ -1246,7 +1129,7 @@ async def devs_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     
     # Apply rate limiting for devs command
     try:
-        from rate_limiter import can_user_use_command
+        from core.rate_limiter import can_user_use_command
         can_use, seconds_remaining = can_user_use_command(user_id, chat_id, "devs")
         
         if not can_use:
@@ -1319,7 +1202,7 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Import premium system
     try:
-        from premium_system import handle_premium_button
+        from core.premium_system import handle_premium_button
         PREMIUM_AVAILABLE = True
     except ImportError:
         PREMIUM_AVAILABLE = False
@@ -1409,7 +1292,7 @@ async def refund_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
     # Check if user has any premium groups
     try:
-        import premium_system
+        from core import premium_system
         user_groups = premium_system.premium_system.get_user_premium_groups(user_id)
         
         if not user_groups:
@@ -1609,7 +1492,7 @@ async def handle_refund_callback(update: Update, context: ContextTypes.DEFAULT_T
                 return
             
             # Check refund eligibility
-            import premium_system
+            from core import premium_system
             eligibility = premium_system.premium_system.can_request_refund(user_id, group_id)
             
             if not eligibility["can_refund"]:
@@ -1627,7 +1510,7 @@ async def handle_refund_callback(update: Update, context: ContextTypes.DEFAULT_T
                 # Process the refund immediately through Telegram API
                 try:
                     # Get the payment details for the refund
-                    import premium_system
+                    from core import premium_system
                     payment_details = premium_system.premium_system.get_payment_details_for_refund(refund_result["refund_id"])
                     
                     if payment_details and payment_details.get("telegram_payment_charge_id"):
@@ -1736,7 +1619,7 @@ async def sticker_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Apply rate limiting for sticker command
     try:
-        from rate_limiter import can_user_use_command
+        from core.rate_limiter import can_user_use_command
         can_use, seconds_remaining = can_user_use_command(user_id, chat_id, "sticker")
         
         if not can_use:
@@ -1760,7 +1643,7 @@ async def sticker_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             
             # Register the message owner in the database for button permission tracking
             try:
-                from rate_limiter import register_message
+                from core.rate_limiter import register_message
                 register_message(user_id, chat_id, sent_message.message_id)
                 logger.info(f"Registered sticker collections message {sent_message.message_id} to user {user_id}")
             except ImportError:
@@ -1796,7 +1679,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 id=str(uuid4()),
                 title="How to use it",
                 description="Learn how to use the bot effectively",
-                thumbnail_url=create_safe_cdn_url("assets", "giftschart.webp"),
+                thumbnail_url=create_thumbnail_cdn_url("assets", "giftschart.webp"),
                 input_message_content=InputTextMessageContent(
                     message_text="**How to use Gift Price Tracker**\n\nTrack real-time prices of Telegram gifts and stickers!\n\nBrowse gifts: Type 'gift' (includes Pre-market)\nBrowse stickers: Type 'sticker'\nBrowse Goodies: Type 'goodies'\n\n**the flow**\n\n`@TWETestBot gift pepe`\n`@TWETestBot sticker azuki`\n`@TWETestBot goodies`\n\n**Want to support the bot?**\nTON Donation Address:\n`UQCFRqB2vZnGZRh3ZoZAItNidk8zpkN0uRHlhzrnwweU3mos`\n\nOr you can use the Donate button below.\n\n> Every NFT has a price.\n> Know it. Live.",
                     parse_mode=ParseMode.MARKDOWN
@@ -1810,7 +1693,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 id=str(uuid4()),
                 title="Browse All Gifts",
                 description="Type 'gift' to see all 139 gifts (most expensive first)",
-                thumbnail_url=create_safe_cdn_url("assets", "gifts.webp"),
+                thumbnail_url=create_thumbnail_cdn_url("assets", "gifts.webp"),
                 input_message_content=InputTextMessageContent(
                     message_text="**Browse All Gifts**\n\nType 'gift' to see all 139 available gifts with their price cards!\n\n💎 *Most expensive gifts shown first*",
                     parse_mode=ParseMode.HTML
@@ -1824,7 +1707,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 id=str(uuid4()),
                 title="Browse All Stickers",
                 description="Type 'sticker' to see all 166 stickers (most expensive first)",
-                thumbnail_url=create_safe_cdn_url("assets", "stickers.webp"),
+                thumbnail_url=create_thumbnail_cdn_url("assets", "stickers.webp"),
                 input_message_content=InputTextMessageContent(
                     message_text="**Browse All Stickers**\n\nType 'sticker' to see all 166 available sticker packs!\n\n💎 *Most expensive stickers shown first*",
                     parse_mode=ParseMode.HTML
@@ -1838,7 +1721,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 id=str(uuid4()),
                 title="Browse All Goodies",
                 description="Type 'goodies' to see all 21 Goodies collections",
-                thumbnail_url=create_safe_cdn_url("assets", "goodies.webp"),
+                thumbnail_url=create_thumbnail_cdn_url("assets", "goodies.webp"),
                 input_message_content=InputTextMessageContent(
                     message_text="**Browse All Goodies**\n\nType 'goodies' to see all 21 Goodies collections!\n\n🎨 *Premium collectibles from Goodies app*",
                     parse_mode=ParseMode.HTML
@@ -1879,18 +1762,17 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 return
             
             # Load price data to sort by real API prices (similar to stickers)
-            import json
             gift_price_file = os.path.join(CACHE_DIR, "gift_price_results.json")
             price_data = {}
             if os.path.exists(gift_price_file):
                 try:
-                    with open(gift_price_file, 'r') as f:
-                        price_json = json.load(f)
-                        gifts_with_prices = price_json.get('gifts_with_prices', [])
-                        for gift_info in gifts_with_prices:
-                            gift_name = gift_info.get('name', '')
-                            price = gift_info.get('price', 0)
-                            price_data[gift_name.lower()] = price
+                    # Parsed once per published version of the file
+                    price_json = publication.load_json(gift_price_file, default={})
+                    gifts_with_prices = price_json.get('gifts_with_prices', [])
+                    for gift_info in gifts_with_prices:
+                        gift_name = gift_info.get('name', '')
+                        price = gift_info.get('price', 0)
+                        price_data[gift_name.lower()] = price
                     logger.info(f"Loaded price data for {len(price_data)} gifts")
                 except Exception as e:
                     logger.warning(f"Error loading gift price data: {e}, will fetch dynamically")
@@ -1960,7 +1842,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 gift_card_url = create_safe_cdn_url("new_gift_cards", card_filename, "gift") + f"?t={timestamp}"
                 
                 # Use the gift image from downloaded_images as thumbnail (like stickers do)
-                gift_image_url = create_safe_cdn_url("downloaded_images", f"{gift_file_name}.webp", "gift")
+                gift_image_url = create_thumbnail_cdn_url("downloaded_images", f"{gift_file_name}.webp", "gift")
                 
                 # Get price for description if available
                 price = price_data.get(clean_gift_name.lower(), 0)
@@ -2007,63 +1889,33 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             logger.info("Processing 'sticker' inline query")
             from services import sticker_integration
             if sticker_integration.is_sticker_functionality_available():
-                # Get all stickers from all collections
-                all_stickers = []
-                collections = sticker_integration.get_sticker_collections()
-                logger.info(f"Found {len(collections)} sticker collections")
+                # Skip Goodies collections (they have their own dedicated inline query 'goodies')
+                goodies_collections = {
+                    'Teddie', 'WSB', 'Lamborghini', 'Cool Cats', 'Oracle Red Bull Racing', 
+                    'NOT Wise', 'Moonbirds', 'Pudgy Penguins x Kung Fu Panda', 'Doodles'
+                }
                 
-                for collection in collections:
+                # Walk the mapped price snapshot in its precomputed price order
+                # (highest first); no JSON parse and no per-sticker lookups
+                snapshot = price_snapshot.load_snapshot(STICKER_PRICE_SNAPSHOT_FILE)
+                if snapshot is None:
+                    logger.warning("No sticker price snapshot available")
+                all_stickers = []
+                unpriced_stickers = []
+                for collection, sticker, price in (snapshot.by_price() if snapshot is not None else ()):
                     # Skip dogs_og collection from general sticker query (too many stickers)
-                    if collection.lower() == "dogs og":
+                    if collection.lower() == "dogs og" or collection in goodies_collections:
                         continue
-                    
-                    # Skip Goodies collections (they have their own dedicated inline query 'goodies')
-                    goodies_collections = [
-                        'Teddie', 'WSB', 'Lamborghini', 'Cool Cats', 'Oracle Red Bull Racing', 
-                        'NOT Wise', 'Moonbirds', 'Pudgy Penguins x Kung Fu Panda', 'Doodles'
-                    ]
-                    if collection in goodies_collections:
-                        continue
-                    stickers = sticker_integration.get_stickers_in_collection(collection)
-                    for sticker in stickers:
-                        all_stickers.append((collection, sticker))
-                
-                logger.info(f"Found {len(all_stickers)} total stickers")
-                
-                # Load price data to sort by real API prices
-                import json
-                sticker_price_file = os.path.join(CACHE_DIR, "sticker_price_results.json")
-                price_data = {}
-                if os.path.exists(sticker_price_file):
-                    try:
-                        with open(sticker_price_file, 'r') as f:
-                            price_json = json.load(f)
-                            stickers_with_prices = price_json.get('stickers_with_prices', [])
-                            for sticker_info in stickers_with_prices:
-                                collection = sticker_info.get('collection', '')
-                                sticker = sticker_info.get('sticker', '')
-                                price = sticker_info.get('price', 0)
-                                key = (collection.lower(), sticker.lower())
-                                price_data[key] = price
-                        logger.info(f"Loaded price data for {len(price_data)} stickers")
-                    except Exception as e:
-                        logger.warning(f"Error loading price data: {e}, using priority system")
-                        price_data = {}
-                
-                # Sort stickers by real API price (highest first), fallback to priority if no price
-                def get_sticker_sort_key(sticker_tuple):
-                    collection, sticker = sticker_tuple
-                    key = (collection.lower(), sticker.lower())
-                    price = price_data.get(key, 0)
                     if price > 0:
-                        # Return negative price so highest prices come first (reverse sort)
-                        return -price
+                        all_stickers.append((collection, sticker))
                     else:
-                        # Fallback to priority system for stickers without prices
-                        return get_high_value_sticker_priority(collection, sticker) + 10000
+                        unpriced_stickers.append((collection, sticker))
                 
-                all_stickers.sort(key=get_sticker_sort_key)
-                logger.info("Sorted stickers by real API prices (highest first), with priority fallback")
+                # Fallback to priority system for stickers without prices
+                unpriced_stickers.sort(key=lambda item: get_high_value_sticker_priority(*item))
+                all_stickers.extend(unpriced_stickers)
+                logger.info(f"Found {len(all_stickers)} total stickers, sorted by real API prices (highest first), "
+                            f"with priority fallback")
                 
                 if not all_stickers:
                     logger.warning("No stickers found")
@@ -2129,7 +1981,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                     image_number = get_sticker_image_number(collection, sticker)
                     collection_path = normalize_cdn_path(collection, "collection")
                     sticker_path = normalize_cdn_path(sticker, "sticker")
-                    sticker_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_path)}/{quote(sticker_path)}/{quote(image_number)}"
+                    sticker_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_path)}/{quote(sticker_path)}/{quote(image_number)}?size={THUMBNAIL_SIZE}"
                     
                     # Format names for display (convert snake_case to Title Case)
                     collection_display = format_display_name(collection)
@@ -2284,7 +2136,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 timestamp = int(datetime.datetime.now().timestamp())
                 goodies_card_filename = f"{collection_normalized}_{sticker_normalized}_price_card.webp"
                 goodies_card_url = create_safe_cdn_url("sticker_price_cards", goodies_card_filename) + f"?t={timestamp}"
-                goodies_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_normalized)}/{quote(sticker_normalized)}/1.webp"
+                goodies_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_normalized)}/{quote(sticker_normalized)}/1.webp?size={THUMBNAIL_SIZE}"
                 
                 # Format display names
                 display_collection = collection.replace('_', ' ').title()
@@ -2367,7 +2219,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
                 id=str(uuid4()),
                 title="No results found",
                 description=f"No gifts or stickers found for '{query}'",
-                thumbnail_url=create_safe_cdn_url("assets", "no result.webp"),
+                thumbnail_url=create_thumbnail_cdn_url("assets", "no result.webp"),
                 input_message_content=InputTextMessageContent(
                     message_text=f"No results found for '{query}'\n\nTry:\n• Type 'gift' to see all gifts\n• Type 'sticker' to see all stickers\n• Search for specific names",
                     parse_mode=ParseMode.HTML
@@ -2406,7 +2258,8 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         # Create CDN URL for gift card with cache-busting, thumbnail without cache-busting
         timestamp = int(datetime.datetime.now().timestamp())
         gift_card_url = create_safe_cdn_url("new_gift_cards", card_filename, "gift") + f"?t={timestamp}"
-        gift_image_url = create_safe_cdn_url("downloaded_images", f"{gift_file_name}.webp", "gift")
+        gift_card_thumbnail_url = create_thumbnail_cdn_url("new_gift_cards", card_filename, "gift") + f"&t={timestamp}"
+        gift_image_url = create_thumbnail_cdn_url("downloaded_images", f"{gift_file_name}.webp", "gift")
         
         # Prepare the caption
         caption = f"💎 {gift} 💎"
@@ -2416,7 +2269,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             InlineQueryResultPhoto(
                 id=result_id,
                 photo_url=gift_card_url,
-                thumbnail_url=gift_card_url,
+                thumbnail_url=gift_card_thumbnail_url,
                 title=f"{gift}",
                 description="Gift Card",
                 caption=caption,
@@ -2451,7 +2304,7 @@ async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         image_number = get_sticker_image_number(collection, sticker)
         collection_path = normalize_cdn_path(collection, "collection")
         sticker_path = normalize_cdn_path(sticker, "sticker")
-        sticker_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_path)}/{quote(sticker_path)}/{quote(image_number)}"
+        sticker_image_url = f"{CDN_BASE_URL}/sticker_collections/{quote(collection_path)}/{quote(sticker_path)}/{quote(image_number)}?size={THUMBNAIL_SIZE}"
         
         # Create a result with thumbnail from CDN
         results.append(
@@ -2592,7 +2445,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             # Check for premium setup flow
             if context.user_data.get('premium_setup_step'):
                 try:
-                    from premium_system import handle_premium_setup
+                    from core.premium_system import handle_premium_setup
                     await handle_premium_setup(update, context)
                     return
                 except ImportError as e:
@@ -2613,7 +2466,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             if context.user_data.get('configure_step') == 'link_update':
                 logger.info("Handling link update in message handler")
                 try:
-                    from premium_system import premium_system, is_valid_link
+                    from core.premium_system import premium_system, is_valid_link
                     logger.info("Imported premium system modules")
                     
                     # Get data from context
@@ -2692,7 +2545,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         logger.info(f"Success message sent with ID: {sent_msg.message_id}")
                         
                         # Show updated menu with current status
-                        from premium_system import premium_system
+                        from core.premium_system import premium_system
                         links = premium_system.get_premium_links(group_id)
                         
                         # Create keyboard with 4 market buttons in 2x2 grid plus Done button
@@ -2774,7 +2627,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         gift_name = matching_gifts[0]
         # Apply rate limiting
         try:
-            from rate_limiter import can_user_request
+            from core.rate_limiter import can_user_request
             can_request, seconds_remaining = can_user_request(user_id, chat_id, f"gift_{gift_name}")
             
             if not can_request:
@@ -2802,7 +2655,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if len(matching_gifts) > 1 and len(matching_gifts) <= 8:
         # Apply rate limiting for gift searches
         try:
-            from rate_limiter import can_user_use_command
+            from core.rate_limiter import can_user_use_command
             search_query = message_text.lower().replace(' ', '_')
             can_use, seconds_remaining = can_user_use_command(user_id, chat_id, f"gift_search_{search_query}")
             
@@ -2836,7 +2689,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         # Register the message owner in the database for button permission tracking
         try:
-            from rate_limiter import register_message
+            from core.rate_limiter import register_message
             register_message(user_id, chat_id, sent_message.message_id)
             logger.info(f"Registered gift search results message {sent_message.message_id} to user {user_id}")
         except ImportError:
@@ -2863,7 +2716,7 @@ async def configure_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     try:
         user_id = update.effective_user.id
-        from premium_system import premium_system
+        from core.premium_system import premium_system
         groups = premium_system.get_user_premium_groups(user_id)
         if not groups:
             await update.message.reply_text(
@@ -3089,9 +2942,9 @@ async def ensure_uploaded_card(context, gift_name):
         return photo_cache[gift_name]
     
     # Generate the card
-    card_path = generate_gift_card(gift_name)
+    card_path = await card_service.get_gift_card(gift_name)
     
-    if card_path and os.path.exists(card_path):
+    if card_path:
         try:
             # Upload the photo to Telegram servers
             with open(card_path, 'rb') as photo_file:
@@ -3182,294 +3035,16 @@ async def premium_status_command(update: Update, context: ContextTypes.DEFAULT_T
     # Call the premium status handler
     await handle_premium_status(update, context)
 
-# =============================================================================
-# INTEGRATED BACKUP SYSTEM
-# =============================================================================
-
-# Global variables for backup system
-backup_system_running = True
-backup_system_thread = None
-
-def start_integrated_backup_system():
-    """Start the integrated backup system in a background thread."""
-    global backup_system_thread, backup_system_running
-    
-    backup_system_running = True
-    backup_system_thread = threading.Thread(target=backup_system_worker, daemon=True)
-    backup_system_thread.start()
-    logger.info("🔒 Integrated backup system started successfully")
-
-def stop_integrated_backup_system():
-    """Stop the integrated backup system."""
-    global backup_system_running
-    backup_system_running = False
-    logger.info("🔒 Integrated backup system stopped")
-
-def backup_system_worker():
-    """Background worker for the backup system."""
-    import zipfile
-    import sqlite3
-    from datetime import datetime, timedelta
-    from telegram import Bot
-    
-    logger.info("🔒 Backup system worker started")
-    
-    # Create backup bot instance
-    backup_bot = Bot(token=BOT_TOKEN)
-    
-
-    
-    # Paths - using centralized config
-    from config.paths import SQLITE_DATA_DIR
-    sqlite_data_dir = SQLITE_DATA_DIR
-    backup_dir = os.path.join(sqlite_data_dir, "backups")
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    # Backup configuration
-    MAX_BACKUP_AGE_DAYS = 7
-    MAX_BACKUP_COUNT = 50
-    BACKUP_INTERVAL_MINUTES = 60  # PRODUCTION: Hourly backups
-    
-    async def create_and_send_backup():
-        """Create and send backup to admins."""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            zip_filename = f"database_backup_{timestamp}.zip"
-            zip_path = os.path.join(backup_dir, zip_filename)
-            
-            # Get database files
-            db_files = []
-            total_db_size = 0
-            
-            if os.path.exists(sqlite_data_dir):
-                for filename in os.listdir(sqlite_data_dir):
-                    if filename.endswith('.db'):
-                        filepath = os.path.join(sqlite_data_dir, filename)
-                        if os.path.isfile(filepath):
-                            # Verify database integrity
-                            try:
-                                conn = sqlite3.connect(filepath)
-                                cursor = conn.cursor()
-                                cursor.execute("PRAGMA integrity_check;")
-                                result = cursor.fetchone()
-                                conn.close()
-                                
-                                if result and result[0] == 'ok':
-                                    db_files.append(filepath)
-                                    total_db_size += os.path.getsize(filepath)
-                                else:
-                                    logger.error(f"🔒 Database integrity check failed for {filepath}")
-                            except Exception as e:
-                                logger.error(f"🔒 Error checking database {filepath}: {e}")
-            
-            if not db_files:
-                logger.warning("🔒 No valid database files found for backup")
-                return False
-            
-            # Create backup zip
-            backup_info = {
-                'timestamp': timestamp,
-                'files': [],
-                'total_size': 0
-            }
-            
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for db_file in db_files:
-                    arcname = os.path.basename(db_file)
-                    zipf.write(db_file, arcname)
-                    
-                    file_size = os.path.getsize(db_file)
-                    backup_info['files'].append({
-                        'name': arcname,
-                        'size': file_size,
-                        'size_mb': round(file_size / (1024*1024), 2)
-                    })
-                    backup_info['total_size'] += file_size
-                    
-                    logger.info(f"🔒 Added {arcname} to backup ({file_size} bytes)")
-                
-                # Add backup info
-                info_content = f"""Database Backup Information
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Total Files: {len(backup_info['files'])}
-Total Size: {round(backup_info['total_size'] / (1024*1024), 2)} MB
-
-Files Included:
-"""
-                for file_info in backup_info['files']:
-                    info_content += f"- {file_info['name']}: {file_info['size_mb']} MB\n"
-                
-                zipf.writestr("backup_info.txt", info_content)
-            
-            backup_size = os.path.getsize(zip_path)
-            logger.info(f"🔒 Created backup zip: {zip_filename} ({backup_size} bytes)")
-            
-            # Send to admins
-            success_count = 0
-            file_size_mb = round(backup_size / (1024*1024), 2)
-            
-            caption = f"""🔒 **Database Backup Report**
-            
-📅 **Backup Time**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-📊 **Files Backed Up**: {len(backup_info['files'])}
-💾 **Total Size**: {file_size_mb} MB
-🔐 **Backup Status**: ✅ Complete
-
-**Databases Included:**
-"""
-            
-            for file_info in backup_info['files']:
-                caption += f"• {file_info['name']}: {file_info['size_mb']} MB\n"
-            
-            caption += f"\n💡 **Tip**: Extract this zip file to restore your databases if needed."
-            
-            # Send to group chat instead of individual admins
-            GROUP_CHAT_ID = -4944651195  # Your group chat ID
-            try:
-                with open(zip_path, 'rb') as backup_file:
-                    await backup_bot.send_document(
-                        chat_id=GROUP_CHAT_ID,
-                        document=backup_file,
-                        caption=caption,
-                        parse_mode='Markdown'
-                    )
-                logger.info(f"🔒 Successfully sent backup to group chat {GROUP_CHAT_ID}")
-                success_count = 1
-            except Exception as e:
-                logger.error(f"🔒 Failed to send backup to group chat {GROUP_CHAT_ID}: {e}")
-                success_count = 0
-            
-            logger.info(f"🔒 Backup sent to group chat: {'Success' if success_count > 0 else 'Failed'}")
-            
-            # Cleanup old backups
-            cleanup_old_backups(backup_dir, MAX_BACKUP_AGE_DAYS, MAX_BACKUP_COUNT)
-            
-            return success_count > 0
-            
-        except Exception as e:
-            logger.error(f"🔒 Error creating backup: {e}")
-            return False
-    
-    def cleanup_old_backups(backup_dir, max_age_days, max_count):
-        """Clean up old backup files."""
-        try:
-            now = datetime.now()
-            deleted_count = 0
-            
-            # Get all backup files
-            backup_files = []
-            for filename in os.listdir(backup_dir):
-                if filename.startswith('database_backup_') and filename.endswith('.zip'):
-                    filepath = os.path.join(backup_dir, filename)
-                    if os.path.isfile(filepath):
-                        backup_files.append((filepath, os.path.getmtime(filepath)))
-            
-            # Sort by modification time (newest first)
-            backup_files.sort(key=lambda x: x[1], reverse=True)
-            
-            # Remove files older than max_age_days
-            for filepath, mtime in backup_files:
-                file_age = now - datetime.fromtimestamp(mtime)
-                if file_age.days > max_age_days:
-                    os.remove(filepath)
-                    deleted_count += 1
-                    logger.info(f"🔒 Deleted old backup: {os.path.basename(filepath)}")
-            
-            # Remove excess files if we have too many
-            if len(backup_files) > max_count:
-                excess_files = backup_files[max_count:]
-                for filepath, _ in excess_files:
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                        deleted_count += 1
-                        logger.info(f"🔒 Deleted excess backup: {os.path.basename(filepath)}")
-            
-            if deleted_count > 0:
-                logger.info(f"🔒 Cleaned up {deleted_count} old backup files")
-                
-        except Exception as e:
-            logger.error(f"🔒 Error during backup cleanup: {e}")
-    
-    def calculate_next_backup_time(last_backup_time=None):
-        """Calculate the next backup time based on interval."""
-        now = datetime.now()
-        if BACKUP_INTERVAL_MINUTES == 60:
-            # Hourly backups - every hour from last backup time
-            if last_backup_time:
-                next_backup = last_backup_time + timedelta(hours=1)
-            else:
-                # For first backup, start on the next hour
-                next_backup = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-        else:
-            # Testing intervals - every N minutes from last backup
-            if last_backup_time:
-                next_backup = last_backup_time + timedelta(minutes=BACKUP_INTERVAL_MINUTES)
-            else:
-                next_backup = now + timedelta(minutes=BACKUP_INTERVAL_MINUTES)
-        return next_backup
-    
-    # Perform initial backup
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    try:
-        # Initial backup
-        logger.info("🔒 Performing initial backup...")
-        loop.run_until_complete(create_and_send_backup())
-        last_backup_time = datetime.now()
-        
-        # Calculate and log next backup time
-        next_backup = calculate_next_backup_time(last_backup_time)
-        logger.info(f"🔒 Backup system initialized. Next backup scheduled for: {next_backup.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # Main backup loop
-        while backup_system_running:
-            try:
-                now = datetime.now()
-                next_backup = calculate_next_backup_time(last_backup_time)
-                
-                # If it's past the next backup time, perform backup
-                if now >= next_backup:
-                    logger.info(f"🔒 Starting scheduled backup (every {BACKUP_INTERVAL_MINUTES} minutes)...")
-                    loop.run_until_complete(create_and_send_backup())
-                    last_backup_time = datetime.now()
-                    
-                    # Calculate next backup time based on new last backup time
-                    next_backup = calculate_next_backup_time(last_backup_time)
-                    logger.info(f"🔒 Next backup scheduled for: {next_backup.strftime('%Y-%m-%d %H:%M:%S')}")
-                else:
-                    # Log when next backup will occur (every 10 minutes)
-                    time_until_next = (next_backup - now).total_seconds()
-                    if int(time_until_next) % 600 == 0:  # Log every 10 minutes
-                        logger.info(f"🔒 Next backup in {int(time_until_next/60)} minutes at {next_backup.strftime('%H:%M:%S')}")
-                
-                # Sleep for a short time to avoid busy waiting
-                sleep_time = min(60, (next_backup - now).total_seconds())
-                
-                if sleep_time > 0 and backup_system_running:
-                    time.sleep(sleep_time)
-                
-            except Exception as e:
-                logger.error(f"🔒 Error in backup scheduler loop: {e}")
-                time.sleep(60)  # Wait 1 minute before retrying
-        
-    except Exception as e:
-        logger.error(f"🔒 Fatal error in backup system: {e}")
-    finally:
-        loop.close()
-        logger.info("🔒 Backup system worker stopped")
-
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully."""
     logger.info(f"Received signal {signum}, shutting down...")
-    stop_integrated_backup_system()
     sys.exit(0)
 
 def main() -> None:
     """Start the bot."""
     # Initialize rate limiter database
     try:
-        from rate_limiter import ensure_tables_exist
+        from core.rate_limiter import ensure_tables_exist
         ensure_tables_exist()
         logger.info("Database tables verified or created")
     except Exception as e:
@@ -3544,7 +3119,7 @@ def main() -> None:
     
     # Add payment handlers
     try:
-        from premium_system import handle_pre_checkout_query, handle_successful_payment, handle_configure_flow, handle_premium_group_share, handle_premium_setup
+        from core.premium_system import handle_pre_checkout_query, handle_successful_payment, handle_configure_flow, handle_premium_group_share, handle_premium_setup
         from telegram.ext import PreCheckoutQueryHandler, MessageHandler, filters
         
         # Pre-checkout query handler
@@ -3596,8 +3171,7 @@ def main() -> None:
         
         logger.info("Starting bot...")
         
-        # Start integrated backup system
-        start_integrated_backup_system()
+        # Database backups run in their own process: schedulers/database_backup.py
         
         application.run_polling(allowed_updates=Update.ALL_TYPES)
     except NetworkError as e:
@@ -12,19 +12,19 @@ module.exports = {
             PYTHONUNBUFFERED: "1"
         }
     }, {
-        name: "gift-generator-cron",
-        script: "generators/pregenerate_gift_cards.py",
+        name: "refresh-orchestrator",
+        script: "schedulers/refresh_orchestrator.py",
         cwd: "/root/01studio/giftschart",
         interpreter: "python3",
         autorestart: true,
         watch: false,
-        max_memory_restart: "500M",
+        max_memory_restart: "1G",
         env: {
             PYTHONUNBUFFERED: "1"
         }
     }, {
-        name: "giftschart-cdn",
-        script: "services/cdn_server.py",
+        name: "database-backup",
+        script: "schedulers/database_backup.py",
         cwd: "/root/01studio/giftschart",
         interpreter: "python3",
         autorestart: true,
@@ -33,5 +33,17 @@ module.exports = {
         env: {
             PYTHONUNBUFFERED: "1"
         }
+    }, {
+        name: "giftschart-cdn",
+        script: "gunicorn",
+        args: "-c services/gunicorn_cdn.conf.py services.cdn_server:app",
+        cwd: "/root/01studio/giftschart",
+        interpreter: "none",
+        autorestart: true,
+        watch: false,
+        max_memory_restart: "300M",
+        env: {
+            PYTHONUNBUFFERED: "1"
+        }
     }]
 };
@@ -22,6 +22,8 @@ import logging
 
 # Import our Portal API module (replaces Tonnel API)
 import services.portal_api as portal_api
+from services.image_variants import write_variants
+from core import publication
 import asyncio
 
 # Import centralized paths
@@ -205,8 +207,7 @@ def load_local_mrkt_data(gift_name):
         if 'MRKT_API_DIR' in globals():
             json_path = os.path.join(MRKT_API_DIR, "gifts_collections.json")
         else:
-             from config.paths import PROJECT_ROOT
-             json_path = os.path.join(PROJECT_ROOT, "api", "mrkt", "gifts_collections.json")
+            json_path = os.path.join(PROJECT_ROOT, "api", "mrkt", "gifts_collections.json")
         if not os.path.exists(json_path):
             return None
             
@@ -1259,7 +1260,8 @@ async def create_gift_card(gift_name, output_path=None, force_fresh=False):
             # Convert output path to WebP if it's PNG
             if output_path.endswith('.png'):
                 output_path = output_path[:-4] + '.webp'
-            card.save(output_path, 'WEBP', quality=85, method=6)
+            publication.save_image(card, output_path, 'WEBP', quality=85, method=6)
+            write_variants(output_path, card)
             
         return card
     
@@ -1775,7 +1777,8 @@ async def add_dynamic_elements(gift_name, template_path=None, output_path=None):
             # Convert output path to WebP if it's PNG
             if output_path.endswith('.png'):
                 output_path = output_path[:-4] + '.webp'
-            card.save(output_path, 'WEBP', quality=85, method=6)
+            publication.save_image(card, output_path, 'WEBP', quality=85, method=6)
+            write_variants(output_path, card)
             
         return card
         
@@ -1934,7 +1937,7 @@ def create_custom_card(image_path, output_path, name, price_usd, price_ton, chan
         # Save the card as WebP
         if output_path.endswith('.webp'):
             output_path = output_path[:-4] + '.webp'
-        card.save(output_path, 'WEBP', quality=85, method=6)
+        publication.save_image(card, output_path, 'WEBP', quality=85, method=6)
         print(f"Custom card created: {output_path}")
         return output_path
     except Exception as e:
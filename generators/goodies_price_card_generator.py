@@ -64,6 +64,8 @@ from config.paths import (
     STICKER_PRICE_RESULTS_FILE, MAIN_FONT_PATH, 
     STICKER_PRICE_CARDS_DIR, CARD_TEMPLATES_DIR
 )
+from services.image_variants import write_variants
+from core import publication
 
 # Constants
 TEMPLATES_DIR = CARD_TEMPLATES_DIR
@@ -756,7 +758,8 @@ def generate_price_card(collection, sticker, price, output_dir):
         # Save the card as WebP
         output_filename = f"{collection_norm}_{sticker_norm}_price_card.webp"
         output_path = os.path.join(output_dir, output_filename)
-        card.save(output_path, 'WEBP', quality=85, method=6)
+        publication.save_image(card, output_path, 'WEBP', quality=85, method=6)
+        write_variants(output_path, card)
         
         logger.info(f"Generated price card: {output_path}")
         return output_path
@@ -799,6 +802,21 @@ def generate_all_price_cards(price_data, output_dir):
     
     logger.info(f"Price card generation complete: {cached_usage} from cache, {live_api_usage} from live API")
 
+def generate_all_goodies_cards(output_dir=OUTPUT_DIR):
+    """Generate price cards for every sticker in GOODIES_PRICES. Returns the number generated."""
+    print(f"Generating all {len(GOODIES_PRICES)} Goodies price cards...")
+    generated = []
+    for (collection, sticker), info in GOODIES_PRICES.items():
+        result = generate_price_card(collection, sticker, info['price_ton'], output_dir)
+        if result:
+            print(f"✅ Generated: {collection}/{sticker}")
+            generated.append(result)
+        else:
+            print(f"❌ Failed: {collection}/{sticker}")
+    print(f"\nGenerated {len(generated)}/{len(GOODIES_PRICES)} Goodies cards")
+    publication.record(generated)
+    return len(generated)
+
 def main():
     """Main function - generates all Goodies price cards"""
     parser = argparse.ArgumentParser(description="Generate Goodies sticker price cards")
@@ -812,16 +830,7 @@ def main():
     
     if args.all or (not args.collection and not args.sticker):
         # Generate all Goodies cards
-        print(f"Generating all {len(GOODIES_PRICES)} Goodies price cards...")
-        generated = 0
-        for (collection, sticker), info in GOODIES_PRICES.items():
-            result = generate_price_card(collection, sticker, info['price_ton'], args.output_dir)
-            if result:
-                print(f"✅ Generated: {collection}/{sticker}")
-                generated += 1
-            else:
-                print(f"❌ Failed: {collection}/{sticker}")
-        print(f"\nGenerated {generated}/{len(GOODIES_PRICES)} Goodies cards")
+        generate_all_goodies_cards(args.output_dir)
     else:
         # Generate single card
         if not args.collection or not args.sticker:
@@ -14,6 +14,8 @@ import re
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 import colorsys
+from services.image_variants import write_variants
+from core import publication
 from services.plus_premarket_gifts import PLUS_PREMARKET_GIFTS, get_first_sale_price_stars, get_gift_supply, STAR_TO_USD, get_gift_id, calculate_days_since_release
 
 # Try to import premarket gifts functions (for regular premarket gifts)
@@ -538,7 +540,8 @@ def generate_plus_premarket_card(gift_name, gift_data, output_path=None):
         else:
             final_output_path += '.webp'
             
-        card.save(final_output_path, 'WEBP', quality=85, method=6)
+        publication.save_image(card, final_output_path, 'WEBP', quality=85, method=6)
+        write_variants(final_output_path, card)
         
         logger.info(f"Generated plus premarket card: {final_output_path}")
         return card
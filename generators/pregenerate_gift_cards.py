@@ -5,7 +5,7 @@ import time
 import datetime
 import logging
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 import schedule
 
 # Add project root to path for config imports
@@ -33,6 +33,9 @@ logging.basicConfig(
 logger = logging.getLogger("pregenerate_cards")
 
 import generators.gift_card_generator as gift_card_generator
+from core import publication
+from services import freshness
+from generators.render_daemon import RenderDaemon, PRIORITY_BATCH
 
 # Ensure output directory exists (already done in config, but good for safety)
 os.makedirs(GIFT_CARDS_DIR, exist_ok=True)
@@ -162,8 +165,36 @@ def generate_card(gift_name):
         return False
 
 
-def generate_all_cards():
-    """Generate all gift cards concurrently"""
+# Long-lived render workers shared by batch runs and any on-demand renders in
+# this process. Reduced worker count for plus premarket gifts which use the
+# MRKT/Quant API (may have rate limits) and to avoid resource exhaustion.
+render_daemon = RenderDaemon(generate_card, workers=3, name="pregenerate")
+
+
+def card_ages(names):
+    """Age in seconds of each gift's card, or None if it has not been generated."""
+    now = time.time()
+    ages = {}
+    for gift_name in names:
+        normalized_filename = normalize_gift_filename(gift_name)
+        ages[gift_name] = None
+        for filename in (f"{normalized_filename}_card.webp", f"{normalized_filename}.webp"):
+            try:
+                ages[gift_name] = now - os.path.getmtime(os.path.join(GIFT_CARDS_DIR, filename))
+                break
+            except OSError:
+                continue
+    return ages
+
+
+def due_gift_names(lookahead_seconds=0):
+    """Gifts whose cards are due for a refresh, most overdue first, within the upstream budget."""
+    return freshness.plan_refresh(freshness.KIND_GIFT, card_ages(get_available_gift_names()),
+                                  lookahead_seconds=lookahead_seconds)
+
+
+def generate_all_cards(names=None):
+    """Generate gift cards concurrently (all available gifts unless names is given)"""
     start_time = time.time()
     
     # Clear all caches before starting batch generation
@@ -183,7 +214,8 @@ def generate_all_cards():
         logger.warning(f"Could not clear MRKT/Quant API caches: {e}")
     
     # Get list of gift names
-    names = get_available_gift_names()
+    if names is None:
+        names = get_available_gift_names()
     
     if not names:
         logger.error("No gift names found")
@@ -194,35 +226,42 @@ def generate_all_cards():
     # Create output directory if it doesn't exist
     os.makedirs(GIFT_CARDS_DIR, exist_ok=True)
     
-    # Generate cards with a reasonable number of concurrent workers
-    # Reduced for plus premarket gifts which use MRKT/Quant API (may have rate limits)
-    max_workers = min(3, len(names))  # Reduced concurrent workers to avoid resource exhaustion
+    # Queue every card at batch priority; user-triggered renders submitted to
+    # the same daemon are served ahead of these
     successful_cards = 0
     failed_cards = 0
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_gift = {executor.submit(generate_card, gift_name): gift_name for gift_name in names}
-        
-        # Process completed tasks
-        for future in as_completed(future_to_gift):
-            gift_name = future_to_gift[future]
-            try:
-                success = future.result()
-                if success:
-                    successful_cards += 1
-                else:
-                    failed_cards += 1
-            except Exception as e:
-                logger.error(f"Exception generating card for {gift_name}: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
+    future_to_gift = {render_daemon.submit(gift_name, priority=PRIORITY_BATCH): gift_name for gift_name in names}
+    freshness.spend(freshness.KIND_GIFT, len(names))
+    
+    # Process completed tasks
+    for future in as_completed(future_to_gift):
+        gift_name = future_to_gift[future]
+        try:
+            success = future.result()
+            if success:
+                successful_cards += 1
+            else:
                 failed_cards += 1
+        except Exception as e:
+            logger.error(f"Exception generating card for {gift_name}: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            failed_cards += 1
     
     generation_time = time.time() - start_time
     logger.info(f"Batch generation completed in {generation_time:.2f} seconds")
     logger.info(f"Successfully generated {successful_cards} cards, failed: {failed_cards}")
     
+    # Record the cards this batch wrote in the publication manifest
+    try:
+        with os.scandir(GIFT_CARDS_DIR) as it:
+            written = [entry.path for entry in it
+                       if entry.is_file() and not entry.name.startswith('.') and entry.stat().st_mtime >= start_time]
+        publication.record(written)
+    except Exception as e:
+        logger.warning(f"Could not record gift cards in publication manifest: {e}")
+    
     # Update timestamp file
     try:
         with open(TIMESTAMP_FILE, 'w') as f:
@@ -234,7 +273,7 @@ def generate_all_cards():
     return successful_cards, failed_cards
 
 def should_regenerate():
-    """Check if we should regenerate cards based on the timestamp file"""
+    """Check if a batch is due based on the timestamp file (which cards to render is planned per card)"""
     try:
         if not os.path.exists(TIMESTAMP_FILE):
             logger.info("No timestamp file found, will generate cards")
@@ -256,8 +295,8 @@ def should_regenerate():
             
         elapsed_minutes = (current_time - last_time) / 60
         
-        # Regenerate if more than 35 minutes have passed
-        if elapsed_minutes >= 35:
+        # Check card freshness at most every MIN_REFRESH_MINUTES
+        if elapsed_minutes >= freshness.MIN_REFRESH_MINUTES:
             logger.info(f"Last generation was {elapsed_minutes:.1f} minutes ago, will regenerate")
             return True
         else:
@@ -287,8 +326,12 @@ def main():
     try:
         # Check if we should regenerate
         if should_regenerate():
-            # Generate all cards (including plus premarket)
-            successful, failed = generate_all_cards()
+            # Generate the cards that are due (including plus premarket)
+            names = due_gift_names()
+            if not names:
+                logger.info("No cards are due for a refresh")
+                return
+            successful, failed = generate_all_cards(names)
             
             if successful > 0:
                 logger.info(f"All done! Generated {successful} cards (including +premarket, premarket, and normal market gifts)")
@@ -302,8 +345,8 @@ def main():
         logger.error(traceback.format_exc())
 
 if __name__ == "__main__":
-    schedule.every(35).minutes.do(main)
-    print("Starting scheduled card generation every 35 minutes...")
+    schedule.every(freshness.MIN_REFRESH_MINUTES).minutes.do(main)
+    print(f"Starting scheduled card generation every {freshness.MIN_REFRESH_MINUTES} minutes...")
     main()  # Run once at startup
     while True:
         schedule.run_pending()
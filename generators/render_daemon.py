@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Render Daemon
+
+Long-lived pool of render workers fed from a priority queue. User-triggered
+renders jump ahead of batch regeneration jobs, duplicate requests for the same
+card collapse into one job, and callers get a future they can wait on with a
+deadline.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import time
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_USER = 0
+PRIORITY_BATCH = 10
+
+
+class RenderJob:
+    """A pending or running render for one card key."""
+
+    def __init__(self, key, args, priority):
+        self.key = key
+        self.args = args
+        self.priority = priority
+        self.future = Future()
+        self.submitted_at = time.time()
+        self.started = False
+
+
+class RenderDaemon:
+    """Priority-ordered render worker pool with per-key job collapsing."""
+
+    def __init__(self, render_func, workers=2, name="render-daemon"):
+        self.render_func = render_func
+        self.workers = workers
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._threads = []
+        self._running = False
+        self.stats = {
+            'submitted': 0,
+            'collapsed': 0,
+            'completed': 0,
+            'failed': 0,
+        }
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"{self.name} started with {self.workers} workers")
+
+    def stop(self, wait=True):
+        """Stop the workers after the jobs they are currently running."""
+        with self._lock:
+            self._running = False
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._seq), None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(self, key, *args, priority=PRIORITY_BATCH):
+        """Queue a render for key and return its concurrent.futures.Future.
+
+        If a job for the same key is already queued or running, its future is
+        returned instead. A queued job is promoted when a higher-priority
+        request for the same key arrives.
+        """
+        self.start()
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self.stats['collapsed'] += 1
+                if not job.started and priority < job.priority:
+                    job.priority = priority
+                    self._queue.put((priority, next(self._seq), job))
+                return job.future
+
+            job = RenderJob(key, args, priority)
+            self._jobs[key] = job
+            self.stats['submitted'] += 1
+            self._queue.put((priority, next(self._seq), job))
+            return job.future
+
+    async def render(self, key, *args, priority=PRIORITY_USER, deadline=None):
+        """Submit a render and await it for at most `deadline` seconds.
+
+        Raises asyncio.TimeoutError when the deadline passes; the job itself
+        keeps running and its result lands on disk for the next request.
+        """
+        future = asyncio.wrap_future(self.submit(key, *args, priority=priority))
+        return await asyncio.wait_for(asyncio.shield(future), timeout=deadline)
+
+    def pending(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return len(self._jobs)
+
+    def _worker(self):
+        while True:
+            priority, _, job = self._queue.get()
+            if job is None:
+                return
+
+            with self._lock:
+                # Skip superseded queue entries left behind by a promotion
+                if job.started or priority != job.priority:
+                    continue
+                job.started = True
+
+            start_time = time.time()
+            try:
+                result = self.render_func(job.key, *job.args)
+            except Exception as e:
+                # Unregister before resolving, so a new submit starts a new job
+                # instead of attaching to this finished one
+                with self._lock:
+                    self._jobs.pop(job.key, None)
+                    self.stats['failed'] += 1
+                job.future.set_exception(e)
+                logger.error(f"{self.name}: error rendering {job.key}: {e}")
+                continue
+
+            with self._lock:
+                self._jobs.pop(job.key, None)
+                self.stats['completed'] += 1
+            job.future.set_result(result)
+            logger.info(f"{self.name}: rendered {job.key} (priority {priority}) in {time.time() - start_time:.2f}s")
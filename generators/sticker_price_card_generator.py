@@ -25,7 +25,13 @@ import re
 from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageEnhance, ImageOps
 import numpy as np
 import colorsys
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import services.stickers_tools_api as sticker_api
+from services.image_variants import write_variants
+from core import publication
 
 # Try to import cairosvg for SVG support (optional)
 try:
@@ -80,9 +86,8 @@ STAR_LOGO_PATH = os.path.join(ASSETS_DIR, "star.webp")
 FONT_PATH = MAIN_FONT_PATH
 CACHE_MAX_AGE = 1800  # 30 minutes in seconds
 
-# Global variables for tracking cache vs live API usage
-cached_usage = 0
-live_api_usage = 0
+# Worker processes for batch rendering (rendering is CPU-bound Pillow/NumPy work)
+RENDER_PROCESSES = int(os.environ.get("STICKER_RENDER_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
 
 # Card dimensions
 CARD_WIDTH = 1600
@@ -355,8 +360,20 @@ def create_rounded_rectangle(draw, xy, radius, fill):
     draw.pieslice([x1, y2 - 2 * radius, x1 + 2 * radius, y2], 90, 180, fill=fill)
     draw.pieslice([x2 - 2 * radius, y2 - 2 * radius, x2, y2], 0, 90, fill=fill)
 
+@functools.lru_cache(maxsize=16)
+def load_font(size):
+    """The card font at a size, loaded once per process"""
+    return ImageFont.truetype(FONT_PATH, size)
+
 def create_gradient_background(width, height, color):
-    """Create a radial gradient background based on the dominant color (same as gift cards)"""
+    """Create a radial gradient background based on the dominant color (same as gift cards)
+    
+    Backgrounds are cached per color; callers get a copy they can draw on.
+    """
+    return _gradient_background(width, height, tuple(color)).copy()
+
+@functools.lru_cache(maxsize=64)
+def _gradient_background(width, height, color):
     # Create a new image with RGBA mode
     background = Image.new('RGBA', (width, height), (0, 0, 0, 0))
     
@@ -429,8 +446,12 @@ def create_gradient_background(width, height, color):
     
     return gradient_bg
 
-def generate_price_card(collection, sticker, price, output_dir):
-    """Generate a price card for a sticker using the new modern design"""
+def generate_price_card(collection, sticker, price, output_dir, price_info=None):
+    """Generate a price card for a sticker using the new modern design
+    
+    price_info comes from a stats snapshot during batch runs; without it the
+    stickers.tools API is queried for this sticker.
+    """
     try:
         # Normalize names for file operations
         collection_norm = normalize_name(collection)
@@ -439,7 +460,8 @@ def generate_price_card(collection, sticker, price, output_dir):
         os.makedirs(output_dir, exist_ok=True)
         
         # Get price info from stickers.tools API
-        price_info = sticker_api.get_sticker_price(collection, sticker, force_refresh=False)
+        if price_info is None:
+            price_info = sticker_api.get_sticker_price(collection, sticker, force_refresh=False)
         if not price_info:
             logger.warning(f"No price info for {collection} - {sticker}")
             return None
@@ -494,12 +516,12 @@ def generate_price_card(collection, sticker, price, output_dir):
         
         # Load fonts
         try:
-            title_font = ImageFont.truetype(FONT_PATH, 80)  # For collection name
-            subtitle_font = ImageFont.truetype(FONT_PATH, 60)  # For sticker name
-            price_font = ImageFont.truetype(FONT_PATH, 180)  # For USD price
-            ton_price_font = ImageFont.truetype(FONT_PATH, 50)  # For TON price
-            date_font = ImageFont.truetype(FONT_PATH, 30)  # For date at the bottom
-            watermark_font = ImageFont.truetype(FONT_PATH, 40)  # For bot watermark
+            title_font = load_font(80)  # For collection name
+            subtitle_font = load_font(60)  # For sticker name
+            price_font = load_font(180)  # For USD price
+            ton_price_font = load_font(50)  # For TON price
+            date_font = load_font(30)  # For date at the bottom
+            watermark_font = load_font(40)  # For bot watermark
         except Exception as e:
             logger.error(f"Error loading font: {e}")
             # Fallback to default font
@@ -512,7 +534,7 @@ def generate_price_card(collection, sticker, price, output_dir):
         
         # Draw bot watermark at the top center
         watermark_lines = ["@GiftsChartbot"]
-        watermark_font = ImageFont.truetype(FONT_PATH, 32) if os.path.exists(FONT_PATH) else ImageFont.load_default()
+        watermark_font = load_font(32) if os.path.exists(FONT_PATH) else ImageFont.load_default()
         line_height = watermark_font.getbbox("A")[3] + 5
         watermark_y = 30  # Start position
         
@@ -688,7 +710,7 @@ def generate_price_card(collection, sticker, price, output_dir):
             
             # Add placeholder text
             try:
-                placeholder_font = ImageFont.truetype(FONT_PATH, 40)
+                placeholder_font = load_font(40)
             except:
                 placeholder_font = ton_price_font
             
@@ -710,9 +732,9 @@ def generate_price_card(collection, sticker, price, output_dir):
         draw.text((date_x, date_y), date_text, fill=(100, 100, 100), font=date_font)
         
         # Save the card as WebP
-        output_filename = f"{collection_norm}_{sticker_norm}_price_card.webp"
-        output_path = os.path.join(output_dir, output_filename)
-        card.save(output_path, 'WEBP', quality=85, method=6)
+        output_path = price_card_path(collection, sticker, output_dir)
+        publication.save_image(card, output_path, 'WEBP', quality=85, method=6)
+        write_variants(output_path, card)
         
         logger.info(f"Generated price card: {output_path}")
         return output_path
@@ -720,40 +742,149 @@ def generate_price_card(collection, sticker, price, output_dir):
         logger.error(f"Error generating price card for {collection} - {sticker}: {e}")
         return None
 
-def generate_all_price_cards(price_data, output_dir):
-    """Generate price cards for all stickers with prices"""
+def _render_card(collection, sticker, price, output_dir, price_info):
+    """Render one card in a worker process; errors are returned, never raised."""
+    start = time.time()
+    try:
+        result = generate_price_card(collection, sticker, price, output_dir, price_info)
+        error = None if result else "render returned no card"
+    except Exception as e:
+        result, error = None, str(e)
+    return result, error, time.time() - start
+
+# Long-lived pool reused across batch runs, so workers import Pillow/NumPy once
+_render_pool = None
+_render_pool_size = 0
+
+def _get_render_pool(workers):
+    global _render_pool, _render_pool_size
+    if _render_pool is None or _render_pool_size != workers:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+        # spawn: safe to start from a threaded parent (the refresh orchestrator)
+        _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _render_pool_size = workers
+    return _render_pool
+
+def _discard_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+def price_card_path(collection, sticker, output_dir):
+    """Where generate_price_card writes the card for a sticker"""
+    return os.path.join(output_dir, f"{normalize_name(collection)}_{normalize_name(sticker)}_price_card.webp")
+
+def generate_all_price_cards(price_data, output_dir, workers=None, stats=None, only=None):
+    """Generate price cards for all stickers with prices
+    
+    Prices come from one stats snapshot (fetched here unless passed in), and
+    cards render across RENDER_PROCESSES worker processes. A failing card
+    never stops the batch. A crashed worker breaks the whole pool, so the
+    cards it left unfinished are resubmitted to a fresh pool for as long as
+    each pool gets some cards done. Generated cards are recorded in the publication
+    manifest once the batch is done. Returns a summary dict.
+    
+    If `only` is given (collection, sticker pairs), just those cards are
+    rendered, plus any card that does not exist yet.
+    """
     if not price_data or 'stickers_with_prices' not in price_data:
         logger.error("Invalid price data")
-        return
+        return None
     
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
+    start_time = time.time()
+    workers = workers or RENDER_PROCESSES
     
-    # Reset counters
-    global cached_usage, live_api_usage
-    cached_usage = 0
-    live_api_usage = 0
+    # One stats download for the whole batch instead of one per card
+    if stats is None:
+        stats = sticker_api.get_sticker_stats()
+    price_index = sticker_api.build_price_index(stats)
+    if only is not None:
+        only = {(normalize_name(collection), normalize_name(sticker)) for collection, sticker in only}
     
     # Get stickers
     stickers = price_data['stickers_with_prices']
-    total_stickers = len(stickers)
-    
-    logger.info(f"Generating {total_stickers} price cards...")
+    summary = {
+        'total': len(stickers),
+        'generated': 0,
+        'failed': 0,
+        'missing_price': 0,
+        'unchanged': 0,
+        'failures': [],
+        'render_seconds': 0.0
+    }
+    generated_paths = []
     
-    # Generate cards for each sticker with price
-    for i, item in enumerate(stickers):
+    jobs = []
+    for item in stickers:
         collection = item['collection']
         sticker = item['sticker']
-        price = item['price']
-        
-        logger.info(f"Generating price card for {collection} - {sticker}: {price} TON")
-        
-        result = generate_price_card(collection, sticker, price, output_dir)
-        
-        if not result:
-            safe_print(f"[WARN] WARNING: Could not get live price data for {collection} - {sticker}")
+        key = (normalize_name(collection), normalize_name(sticker))
+        if only is not None and key not in only and os.path.exists(price_card_path(collection, sticker, output_dir)):
+            summary['unchanged'] += 1
+            continue
+        price_info = price_index.get(key)
+        if not price_info:
+            summary['missing_price'] += 1
+            summary['failures'].append({'collection': collection, 'sticker': sticker, 'error': 'no price in snapshot'})
+            continue
+        jobs.append((collection, sticker, item['price'], output_dir, price_info))
+    
+    logger.info(f"Generating {len(jobs)} price cards with {workers} worker(s)...")
+    
+    def record(job, outcome):
+        result, error, seconds = outcome
+        summary['render_seconds'] += seconds
+        if result:
+            summary['generated'] += 1
+            generated_paths.append(result)
+        else:
+            summary['failed'] += 1
+            summary['failures'].append({'collection': job[0], 'sticker': job[1], 'error': error})
+            safe_print(f"[WARN] WARNING: Could not generate price card for {job[0]} - {job[1]}: {error}")
+    
+    if workers <= 1:
+        for job in jobs:
+            record(job, _render_card(*job))
+    else:
+        pending = jobs
+        while pending:
+            pool = _get_render_pool(workers)
+            futures = {pool.submit(_render_card, *job): job for job in pending}
+            unfinished = []
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except BrokenProcessPool:
+                    # A dead worker fails every pending future, not just its own card
+                    unfinished.append(futures[future])
+                    continue
+                except Exception as e:
+                    outcome = (None, f"worker failed: {e}", 0.0)
+                record(futures[future], outcome)
+            if not unfinished:
+                break
+            _discard_render_pool()
+            if len(unfinished) == len(pending):
+                # No card finished before the crash; stop rather than crash again
+                for job in unfinished:
+                    record(job, (None, "render worker crashed", 0.0))
+                break
+            logger.warning(f"Render worker crashed, resubmitting {len(unfinished)} unfinished cards to a new pool")
+            pending = unfinished
     
-    logger.info(f"Price card generation complete: {cached_usage} from cache, {live_api_usage} from live API")
+    summary['generation'] = publication.record(generated_paths)
+    summary['seconds'] = round(time.time() - start_time, 2)
+    summary['render_seconds'] = round(summary['render_seconds'], 2)
+    logger.info(
+        f"Price card generation complete in {summary['seconds']}s: {summary['generated']} generated, "
+        f"{summary['failed']} failed, {summary['missing_price']} without price, {summary['unchanged']} unchanged "
+        f"({summary['render_seconds']}s of render time across {workers} worker(s))"
+    )
+    return summary
 
 def main():
     """Main function"""
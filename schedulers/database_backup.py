@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Database Backup Scheduler
+
+Takes hourly snapshots of the SQLite databases, zips the ones that changed
+since the last delivered backup, and sends the archive to the admin group.
+Once every FULL_BACKUP_INTERVAL_HOURS every database is included, so each one
+always has a recent copy inside the local retention window.
+
+Runs as its own process (like the other schedulers) so snapshotting and
+compression never compete with the bot for CPU. The bot token is only used
+to deliver the file.
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import sqlite3
+import asyncio
+import logging
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+import schedule
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.paths import SQLITE_DATA_DIR
+from core import storage
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Backup configuration
+BACKUP_DIR = os.path.join(SQLITE_DATA_DIR, "backups")
+BACKUP_STATE_FILE = os.path.join(BACKUP_DIR, "backup_state.json")
+MAX_BACKUP_AGE_DAYS = 7
+MAX_BACKUP_COUNT = 50
+BACKUP_INTERVAL_MINUTES = 60  # PRODUCTION: Hourly backups
+FULL_BACKUP_INTERVAL_HOURS = 24  # Include unchanged databases at least this often
+BACKUP_CHUNK_SIZE = 1024 * 1024  # Bytes read per write into the zip
+
+# Group chat that receives the backups
+GROUP_CHAT_ID = -4944651195
+
+# Backup state key holding when every database was last included
+FULL_BACKUP_STATE_KEY = "full_backup_at"
+
+
+def load_backup_state():
+    """Signatures of the databases in the last delivered backup, and when the last full one was."""
+    try:
+        with open(BACKUP_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_backup_state(state):
+    try:
+        with open(BACKUP_STATE_FILE, 'w') as f:
+            json.dump(state, f)
+    except Exception as e:
+        logger.error(f"🔒 Error saving backup state: {e}")
+
+
+def create_backup(sqlite_data_dir=SQLITE_DATA_DIR, backup_dir=BACKUP_DIR):
+    """
+    Snapshot changed databases into a new zip archive.
+
+    Unchanged databases are skipped, except when the last full backup is older
+    than FULL_BACKUP_INTERVAL_HOURS; then every database is included so
+    cleanup_old_backups() never leaves a database without a restorable copy.
+
+    Returns (zip_path, backup_info, state) where state holds the signatures to
+    save once the archive is delivered, or None when there is nothing to send.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    zip_filename = f"database_backup_{timestamp}.zip"
+    zip_path = os.path.join(backup_dir, zip_filename)
+
+    # Databases whose content changed since the last backup
+    state = load_backup_state()
+    full_backup = time.time() - state.get(FULL_BACKUP_STATE_KEY, 0) >= FULL_BACKUP_INTERVAL_HOURS * 3600
+    db_files = []
+    skipped_files = []
+
+    if os.path.exists(sqlite_data_dir):
+        for filename in sorted(os.listdir(sqlite_data_dir)):
+            if filename.endswith('.db'):
+                filepath = os.path.join(sqlite_data_dir, filename)
+                if os.path.isfile(filepath):
+                    if not full_backup and state.get(filename) == storage.content_signature(filepath):
+                        skipped_files.append(filename)
+                    else:
+                        db_files.append(filepath)
+
+    if not db_files:
+        if skipped_files:
+            logger.info(f"🔒 No database changes since last backup ({len(skipped_files)} unchanged), skipping")
+        else:
+            logger.warning("🔒 No valid database files found for backup")
+        return None
+
+    backup_info = {
+        'timestamp': timestamp,
+        'full': full_backup,
+        'files': [],
+        'skipped': skipped_files,
+        'total_size': 0
+    }
+
+    snapshot_dir = tempfile.mkdtemp(prefix="snapshot_", dir=backup_dir)
+    try:
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zipf:
+            for db_file in db_files:
+                arcname = os.path.basename(db_file)
+                signature = storage.content_signature(db_file)
+                snapshot_path = os.path.join(snapshot_dir, arcname)
+
+                # Consistent copy via the online backup API, checked on the
+                # copy so the live database is never scanned
+                try:
+                    storage.snapshot(db_file, snapshot_path)
+                    conn = sqlite3.connect(snapshot_path)
+                    result = conn.execute("PRAGMA quick_check;").fetchone()
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"🔒 Error snapshotting database {db_file}: {e}")
+                    continue
+
+                if not result or result[0] != 'ok':
+                    logger.error(f"🔒 Database integrity check failed for {db_file}")
+                    continue
+
+                # Stream the snapshot into the archive in chunks
+                with open(snapshot_path, 'rb') as src, zipf.open(arcname, 'w', force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, BACKUP_CHUNK_SIZE)
+
+                file_size = os.path.getsize(snapshot_path)
+                os.remove(snapshot_path)
+                state[arcname] = signature
+                backup_info['files'].append({
+                    'name': arcname,
+                    'size': file_size,
+                    'size_mb': round(file_size / (1024*1024), 2)
+                })
+                backup_info['total_size'] += file_size
+
+                logger.info(f"🔒 Added {arcname} to backup ({file_size} bytes)")
+
+            # Add backup info
+            info_content = f"""Database Backup Information
+Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Type: {'Full' if full_backup else 'Changed databases only'}
+Total Files: {len(backup_info['files'])}
+Total Size: {round(backup_info['total_size'] / (1024*1024), 2)} MB
+
+Files Included:
+"""
+            for file_info in backup_info['files']:
+                info_content += f"- {file_info['name']}: {file_info['size_mb']} MB\n"
+            if skipped_files:
+                info_content += "\nUnchanged Since Previous Backup:\n"
+                for filename in skipped_files:
+                    info_content += f"- {filename}\n"
+
+            zipf.writestr("backup_info.txt", info_content)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+    if not backup_info['files']:
+        os.remove(zip_path)
+        logger.warning("🔒 No valid database snapshots were created")
+        return None
+
+    # A full backup only counts once every database made it into the archive
+    if full_backup and len(backup_info['files']) == len(db_files):
+        state[FULL_BACKUP_STATE_KEY] = time.time()
+
+    logger.info(f"🔒 Created backup zip: {zip_filename} ({os.path.getsize(zip_path)} bytes)")
+    return zip_path, backup_info, state
+
+
+async def send_backup(zip_path, backup_info):
+    """Deliver a backup archive to the admin group through the bot."""
+    from telegram import Bot
+    from core.bot_config import BOT_TOKEN
+
+    file_size_mb = round(os.path.getsize(zip_path) / (1024*1024), 2)
+
+    caption = f"""🔒 **Database Backup Report**
+
+📅 **Backup Time**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+📊 **Files Backed Up**: {len(backup_info['files'])}
+💾 **Total Size**: {file_size_mb} MB
+🔐 **Backup Status**: ✅ Complete
+🗂️ **Backup Type**: {'Full' if backup_info['full'] else 'Changed databases only'}
+
+**Databases Included:**
+"""
+
+    for file_info in backup_info['files']:
+        caption += f"• {file_info['name']}: {file_info['size_mb']} MB\n"
+    if backup_info['skipped']:
+        caption += f"• Unchanged (not included): {', '.join(backup_info['skipped'])}\n"
+
+    caption += "\n💡 **Tip**: Extract this zip file to restore your databases if needed."
+
+    try:
+        async with Bot(token=BOT_TOKEN) as backup_bot:
+            with open(zip_path, 'rb') as backup_file:
+                await backup_bot.send_document(
+                    chat_id=GROUP_CHAT_ID,
+                    document=backup_file,
+                    caption=caption,
+                    parse_mode='Markdown'
+                )
+        logger.info(f"🔒 Successfully sent backup to group chat {GROUP_CHAT_ID}")
+        return True
+    except Exception as e:
+        logger.error(f"🔒 Failed to send backup to group chat {GROUP_CHAT_ID}: {e}")
+        return False
+
+
+def cleanup_old_backups(backup_dir=BACKUP_DIR, max_age_days=MAX_BACKUP_AGE_DAYS, max_count=MAX_BACKUP_COUNT):
+    """Clean up old backup files."""
+    try:
+        now = datetime.now()
+        deleted_count = 0
+
+        # Get all backup files
+        backup_files = []
+        for filename in os.listdir(backup_dir):
+            if filename.startswith('database_backup_') and filename.endswith('.zip'):
+                filepath = os.path.join(backup_dir, filename)
+                if os.path.isfile(filepath):
+                    backup_files.append((filepath, os.path.getmtime(filepath)))
+
+        # Sort by modification time (newest first)
+        backup_files.sort(key=lambda x: x[1], reverse=True)
+
+        # Remove files older than max_age_days
+        for filepath, mtime in backup_files:
+            file_age = now - datetime.fromtimestamp(mtime)
+            if file_age.days > max_age_days:
+                os.remove(filepath)
+                deleted_count += 1
+                logger.info(f"🔒 Deleted old backup: {os.path.basename(filepath)}")
+
+        # Remove excess files if we have too many
+        if len(backup_files) > max_count:
+            excess_files = backup_files[max_count:]
+            for filepath, _ in excess_files:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    deleted_count += 1
+                    logger.info(f"🔒 Deleted excess backup: {os.path.basename(filepath)}")
+
+        if deleted_count > 0:
+            logger.info(f"🔒 Cleaned up {deleted_count} old backup files")
+
+    except Exception as e:
+        logger.error(f"🔒 Error during backup cleanup: {e}")
+
+
+def run_backup_job():
+    """Job function that creates and delivers one backup."""
+    try:
+        logger.info("🔔 Scheduled database backup triggered")
+        backup = create_backup()
+        if backup is None:
+            return True
+
+        zip_path, backup_info, state = backup
+        sent = asyncio.run(send_backup(zip_path, backup_info))
+        if sent:
+            # Only remember what was delivered, so a failed send is retried
+            save_backup_state(state)
+
+        cleanup_old_backups()
+        return sent
+    except Exception as e:
+        logger.error(f"🔒 Error creating backup: {e}")
+        return False
+
+
+def main():
+    """Run the database backup scheduler."""
+    logger.info("=" * 60)
+    logger.info("🔒 Database Backup Scheduler Started")
+    logger.info(f"⏰ Backup Frequency: Every {BACKUP_INTERVAL_MINUTES} minutes")
+    logger.info("=" * 60)
+
+    schedule.every(BACKUP_INTERVAL_MINUTES).minutes.do(run_backup_job)
+
+    # Run initial backup immediately
+    logger.info("🔒 Performing initial backup...")
+    run_backup_job()
+
+    next_run = datetime.now() + timedelta(minutes=BACKUP_INTERVAL_MINUTES)
+    logger.info(f"🔒 Next backup scheduled for: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    try:
+        while True:
+            schedule.run_pending()
+            time.sleep(60)  # Check every minute
+    except KeyboardInterrupt:
+        logger.info("\n⚠️  Backup scheduler stopped by user")
+        return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        logger.error(f"❌ Scheduler error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
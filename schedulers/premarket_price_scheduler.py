@@ -3,18 +3,32 @@
 Premarket Gift Price Scheduler
 Automatically fetches prices for all 4 premarket gifts every 32 minutes
 Uses advanced CloudFlare bypass for maximum success rate
+
+Gifts are fetched concurrently within the upstream's budget
+(MAX_CONCURRENT_FETCHES in flight, MIN_FETCH_INTERVAL_SECONDS between
+request starts). Every attempt's outcome and latency is stored in the price
+history store, and each run's summary is kept in last_run_summary for the
+refresh status file.
 """
 
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
 import asyncio
 import time
 import logging
 import signal
-import sys
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 # Import our advanced bypass system
 from advanced_cloudflare_bypass import AdvancedTonnelAPI, get_bypass_stats
+from services import price_history
 
 # Configure logging
 logging.basicConfig(
@@ -27,12 +41,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Upstream budget: at most this many requests in flight...
+MAX_CONCURRENT_FETCHES = 3
+
+# ...and at least this long between request starts (seconds)
+MIN_FETCH_INTERVAL_SECONDS = 0.5
+
+# Source name for this scheduler's rows in the price history fetch stats
+FETCH_STATS_SOURCE = "tonnel_premarket"
+
+# Window of persisted fetch stats reported by get_comprehensive_stats (days)
+FETCH_STATS_WINDOW_DAYS = 7
+
 class PremarketScheduler:
     def __init__(self):
         self.api = AdvancedTonnelAPI()
         self.running = True
         self.last_run = None
         self.run_count = 0
+        self.last_run_summary = None
+        self._next_fetch_start = 0
         
         # All premarket gifts (new 2025 releases)
         self.premarket_gifts = [
@@ -93,24 +121,44 @@ class PremarketScheduler:
             self.stats['gift_failure_count'][gift_name] += 1
             return None
     
+    async def _throttled_fetch(self, gift_name: str, semaphore, start_lock, attempts: List[Dict]) -> Optional[float]:
+        """Fetch one gift within the upstream budget and note the attempt."""
+        async with semaphore:
+            async with start_lock:
+                wait = self._next_fetch_start - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_fetch_start = time.monotonic() + MIN_FETCH_INTERVAL_SECONDS
+            start_time = time.time()
+            price = await self.fetch_single_gift(gift_name)
+            attempts.append({
+                'gift_name': gift_name,
+                'success': price is not None,
+                'latency': time.time() - start_time
+            })
+            return price
+    
     async def fetch_all_premarket_gifts(self) -> Dict[str, Optional[float]]:
-        """Fetch prices for all premarket gifts."""
+        """Fetch prices for all premarket gifts concurrently."""
         logger.info("🚀 Starting premarket gift price collection...")
         logger.info(f"📊 Run #{self.run_count + 1} - Fetching {len(self.premarket_gifts)} gifts")
         
         start_time = time.time()
-        results = {}
+        attempts = []
         
-        # Fetch all gifts (can be done concurrently but we'll do them sequentially 
-        # to avoid overwhelming the API)
-        for gift in self.premarket_gifts:
-            results[gift] = await self.fetch_single_gift(gift)
-            
-            # Add small delay between gifts to be respectful to the API
-            await asyncio.sleep(2)
+        # Created per run so they belong to the running event loop
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        start_lock = asyncio.Lock()
+        prices = await asyncio.gather(*(
+            self._throttled_fetch(gift, semaphore, start_lock, attempts) for gift in self.premarket_gifts
+        ))
+        results = dict(zip(self.premarket_gifts, prices))
         
         elapsed_time = time.time() - start_time
         
+        # SQLite write off the event loop
+        await asyncio.to_thread(price_history.record_fetches, FETCH_STATS_SOURCE, attempts)
+        
         # Calculate success rate for this run
         successful_gifts = sum(1 for price in results.values() if price is not None)
         success_rate = (successful_gifts / len(self.premarket_gifts)) * 100
@@ -128,6 +176,15 @@ class PremarketScheduler:
         
         logger.info("=" * 60)
         
+        self.last_run_summary = {
+            'finished_at': datetime.now().isoformat(),
+            'seconds': round(elapsed_time, 2),
+            'gifts': len(self.premarket_gifts),
+            'successful': successful_gifts,
+            'success_rate': round(success_rate, 1),
+            'prices': results,
+            'latency_seconds': {a['gift_name']: round(a['latency'], 2) for a in attempts},
+        }
         return results
     
     def get_comprehensive_stats(self) -> Dict:
@@ -140,12 +197,22 @@ class PremarketScheduler:
         # Get bypass method statistics
         bypass_stats = get_bypass_stats()
         
+        # Per-gift reliability across restarts, from the price history store
+        try:
+            since = int(time.time()) - FETCH_STATS_WINDOW_DAYS * 86400
+            persisted_stats = price_history.get_fetch_stats(FETCH_STATS_SOURCE, since)
+        except Exception as e:
+            logger.error(f"Error loading persisted fetch stats: {e}")
+            persisted_stats = {}
+        
         return {
             'scheduler_stats': self.stats,
             'overall_success_rate': overall_success_rate,
             'total_attempts': total_attempts,
             'total_successes': total_successes,
             'bypass_method_stats': bypass_stats,
+            'persisted_gift_stats': persisted_stats,
+            'last_run': self.last_run_summary,
             'uptime': (datetime.now() - self.start_time).total_seconds() if hasattr(self, 'start_time') else 0
         }
     
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Refresh Orchestrator
+
+One long-lived process that runs the whole price/card refresh as a job graph:
+
+    fetch_sticker_stats -> update_sticker_prices -> render_sticker_cards -+
+    render_goodies_cards --------------------------------------------------+-> publish_status
+    render_gift_cards -----------------------------------------------------+
+    fetch_premarket_prices ------------------------------------------------+
+    fetch_mrkt_collections (independent)
+    prune_price_history (independent)
+
+Replaces the chain of schedulers that shelled out to separate scripts
+(scheduled_sticker_update.py, sticker_updater.py, pregenerate_gift_cards.py's
+own loop). Everything runs in this process, so Pillow, NumPy, fonts and the
+API modules' caches are loaded once and stay warm between cycles.
+
+Each job gets the shared `state` dict, which lives as long as the process.
+Sticker cards are re-rendered only for stickers whose displayed values
+changed in update_sticker_prices, plus a periodic full sweep so the date
+printed on unchanged cards does not go stale. Gift cards are re-rendered only
+when services.freshness says they are due, within its upstream call budget.
+
+A job whose dependency failed is skipped. Every job is timed, and a cycle
+that is still running when the next one is due is skipped, not overlapped.
+"""
+
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core import publication
+from config.paths import (
+    STICKER_PRICE_RESULTS_FILE, STICKER_PRICE_CARDS_DIR, MRKT_API_DIR, REFRESH_STATUS_FILE
+)
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# How often a refresh cycle starts
+CYCLE_INTERVAL_MINUTES = 30
+
+# Independent jobs run side by side (e.g. network-bound gift cards next to
+# CPU-bound sticker cards)
+MAX_PARALLEL_JOBS = 2
+
+# Re-render every sticker card this often, even if nothing changed (0 disables)
+STICKER_FULL_SWEEP_HOURS = float(os.getenv("STICKER_FULL_SWEEP_HOURS", "6"))
+
+# Job outcomes
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+class Job:
+    """One step of a refresh cycle.
+
+    func(state) does the work; its return value is stored as state[name].
+    `depends` must succeed first, `after` only has to have finished.
+    """
+
+    def __init__(self, name, func, depends=(), after=()):
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.after = tuple(after)
+
+
+class RefreshOrchestrator:
+    """Runs a graph of jobs as one cycle at a time."""
+
+    def __init__(self, jobs, max_parallel=MAX_PARALLEL_JOBS):
+        self.jobs = {job.name: job for job in jobs}
+        self.max_parallel = max_parallel
+        self.state = {}
+        self.cycle_count = 0
+        self.last_report = None
+        self._running = threading.Lock()
+        self._validate()
+
+    def _validate(self):
+        for job in self.jobs.values():
+            for dep in job.depends + job.after:
+                if dep not in self.jobs:
+                    raise ValueError(f"Job {job.name} depends on unknown job {dep}")
+
+        # Reject cycles with a depth-first walk
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Job graph has a cycle through {name}")
+            visiting.add(name)
+            for dep in self.jobs[name].depends + self.jobs[name].after:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.jobs:
+            visit(name)
+
+    def is_running(self):
+        return self._running.locked()
+
+    def run_cycle(self):
+        """Run every job once. Returns the cycle report, or None if a cycle is already running."""
+        if not self._running.acquire(blocking=False):
+            logger.warning("⏳ Previous refresh cycle still running, skipping this one")
+            return None
+        try:
+            return self._run_cycle()
+        finally:
+            self._running.release()
+
+    def start_cycle(self):
+        """Run a cycle in a background thread so the scheduler loop keeps ticking."""
+        if self.is_running():
+            logger.warning("⏳ Previous refresh cycle still running, skipping this one")
+            return False
+        threading.Thread(target=self.run_cycle, name="refresh-cycle", daemon=True).start()
+        return True
+
+    def _run_cycle(self):
+        self.cycle_count += 1
+        cycle_start = time.time()
+        report = {
+            "cycle": self.cycle_count,
+            "started_at": datetime.now().isoformat(),
+            "jobs": {}
+        }
+        logger.info(f"🔄 Refresh cycle #{self.cycle_count} started")
+
+        results = {}
+        pending = dict(self.jobs)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="refresh-job") as pool:
+            while pending or running:
+                # Start everything whose prerequisites have finished
+                for name, job in list(pending.items()):
+                    if not all(dep in results for dep in job.depends + job.after):
+                        continue
+                    del pending[name]
+                    failed_deps = [dep for dep in job.depends if results[dep] != STATUS_OK]
+                    if failed_deps:
+                        results[name] = STATUS_SKIPPED
+                        report["jobs"][name] = {"status": STATUS_SKIPPED, "seconds": 0,
+                                                "reason": f"dependency failed: {', '.join(failed_deps)}"}
+                        logger.warning(f"⏭️ {name} skipped ({', '.join(failed_deps)} did not succeed)")
+                        continue
+                    running[pool.submit(self._run_job, job)] = name
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    job_report = future.result()
+                    results[name] = job_report["status"]
+                    report["jobs"][name] = job_report
+
+        report["seconds"] = round(time.time() - cycle_start, 2)
+        report["finished_at"] = datetime.now().isoformat()
+        self.last_report = report
+
+        timings = ", ".join(f"{name}: {info['status']} {info['seconds']}s" for name, info in report["jobs"].items())
+        logger.info(f"✅ Refresh cycle #{self.cycle_count} finished in {report['seconds']}s ({timings})")
+        return report
+
+    def _run_job(self, job):
+        start = time.time()
+        try:
+            self.state[job.name] = job.func(self.state)
+            status, error = STATUS_OK, None
+        except Exception as e:
+            logger.error(f"❌ Refresh job {job.name} failed: {e}")
+            status, error = STATUS_FAILED, str(e)
+        job_report = {"status": status, "seconds": round(time.time() - start, 2)}
+        if error:
+            job_report["error"] = error
+        return job_report
+
+
+# =============================================================================
+# Jobs
+# =============================================================================
+
+def fetch_sticker_stats(state):
+    """Download the stickers.tools stats payload once for the whole cycle."""
+    import services.stickers_tools_api as sticker_api
+    stats = sticker_api.get_sticker_stats()
+    logger.info(f"📥 Fetched stats for {len(stats.get('collections', {}))} sticker collections")
+    return stats
+
+
+def update_sticker_prices(state):
+    """Returns the (collection, sticker) pairs whose displayed values changed."""
+    from schedulers import update_sticker_prices as updater
+    return updater.update_sticker_prices(stats=state["fetch_sticker_stats"])
+
+
+def full_sweep_due(state, now=None):
+    """Whether every sticker card should be re-rendered this cycle."""
+    last_sweep = state.get("last_full_sticker_sweep")
+    if last_sweep is None:
+        return True
+    if STICKER_FULL_SWEEP_HOURS <= 0:
+        return False
+    now = time.time() if now is None else now
+    return now - last_sweep >= STICKER_FULL_SWEEP_HOURS * 3600
+
+
+def render_sticker_cards(state):
+    from generators.sticker_price_card_generator import generate_all_price_cards
+    with open(STICKER_PRICE_RESULTS_FILE, 'r') as f:
+        price_data = json.load(f)
+
+    # The first cycle of a process always sweeps, so a restart catches up
+    full_sweep = full_sweep_due(state)
+    only = None if full_sweep else state["update_sticker_prices"]
+    summary = generate_all_price_cards(price_data, STICKER_PRICE_CARDS_DIR,
+                                       stats=state["fetch_sticker_stats"], only=only)
+    if summary is None:
+        raise RuntimeError("invalid sticker price data")
+    if full_sweep:
+        state["last_full_sticker_sweep"] = time.time()
+    summary["full_sweep"] = full_sweep
+    return summary
+
+
+def render_goodies_cards(state):
+    from generators.goodies_price_card_generator import generate_all_goodies_cards
+    return generate_all_goodies_cards(STICKER_PRICE_CARDS_DIR)
+
+
+def render_gift_cards(state):
+    from generators import pregenerate_gift_cards
+    # Include cards that fall due before the next cycle
+    names = pregenerate_gift_cards.due_gift_names(lookahead_seconds=CYCLE_INTERVAL_MINUTES * 60)
+    if not names:
+        return {"due": 0, "successful": 0, "failed": 0}
+    successful, failed = pregenerate_gift_cards.generate_all_cards(names)
+    if successful == 0:
+        raise RuntimeError(f"no gift cards generated ({failed} failed)")
+    return {"due": len(names), "successful": successful, "failed": failed}
+
+
+def fetch_mrkt_collections(state):
+    """Refresh the MRKT collections JSON used as a price fallback."""
+    if MRKT_API_DIR not in sys.path:
+        sys.path.insert(0, MRKT_API_DIR)
+    import download_gifts_json
+    asyncio.run(download_gifts_json.download_json())
+
+
+def prune_price_history(state):
+    """Apply price history retention here, off the bot's price-recording path."""
+    from services import price_history
+    return {"deleted": price_history.apply_retention()}
+
+
+def fetch_premarket_prices(state):
+    # One scheduler instance per process keeps its session and stats warm
+    scheduler = state.get("premarket_scheduler")
+    if scheduler is None:
+        from schedulers.premarket_price_scheduler import PremarketScheduler
+        scheduler = state["premarket_scheduler"] = PremarketScheduler()
+    asyncio.run(scheduler.fetch_all_premarket_gifts())
+    return scheduler.last_run_summary
+
+
+def publish_status(state):
+    """Write the last cycle's inputs and outputs for the bot and monitoring."""
+    status = {
+        "published_at": time.time(),
+        "generation": publication.current_generation(),
+        "sticker_cards": state.get("render_sticker_cards"),
+        "goodies_cards": state.get("render_goodies_cards"),
+        "gift_cards": state.get("render_gift_cards"),
+        "premarket_prices": state.get("fetch_premarket_prices"),
+    }
+    publication.publish_json(REFRESH_STATUS_FILE, status)
+    return status
+
+
+def build_jobs():
+    """The production refresh graph."""
+    jobs = [
+        Job("fetch_sticker_stats", fetch_sticker_stats),
+        Job("update_sticker_prices", update_sticker_prices, depends=["fetch_sticker_stats"]),
+        Job("render_sticker_cards", render_sticker_cards, depends=["update_sticker_prices"]),
+        Job("render_goodies_cards", render_goodies_cards),
+        Job("render_gift_cards", render_gift_cards),
+        Job("fetch_mrkt_collections", fetch_mrkt_collections),
+        Job("prune_price_history", prune_price_history),
+    ]
+    status_after = ["render_sticker_cards", "render_goodies_cards", "render_gift_cards"]
+
+    try:
+        import schedulers.premarket_price_scheduler  # noqa: F401
+        jobs.append(Job("fetch_premarket_prices", fetch_premarket_prices))
+        status_after.append("fetch_premarket_prices")
+    except ImportError as e:
+        logger.warning(f"⚠️ Premarket price job disabled: {e}")
+
+    jobs.append(Job("publish_status", publish_status, after=status_after))
+    return jobs
+
+
+def main():
+    """Run the refresh orchestrator."""
+    import schedule
+
+    logger.info("=" * 60)
+    logger.info("🔄 Refresh Orchestrator Started")
+    logger.info(f"⏰ Cycle Frequency: Every {CYCLE_INTERVAL_MINUTES} minutes")
+    logger.info("=" * 60)
+
+    orchestrator = RefreshOrchestrator(build_jobs())
+    schedule.every(CYCLE_INTERVAL_MINUTES).minutes.do(orchestrator.start_cycle)
+
+    # Run the first cycle immediately
+    orchestrator.start_cycle()
+
+    try:
+        while True:
+            schedule.run_pending()
+            time.sleep(10)
+    except KeyboardInterrupt:
+        logger.info("\n⚠️  Refresh orchestrator stopped by user")
+        return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        logger.error(f"❌ Scheduler error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -5,6 +5,9 @@ Scheduled Sticker Update
 This script runs the fetch_sticker_prices.py script periodically (every 30 minutes)
 to keep the database updated with real-time price data from stickers.tools API
 and regenerate all price cards.
+
+Superseded in production by schedulers/refresh_orchestrator.py, which runs
+the same steps in-process; kept for manual runs.
 """
 
 import os
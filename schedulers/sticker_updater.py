@@ -8,6 +8,9 @@ This script, every 32 minutes:
   3. Logs and prints status
 
 It is Windows-safe and does not modify the original scripts.
+
+Superseded in production by schedulers/refresh_orchestrator.py, which runs
+the same steps in-process; kept for manual runs.
 """
 import os
 import sys
@@ -12,8 +12,8 @@ Architecture:
 
 import sys
 import os
-import sqlite3
 import time
+import json
 import logging
 from datetime import datetime
 
@@ -21,6 +21,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.paths import PREMIUM_DB_FILE, USER_REQUESTS_DB_FILE
+from core import storage
 from core.supabase_client import (
     SUPABASE_ENABLED,
     PSYCOPG2_AVAILABLE,
@@ -36,6 +37,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT ... VALUES statement sent to Supabase
+SYNC_PAGE_SIZE = 1000
+
+# Rejected rows kept in sync_quarantine; the oldest are dropped beyond this
+SYNC_QUARANTINE_MAX_ROWS = 10000
+
 class SupabaseBackupSync:
     """Sync SQLite data to Supabase as cloud backup."""
     
@@ -65,52 +72,199 @@ class SupabaseBackupSync:
         
         return True
     
-    def sync_table(self, sqlite_conn, pg_conn, table_name: str, columns: list) -> dict:
+    def sync_table(self, sqlite_conn, pg_conn, table_name: str, columns: list, source_columns: list = None) -> dict:
         """
         Sync a single table from SQLite to Supabase.
         
         Strategy: UPSERT (insert or update on conflict)
         """
-        return self.sync_table_with_mapping(sqlite_conn, pg_conn, table_name, table_name, columns)
+        return self.sync_table_with_mapping(sqlite_conn, pg_conn, table_name, table_name, columns, source_columns)
+    
+    def ensure_change_tracking(self, sqlite_conn, table_name: str):
+        """
+        Install the changelog table and the triggers that feed it for a table.
+        
+        Every insert or update appends (table, rowid) to sync_changes, and
+        sync_state keeps the last changelog sequence shipped per table, so a
+        sync only reads rows that changed since the previous run.
+        """
+        cursor = sqlite_conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT PRIMARY KEY,
+                last_seq INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_changes_table ON sync_changes (table_name, seq)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_quarantine (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_data TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at TEXT NOT NULL
+            )
+        ''')
+        for event in ("INSERT", "UPDATE"):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS sync_{table_name}_{event.lower()}
+                AFTER {event} ON {table_name}
+                BEGIN
+                    INSERT INTO sync_changes (table_name, row_id) VALUES ('{table_name}', NEW.rowid);
+                END
+            ''')
+        sqlite_conn.commit()
     
-    def sync_table_with_mapping(self, sqlite_conn, pg_conn, sqlite_table: str, supabase_table: str, columns: list) -> dict:
+    def fetch_changed_rows(self, sqlite_conn, table_name: str, columns: list):
+        """
+        Return (rows, high_seq) for rows changed since the last successful sync.
+        
+        The first sync of a table ships every row; after that only rows named
+        in sync_changes up to high_seq are read.
+        """
+        self.ensure_change_tracking(sqlite_conn, table_name)
+        cursor = sqlite_conn.cursor()
+        columns_str = ', '.join(columns)
+        
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changes WHERE table_name = ?", (table_name,))
+        high_seq = cursor.fetchone()[0]
+        
+        cursor.execute("SELECT last_seq FROM sync_state WHERE table_name = ?", (table_name,))
+        state = cursor.fetchone()
+        
+        if state is None:
+            cursor.execute(f"SELECT {columns_str} FROM {table_name}")
+        else:
+            # The changelog may have been pruned empty; never move the watermark back
+            high_seq = max(high_seq, state[0])
+            cursor.execute(f'''
+                SELECT {columns_str} FROM {table_name}
+                WHERE rowid IN (
+                    SELECT DISTINCT row_id FROM sync_changes
+                    WHERE table_name = ? AND seq > ? AND seq <= ?
+                )
+            ''', (table_name, state[0], high_seq))
+        return cursor.fetchall(), high_seq
+    
+    def mark_synced(self, sqlite_conn, table_name: str, high_seq: int):
+        """Advance the watermark for a table and drop changelog rows it covers."""
+        cursor = sqlite_conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO sync_state (table_name, last_seq) VALUES (?, ?)",
+            (table_name, high_seq)
+        )
+        cursor.execute("DELETE FROM sync_changes WHERE table_name = ? AND seq <= ?", (table_name, high_seq))
+        sqlite_conn.commit()
+    
+    def quarantine_rows(self, sqlite_conn, table_name: str, failed: list):
+        """
+        Keep rows Supabase rejected, so the watermark can move past them without losing them.
+        
+        Only the newest SYNC_QUARANTINE_MAX_ROWS rows are kept.
+        """
+        now = datetime.now().isoformat()
+        cursor = sqlite_conn.cursor()
+        cursor.executemany(
+            "INSERT INTO sync_quarantine (table_name, row_data, error, failed_at) VALUES (?, ?, ?, ?)",
+            [(table_name, json.dumps(list(row), default=str), str(error).strip(), now) for row, error in failed]
+        )
+        cursor.execute(
+            "DELETE FROM sync_quarantine WHERE id <= (SELECT MAX(id) FROM sync_quarantine) - ?",
+            (SYNC_QUARANTINE_MAX_ROWS,)
+        )
+        sqlite_conn.commit()
+    
+    def upsert_rows(self, pg_conn, upsert_query: str, rows: list):
+        """
+        Send rows as batched UPSERTs, narrowing down on failure.
+        
+        The whole batch goes in one transaction; if Supabase rejects a row
+        (DataError, IntegrityError), each page is retried on its own, and each
+        row of a failing page on its own. Returns (synced, failed) where
+        failed lists (row, error) for the rejected rows.
+        
+        Any other error (missing table, bad ON CONFLICT target, lost
+        connection) breaks every statement alike, so it is raised and the
+        table is not synced this run.
+        """
+        import psycopg2
+        from psycopg2.extras import execute_values
+        
+        pg_cursor = pg_conn.cursor()
+        
+        def attempt(batch):
+            try:
+                execute_values(pg_cursor, upsert_query, batch, page_size=SYNC_PAGE_SIZE)
+                pg_conn.commit()
+                return None
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                pg_conn.rollback()
+                return e
+            except Exception:
+                if not pg_conn.closed:
+                    pg_conn.rollback()
+                raise
+        
+        # One round trip per page of rows instead of one per row
+        if attempt(rows) is None:
+            return len(rows), []
+        
+        synced, failed = 0, []
+        for start in range(0, len(rows), SYNC_PAGE_SIZE):
+            page = rows[start:start + SYNC_PAGE_SIZE]
+            if len(page) < len(rows) and attempt(page) is None:
+                synced += len(page)
+                continue
+            for row in page:
+                error = attempt([row])
+                if error is None:
+                    synced += 1
+                else:
+                    failed.append((row, error))
+        return synced, failed
+    
+    def sync_table_with_mapping(self, sqlite_conn, pg_conn, sqlite_table: str, supabase_table: str, columns: list,
+                                source_columns: list = None) -> dict:
         """
         Sync a single table from SQLite to Supabase with different table names.
         
-        Strategy: UPSERT (insert or update on conflict)
+        Strategy: ship only rows changed since the last sync, as batched
+        UPSERTs (insert or update on conflict) with execute_values. Rows
+        Supabase rejects are quarantined in SQLite and do not hold back the
+        rest of the table; any other error leaves the watermark in place, so
+        the same rows are sent again next run. source_columns lists the SQLite
+        expressions for each Supabase column when the two schemas differ.
         """
         try:
-            sqlite_cursor = sqlite_conn.cursor()
-            pg_cursor = pg_conn.cursor()
-            
-            # Get all rows from SQLite
-            sqlite_cursor.execute(f"SELECT * FROM {sqlite_table}")
-            rows = sqlite_cursor.fetchall()
+            rows, high_seq = self.fetch_changed_rows(sqlite_conn, sqlite_table, source_columns or columns)
             
             if not rows:
-                logger.info(f"  ℹ️  {sqlite_table} → {supabase_table}: No data to sync")
+                self.mark_synced(sqlite_conn, sqlite_table, high_seq)
+                logger.info(f"  ℹ️  {sqlite_table} → {supabase_table}: No changes to sync")
                 return {"synced": 0, "errors": 0}
             
-            synced = 0
-            errors = 0
-            
-            # Prepare UPSERT query (PostgreSQL specific)
-            placeholders = ', '.join(['%s'] * len(columns))
             columns_str = ', '.join(columns)
             
             # Build conflict resolution based on table
             if supabase_table == 'premium_subscriptions':
                 conflict_target = '(owner_id, group_id)'
                 update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['id']])
-            elif supabase_table == 'rate_limit_user_requests':
+            elif supabase_table == 'user_requests':
                 conflict_target = '(user_id, chat_id, gift_name)'
                 update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['user_id', 'chat_id', 'gift_name']])
-            elif supabase_table == 'rate_limit_command_requests':
-                conflict_target = '(user_id, chat_id, command_name)'
-                update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['user_id', 'chat_id', 'command_name']])
+            elif supabase_table == 'command_requests':
+                conflict_target = '(user_id, chat_id, command_name, minute)'
+                update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['user_id', 'chat_id', 'command_name', 'minute']])
             elif supabase_table == 'message_owners':
-                conflict_target = '(message_id, chat_id)'
-                update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['message_id', 'chat_id']])
+                conflict_target = '(user_id, chat_id, message_id)'
+                update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col not in ['user_id', 'chat_id', 'message_id']])
             elif supabase_table == 'refunded_groups':
                 conflict_target = '(group_id)'
                 update_set = ', '.join([f"{col} = EXCLUDED.{col}" for col in columns if col != 'group_id'])
@@ -121,28 +275,25 @@ class SupabaseBackupSync:
             
             upsert_query = f"""
                 INSERT INTO {supabase_table} ({columns_str})
-                VALUES ({placeholders})
+                VALUES %s
                 ON CONFLICT {conflict_target}
                 DO UPDATE SET {update_set}
             """
             
-            # Sync each row
-            for row in rows:
-                try:
-                    pg_cursor.execute(upsert_query, row)
-                    synced += 1
-                except Exception as e:
-                    logger.error(f"  ❌ Error syncing row in {sqlite_table} → {supabase_table}: {e}")
-                    errors += 1
+            synced, failed = self.upsert_rows(pg_conn, upsert_query, rows)
+            if failed:
+                self.quarantine_rows(sqlite_conn, sqlite_table, failed)
+                logger.error(f"  ❌ {sqlite_table} → {supabase_table}: {len(failed)} rows rejected and quarantined "
+                             f"(first error: {str(failed[0][1]).strip()})")
             
-            pg_conn.commit()
-            logger.info(f"  ✅ {sqlite_table} → {supabase_table}: {synced} rows synced, {errors} errors")
+            self.mark_synced(sqlite_conn, sqlite_table, high_seq)
+            logger.info(f"  ✅ {sqlite_table} → {supabase_table}: {synced} changed rows synced")
             
-            return {"synced": synced, "errors": errors}
+            return {"synced": synced, "errors": len(failed)}
             
         except Exception as e:
-            logger.error(f"  ❌ Error syncing table {sqlite_table} → {supabase_table}: {e}")
-            return {"synced": 0, "errors": 1}
+            logger.error(f"  ❌ Error syncing table {sqlite_table} → {supabase_table}, will retry next run: {e}")
+            return {"synced": 0, "errors": 1, "aborted": True}
     
     def sync_premium_database(self) -> dict:
         """Sync premium_system.db to Supabase."""
@@ -150,7 +301,7 @@ class SupabaseBackupSync:
         
         try:
             # Connect to SQLite
-            sqlite_conn = sqlite3.connect(self.premium_db)
+            sqlite_conn = storage.connect(self.premium_db)
             
             # Connect to Supabase
             pg_conn = get_connection()
@@ -182,20 +333,28 @@ class SupabaseBackupSync:
                 sqlite_conn, pg_conn,
                 'refunds',
                 ['id', 'owner_id', 'group_id', 'payment_id', 'telegram_payment_charge_id',
-                 'reason', 'status', 'created_at', 'processed_at', 'processed_by']
+                 'reason', 'status', 'created_at', 'processed_at', 'processed_by'],
+                ['id', 'owner_id', 'group_id', 'payment_id', 'NULL',
+                 'refund_reason', 'status', 'refunded_at', 'NULL', 'processed_by']
             )
             
             # Sync refunded_groups
             results['refunded_groups'] = self.sync_table(
                 sqlite_conn, pg_conn,
                 'refunded_groups',
-                ['group_id', 'refund_date']
+                ['group_id', 'refund_date'],
+                ['group_id', 'refunded_at']
             )
             
             # Close connections
             sqlite_conn.close()
             release_connection(pg_conn)
             
+            aborted = [table for table, result in results.items() if result.get('aborted')]
+            if aborted:
+                logger.error(f"❌ Premium database sync incomplete, not synced: {', '.join(aborted)}")
+                return {"success": False, "results": results}
+            
             logger.info("✅ Premium database sync complete")
             return {"success": True, "results": results}
             
@@ -209,7 +368,7 @@ class SupabaseBackupSync:
         
         try:
             # Connect to SQLite
-            sqlite_conn = sqlite3.connect(self.user_requests_db)
+            sqlite_conn = storage.connect(self.user_requests_db)
             
             # Connect to Supabase
             pg_conn = get_connection()
@@ -220,33 +379,38 @@ class SupabaseBackupSync:
             
             results = {}
             
-            # Sync user_requests (SQLite) → rate_limit_user_requests (Supabase)
-            results['user_requests'] = self.sync_table_with_mapping(
+            # Sync user_requests
+            results['user_requests'] = self.sync_table(
                 sqlite_conn, pg_conn,
-                sqlite_table='user_requests',
-                supabase_table='rate_limit_user_requests',
-                columns=['user_id', 'chat_id', 'gift_name', 'minute']
+                'user_requests',
+                ['user_id', 'chat_id', 'gift_name', 'minute']
             )
             
-            # Sync command_requests (SQLite) → rate_limit_command_requests (Supabase)
-            results['command_requests'] = self.sync_table_with_mapping(
+            # Sync command_requests (timestamps are epoch seconds in SQLite, TIMESTAMP in Supabase)
+            results['command_requests'] = self.sync_table(
                 sqlite_conn, pg_conn,
-                sqlite_table='command_requests',
-                supabase_table='rate_limit_command_requests',
-                columns=['user_id', 'chat_id', 'command_name', 'minute', 'timestamp']
+                'command_requests',
+                ['user_id', 'chat_id', 'command_name', 'minute', 'timestamp'],
+                ['user_id', 'chat_id', 'command_name', 'minute', "datetime(timestamp, 'unixepoch')"]
             )
             
             # Sync message_owners
             results['message_owners'] = self.sync_table(
                 sqlite_conn, pg_conn,
                 'message_owners',
-                ['message_id', 'chat_id', 'user_id', 'timestamp']
+                ['message_id', 'chat_id', 'user_id', 'timestamp'],
+                ['message_id', 'chat_id', 'user_id', "datetime(timestamp, 'unixepoch')"]
             )
             
             # Close connections
             sqlite_conn.close()
             release_connection(pg_conn)
             
+            aborted = [table for table, result in results.items() if result.get('aborted')]
+            if aborted:
+                logger.error(f"❌ User requests database sync incomplete, not synced: {', '.join(aborted)}")
+                return {"success": False, "results": results}
+            
             logger.info("✅ User requests database sync complete")
             return {"success": True, "results": results}
             
@@ -4,8 +4,11 @@ Update sticker prices with real data from the MRKT API
 
 This script:
 1. Reads existing price data from sticker_price_results.json
-2. Updates prices with real data from the MRKT API where available
+2. Updates prices from one stickers.tools stats download, matched by normalized name
 3. Saves the updated price data back to the file
+
+update_sticker_prices() returns the stickers whose displayed values changed,
+so the card stage only re-renders those.
 """
 
 import os
@@ -15,6 +18,8 @@ import time
 import logging
 from datetime import datetime
 import services.stickers_tools_api as sticker_api
+from core import publication
+from services import price_snapshot
 
 # Configure logging
 logging.basicConfig(
@@ -32,11 +37,14 @@ if _project_root not in sys.path:
     sys.path.insert(0, _project_root)
 
 # Import centralized paths
-from config.paths import STICKER_PRICE_RESULTS_FILE
+from config.paths import STICKER_PRICE_RESULTS_FILE, STICKER_PRICE_SNAPSHOT_FILE
 
 # Path to the sticker price results file
 PRICE_DATA_FILE = STICKER_PRICE_RESULTS_FILE
 
+# Fields shown on a sticker price card; a change in any of them needs a re-render
+DISPLAYED_FIELDS = ("price", "price_usd", "supply", "init_price_usd", "median_price_ton", "median_price_usd")
+
 def load_existing_prices():
     """
     Load existing price data from sticker_price_results.json
@@ -57,48 +65,76 @@ def load_existing_prices():
         logger.error(f"Error loading price data: {e}")
         return {"stickers_with_prices": [], "timestamp": time.time()}
 
-def update_sticker_prices():
+def displayed_values(sticker_data):
+    """The values a sticker's price card shows, for change detection."""
+    return tuple(sticker_data.get(field) for field in DISPLAYED_FIELDS)
+
+def update_sticker_prices(stats=None):
     """
     Update sticker prices with real data from stickers.tools API
+    
+    The stats payload is downloaded once (unless passed in) and joined
+    against the stored stickers in one pass. The file is published atomically
+    (core.publication), so readers never see a half-written update.
+    
+    Returns:
+        list: (collection, sticker) pairs whose displayed values changed
     """
+    start_time = time.time()
     existing_data = load_existing_prices()
+    stickers = existing_data.get("stickers_with_prices", [])
+    logger.info(f"Starting price update for {len(stickers)} stickers")
+    print(f"🔄 UPDATING: Refreshing prices for {len(stickers)} stickers...")
+    
+    if stats is None:
+        stats = sticker_api.get_sticker_stats()
+    changed, updated_count, skipped_count = apply_price_index(stickers, sticker_api.build_price_index(stats))
+    
+    existing_data["timestamp"] = time.time()
+    save_prices(existing_data)
+    elapsed = time.time() - start_time
+    logger.info(f"Update complete in {elapsed:.1f}s: {updated_count} updated ({len(changed)} changed), {skipped_count} skipped.")
+    print(f"✅ Update complete in {elapsed:.1f}s: {updated_count} updated ({len(changed)} changed), {skipped_count} skipped.")
+    return changed
+
+def apply_price_index(stickers, price_index):
+    """
+    Write prices from a build_price_index() map into the sticker entries in place
+    
+    Returns:
+        tuple: (changed (collection, sticker) pairs, updated count, skipped count)
+    """
+    changed = []
     updated_count = 0
-    failed_count = 0
     skipped_count = 0
-    stickers = existing_data.get("stickers_with_prices", [])
-    total_stickers = len(stickers)
-    logger.info(f"Starting price update for {total_stickers} stickers")
-    print(f"🔄 UPDATING: Refreshing prices for {total_stickers} stickers...")
-    for i, sticker_data in enumerate(stickers):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for sticker_data in stickers:
         collection = sticker_data.get("collection", "")
         sticker = sticker_data.get("sticker", "")
-        logger.info(f"Processing {i+1}/{total_stickers}: {collection} {sticker}")
-        try:
-            price_info = sticker_api.get_sticker_price(collection, sticker, force_refresh=False)
-            if price_info and price_info["floor_price_ton"] > 0:
-                sticker_data["price"] = price_info["floor_price_ton"]
-                sticker_data["price_usd"] = price_info["floor_price_usd"]
-                sticker_data["supply"] = price_info["supply"]
-                sticker_data["median_price_ton"] = price_info["median_price_ton"]
-                sticker_data["median_price_usd"] = price_info["median_price_usd"]
-                sticker_data["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                logger.info(f"✅ Updated price for {collection} - {sticker}: {price_info['floor_price_ton']} TON")
-                print(f"  ✅ Updated: {collection} - {sticker}: {price_info['floor_price_ton']} TON")
-                updated_count += 1
-            else:
-                logger.info(f"ℹ️ No price data for {collection} {sticker}")
-                print(f"  ⚠️ No data: {collection} - {sticker}")
-                skipped_count += 1
-        except Exception as e:
-            logger.error(f"Error updating price for {collection} {sticker}: {e}")
-            print(f"  ❌ Failed: {collection} - {sticker}: {str(e)}")
-            failed_count += 1
-        time.sleep(0.5)
-    existing_data["timestamp"] = time.time()
-    with open(PRICE_DATA_FILE, 'w') as f:
-        json.dump(existing_data, f, indent=2)
-    logger.info(f"Update complete: {updated_count} updated, {skipped_count} skipped, {failed_count} failed.")
-    print(f"✅ Update complete: {updated_count} updated, {skipped_count} skipped, {failed_count} failed.")
+        price_info = price_index.get((sticker_api.normalize_name(collection), sticker_api.normalize_name(sticker)))
+        if not price_info or price_info["floor_price_ton"] <= 0:
+            logger.debug(f"ℹ️ No price data for {collection} {sticker}")
+            skipped_count += 1
+            continue
+        before = displayed_values(sticker_data)
+        sticker_data["price"] = price_info["floor_price_ton"]
+        sticker_data["price_usd"] = price_info["floor_price_usd"]
+        sticker_data["supply"] = price_info["supply"]
+        sticker_data["initial_supply"] = price_info["initial_supply"]
+        sticker_data["init_price_usd"] = price_info["init_price_usd"]
+        sticker_data["median_price_ton"] = price_info["median_price_ton"]
+        sticker_data["median_price_usd"] = price_info["median_price_usd"]
+        sticker_data["last_updated"] = now
+        updated_count += 1
+        if displayed_values(sticker_data) != before:
+            changed.append((collection, sticker))
+    return changed, updated_count, skipped_count
+
+def save_prices(data):
+    """Atomically replace and publish the price file and its compact snapshot"""
+    publication.write_json(PRICE_DATA_FILE, data)
+    price_snapshot.write_snapshot(STICKER_PRICE_SNAPSHOT_FILE, data.get("stickers_with_prices", []))
+    publication.record([PRICE_DATA_FILE, STICKER_PRICE_SNAPSHOT_FILE])
 
 if __name__ == "__main__":
         update_sticker_prices()
\ No newline at end of file
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Async Gift Card Service
+
+Resolves gift card files for the bot handlers without blocking the event loop.
+Lookups are answered from an in-memory manifest of the gift cards directory.
+Missing or stale cards are rendered by the render daemon, where user requests
+jump ahead of batch regeneration and duplicate requests share one job. When a
+card counts as stale is decided per gift by services.freshness.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import time
+import asyncio
+import logging
+import threading
+
+from config.paths import GIFT_CARDS_DIR, LAST_GENERATION_TIME_FILE
+from generators.render_daemon import RenderDaemon, PRIORITY_USER, PRIORITY_BATCH
+from services import freshness
+
+logger = logging.getLogger(__name__)
+
+# Number of cards that may be rendered on demand at the same time
+RENDER_WORKERS = 2
+
+# Rebuild the manifest from disk at most this often (seconds)
+MANIFEST_REFRESH_SECONDS = 60
+
+# How long a user waits for a stale card to be re-rendered before the
+# existing file is served instead (seconds)
+STALE_CARD_DEADLINE_SECONDS = 0.8
+
+# How long a user waits for a card that does not exist yet (seconds)
+MISSING_CARD_DEADLINE_SECONDS = 30
+
+
+def normalize_gift_filename(gift_name):
+    """Normalize a gift name to its card file stem (same rules as the bot)."""
+    if gift_name == "Jack-in-the-Box":
+        return "Jack_in_the_Box"
+    elif gift_name == "Durov's Cap":
+        return "Durovs_Cap"
+    elif gift_name == "Swag Bag":
+        return "SwagBag"
+    elif gift_name == "West Sign":
+        return "WestsideSign"
+    elif gift_name == "B-Day Candle":
+        return "B_Day_Candle"
+    else:
+        return gift_name.replace(" ", "_").replace("-", "_").replace("'", "")
+
+
+def _is_plus_premarket(gift_name):
+    try:
+        from services.plus_premarket_gifts import is_plus_premarket_gift
+        return is_plus_premarket_gift(gift_name)
+    except ImportError:
+        return False
+
+
+def card_filenames(gift_name):
+    """Return the (preferred, fallback) card filenames for a gift."""
+    normalized_name = normalize_gift_filename(gift_name)
+    card_name = f"{normalized_name}_card.webp"
+    plain_name = f"{normalized_name}.webp"
+
+    # Plus premarket gifts use the filename without the _card suffix
+    if _is_plus_premarket(gift_name):
+        return plain_name, card_name
+    return card_name, plain_name
+
+
+class CardManifest:
+    """In-memory index of the card files in a directory (filename -> mtime)."""
+
+    def __init__(self, cards_dir):
+        self.cards_dir = cards_dir
+        self._entries = {}
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        """Rescan the directory. Blocking; call from a worker thread."""
+        entries = {}
+        try:
+            with os.scandir(self.cards_dir) as it:
+                for entry in it:
+                    if entry.name.endswith('.webp') and entry.is_file():
+                        entries[entry.name] = entry.stat().st_mtime
+        except FileNotFoundError:
+            logger.warning(f"Gift cards directory not found: {self.cards_dir}")
+
+        with self._lock:
+            self._entries = entries
+            self._built_at = time.time()
+        logger.info(f"Card manifest rebuilt with {len(entries)} entries")
+
+    def is_expired(self):
+        return time.time() - self._built_at > MANIFEST_REFRESH_SECONDS
+
+    def lookup(self, filename):
+        """Return the absolute path of a card if it is in the manifest."""
+        with self._lock:
+            if filename in self._entries:
+                return os.path.join(self.cards_dir, filename)
+        return None
+
+    def age_seconds(self, filename):
+        """Age of a card according to the manifest, or None if unknown."""
+        with self._lock:
+            mtime = self._entries.get(filename)
+        return None if mtime is None else time.time() - mtime
+
+    def record(self, path):
+        """Add or refresh a single file after it has been (re)written."""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[os.path.basename(path)] = mtime
+
+    def filenames(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+
+def _available_gift_names():
+    from generators.pregenerate_gift_cards import get_available_gift_names
+    return get_available_gift_names()
+
+
+class CardService:
+    """Async facade over the card manifest and the render daemon."""
+
+    def __init__(self, cards_dir=GIFT_CARDS_DIR, workers=RENDER_WORKERS, gift_names=_available_gift_names):
+        self.manifest = CardManifest(cards_dir)
+        self.daemon = RenderDaemon(self._render_card, workers=workers, name="card-render")
+        self.gift_names = gift_names
+        self._gifts_by_filename = None
+        self._manifest_refresh = None
+        self._batch_enqueued_at = 0
+
+    def find_card(self, gift_name):
+        """Fast path: resolve a card from the manifest only (no disk access)."""
+        for filename in card_filenames(gift_name):
+            path = self.manifest.lookup(filename)
+            if path:
+                return path
+        return None
+
+    async def get_gift_card(self, gift_name):
+        """Return the card path for a gift, refreshing it if missing or stale.
+
+        Stale cards are re-rendered at user priority; if that does not finish
+        within STALE_CARD_DEADLINE_SECONDS the existing file is served.
+        """
+        await self._ensure_manifest()
+        display_name = self.canonical_gift_name(gift_name)
+        freshness.record_view(freshness.KIND_GIFT, display_name)
+
+        card_path = self.find_card(gift_name)
+        if card_path:
+            age = self.manifest.age_seconds(os.path.basename(card_path))
+            if age is None or age < freshness.MIN_REFRESH_MINUTES * 60:
+                return card_path
+            # Volatility and budget lookups hit SQLite, so they run on a worker
+            if not await asyncio.to_thread(freshness.should_refresh, freshness.KIND_GIFT, display_name, age):
+                return card_path
+            logger.info(f"Card for {gift_name} is stale ({age / 60:.0f}m), refreshing at user priority")
+            deadline = STALE_CARD_DEADLINE_SECONDS
+        else:
+            logger.info(f"No pre-generated card found for {gift_name}, rendering at user priority")
+            deadline = MISSING_CARD_DEADLINE_SECONDS
+            self._schedule_batch_refresh()
+
+        try:
+            rendered_path = await self.daemon.render(
+                normalize_gift_filename(gift_name), display_name,
+                priority=PRIORITY_USER, deadline=deadline
+            )
+            return rendered_path or card_path
+        except asyncio.TimeoutError:
+            logger.info(f"Render for {gift_name} missed its {deadline}s deadline, serving existing card")
+            return card_path
+        except Exception as e:
+            logger.error(f"Error rendering gift card for {gift_name}: {e}")
+            return card_path
+
+    async def render_fresh_card(self, gift_name, filename_suffix=""):
+        """Render a fresh card (bypassing the manifest) and return its path."""
+        key = f"{normalize_gift_filename(gift_name)}{filename_suffix}"
+        return await self.daemon.render(key, gift_name.replace("_", " "), filename_suffix, priority=PRIORITY_USER)
+
+    async def _ensure_manifest(self):
+        if not self.manifest.is_expired():
+            return
+        if self._manifest_refresh is None:
+            loop = asyncio.get_running_loop()
+            self._manifest_refresh = loop.run_in_executor(None, self._rebuild)
+            self._manifest_refresh.add_done_callback(lambda _: setattr(self, "_manifest_refresh", None))
+        await asyncio.shield(self._manifest_refresh)
+
+    def _rebuild(self):
+        """Rescan the cards directory; load the gift list on first use. Blocking."""
+        self.manifest.rebuild()
+        self.gifts_by_filename()
+
+    def gifts_by_filename(self):
+        """Card file stem -> gift name, for every gift in the gift list (loaded once)."""
+        if self._gifts_by_filename is None:
+            try:
+                names = self.gift_names()
+            except Exception as e:
+                logger.error(f"Error loading gift names: {e}")
+                return {}
+            self._gifts_by_filename = {normalize_gift_filename(name): name for name in names or []}
+        return self._gifts_by_filename
+
+    def canonical_gift_name(self, gift_name):
+        """The gift list's spelling of a gift ("Durovs_Cap" -> "Durov's Cap").
+
+        Price history, the freshness scheduler and batch renders all key gifts
+        by this name. Never loads the gift list, so it is safe on the event loop.
+        """
+        gifts = self._gifts_by_filename or {}
+        return gifts.get(normalize_gift_filename(gift_name), gift_name.replace("_", " "))
+
+    def _render_card(self, key, gift_display_name, filename_suffix=""):
+        """Render a card with the gift card generator (runs on a daemon worker)."""
+        import generators.gift_card_generator as gift_card_generator
+
+        output_path = gift_card_generator.generate_specific_gift(gift_display_name, filename_suffix)
+        if output_path:
+            self.manifest.record(output_path)
+        return output_path
+
+    def _schedule_batch_refresh(self):
+        """Queue batch-priority re-renders of stale cards when the batch is overdue.
+
+        Replaces spawning pregenerate_gift_cards.py from the bot: the work goes
+        through the same daemon, behind any user-triggered renders.
+        """
+        if time.time() - self._batch_enqueued_at < freshness.MIN_REFRESH_MINUTES * 60:
+            return
+        self._batch_enqueued_at = time.time()
+
+        # The timestamp file is read on a worker, never on the event loop
+        threading.Thread(target=self._enqueue_stale_cards, daemon=True).start()
+
+    def _enqueue_stale_cards(self):
+        try:
+            if os.path.exists(LAST_GENERATION_TIME_FILE):
+                with open(LAST_GENERATION_TIME_FILE, 'r') as f:
+                    last_time = int(f.read().strip())
+                elapsed_minutes = (int(time.time()) - last_time) / 60
+                if elapsed_minutes < freshness.MIN_REFRESH_MINUTES:
+                    return
+                logger.info("Checking card freshness for batch regeneration")
+            else:
+                logger.info("No timestamp file found, queueing batch regeneration")
+
+            # Walk the gift list rather than the directory, which also holds
+            # timestamped refresh cards and only has normalized names
+            ages = {}
+            for gift_name in self.gifts_by_filename().values():
+                card_path = self.find_card(gift_name)
+                if card_path is None:
+                    # Missing cards are planned ahead of stale ones
+                    ages[gift_name] = None
+                    continue
+                age = self.manifest.age_seconds(os.path.basename(card_path))
+                if age is not None and age >= freshness.MIN_REFRESH_MINUTES * 60:
+                    ages[gift_name] = age
+            due = freshness.plan_refresh(freshness.KIND_GIFT, ages)
+            for gift_name in due:
+                self.daemon.submit(normalize_gift_filename(gift_name), gift_name, priority=PRIORITY_BATCH)
+            freshness.spend(freshness.KIND_GIFT, len(due))
+            logger.info(f"Queued {len(due)} stale cards for batch regeneration")
+        except Exception as e:
+            logger.error(f"Error checking timestamp: {e}")
+
+
+# Global card service instance
+card_service = CardService()
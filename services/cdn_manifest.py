@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+CDN Folder Manifests
+
+In-memory index of every file the CDN serves from a folder (name, path, size,
+mtime, content hash), so listing and search endpoints never walk the disk per
+request. A manifest is built once and then refreshed incrementally: only
+directories whose mtime changed are rescanned, and a file is only re-hashed
+when its size or mtime changed. Search uses a trigram index over the names
+and paths instead of a scan.
+
+Each entry also carries its content type and Cache-Control policy, looked up
+once from FILE_TYPES when the file enters the manifest.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+from core.publication import hash_file
+
+logger = logging.getLogger(__name__)
+
+# How often directory mtimes are checked for added/removed files (seconds)
+MANIFEST_REFRESH_SECONDS = 10
+
+# Full rescan interval, to catch files rewritten in place (seconds)
+MANIFEST_FULL_RESCAN_SECONDS = 300
+
+# Cache policies: cards are rewritten in place under the same name, so they
+# must be revalidated (cheap 304s); fonts and similar assets rarely change
+CACHE_REVALIDATE = 'public, no-cache'
+CACHE_LONG_LIVED = 'public, max-age=86400'
+
+# Extension -> (content type, Cache-Control)
+FILE_TYPES = {
+    '.webp': ('image/webp', CACHE_REVALIDATE),
+    '.png': ('image/png', CACHE_REVALIDATE),
+    '.jpg': ('image/jpeg', CACHE_REVALIDATE),
+    '.jpeg': ('image/jpeg', CACHE_REVALIDATE),
+    '.gif': ('image/gif', CACHE_REVALIDATE),
+    '.svg': ('image/svg+xml', CACHE_REVALIDATE),
+    '.tgs': ('application/x-tgsticker', CACHE_REVALIDATE),
+    '.webm': ('video/webm', CACHE_REVALIDATE),
+    '.mp4': ('video/mp4', CACHE_REVALIDATE),
+    '.json': ('application/json', CACHE_REVALIDATE),
+    '.txt': ('text/plain; charset=utf-8', CACHE_REVALIDATE),
+    '.otf': ('font/otf', CACHE_LONG_LIVED),
+    '.ttf': ('font/ttf', CACHE_LONG_LIVED),
+}
+DEFAULT_FILE_TYPE = ('application/octet-stream', CACHE_REVALIDATE)
+
+
+def file_type(filename):
+    """(content type, Cache-Control) for a file name."""
+    # Some downloaded images are saved as "<name>_png" without a dot
+    if filename.endswith('_png'):
+        return FILE_TYPES['.png']
+    return FILE_TYPES.get(os.path.splitext(filename)[1].lower(), DEFAULT_FILE_TYPE)
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ManifestEntry:
+    """One served file."""
+
+    __slots__ = ("name", "path", "size", "mtime", "hash", "content_type", "cache_control")
+
+    def __init__(self, name, path, size, mtime, content_hash):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.hash = content_hash
+        self.content_type, self.cache_control = file_type(name)
+
+    def to_dict(self, url_prefix):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "size": self.size,
+            "modified": datetime.fromtimestamp(self.mtime).isoformat(),
+            "hash": self.hash,
+            "url": f"{url_prefix}/{self.path}"
+        }
+
+
+class FolderManifest:
+    """Manifest of one served folder (recursive or top-level only)."""
+
+    def __init__(self, folder_path, recursive=False):
+        self.folder_path = folder_path
+        self.recursive = recursive
+        self._entries = {}       # relative path -> ManifestEntry
+        self._dir_mtimes = {}    # relative dir -> st_mtime_ns
+        self._trigram_index = {}
+        self._lock = threading.Lock()
+        self._checked_at = 0
+        self._full_scan_at = 0
+
+    def refresh(self, force=False):
+        """Bring the manifest up to date if its refresh interval has passed."""
+        now = time.time()
+        if not force and now - self._checked_at < MANIFEST_REFRESH_SECONDS:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < MANIFEST_REFRESH_SECONDS:
+                return
+            full = force or now - self._full_scan_at > MANIFEST_FULL_RESCAN_SECONDS
+            changed = self._scan(full)
+            self._checked_at = now
+            if full:
+                self._full_scan_at = now
+            if changed:
+                self._rebuild_index()
+
+    def entries(self, prefix=""):
+        """Entries whose path starts with prefix, sorted by path."""
+        self.refresh()
+        with self._lock:
+            return [self._entries[path] for path in sorted(self._entries) if path.startswith(prefix)]
+
+    def get(self, relative_path):
+        self.refresh()
+        with self._lock:
+            return self._entries.get(relative_path)
+
+    def subdirectories(self, relative_dir):
+        """Immediate subdirectory names of relative_dir."""
+        prefix = f"{relative_dir}/" if relative_dir else ""
+        self.refresh()
+        with self._lock:
+            return sorted({
+                directory[len(prefix):].split("/", 1)[0]
+                for directory in self._dir_mtimes
+                if directory and directory != relative_dir and directory.startswith(prefix)
+            })
+
+    def has_directory(self, relative_dir):
+        self.refresh()
+        with self._lock:
+            return relative_dir in self._dir_mtimes
+
+    def search(self, query):
+        """Entries whose name or path contains query (case-insensitive)."""
+        query = query.lower()
+        self.refresh()
+        with self._lock:
+            if len(query) >= 3:
+                candidates = None
+                for gram in _trigrams(query):
+                    paths = self._trigram_index.get(gram, set())
+                    candidates = paths if candidates is None else candidates & paths
+                    if not candidates:
+                        return []
+            else:
+                candidates = self._entries.keys()
+            return [
+                self._entries[path] for path in sorted(candidates)
+                if query in self._entries[path].name.lower() or query in path.lower()
+            ]
+
+    def _scan(self, full):
+        """Rescan changed directories (or all on a full scan). Returns True if anything changed."""
+        if not os.path.isdir(self.folder_path):
+            changed = bool(self._entries)
+            self._entries.clear()
+            self._dir_mtimes.clear()
+            return changed
+
+        changed = False
+        seen_dirs = set()
+        pending = [""]
+        while pending:
+            relative_dir = pending.pop()
+            absolute_dir = os.path.join(self.folder_path, relative_dir)
+            try:
+                dir_mtime = os.stat(absolute_dir).st_mtime_ns
+            except OSError:
+                continue
+            seen_dirs.add(relative_dir)
+            dir_changed = full or self._dir_mtimes.get(relative_dir) != dir_mtime
+            self._dir_mtimes[relative_dir] = dir_mtime
+
+            try:
+                with os.scandir(absolute_dir) as it:
+                    items = list(it)
+            except OSError as e:
+                logger.error(f"Error listing files in {absolute_dir}: {e}")
+                continue
+
+            present = set()
+            for item in items:
+                relative_path = f"{relative_dir}/{item.name}" if relative_dir else item.name
+                if item.is_dir():
+                    if self.recursive:
+                        pending.append(relative_path)
+                    continue
+                # Hidden files include in-progress publications (core.publication)
+                if not item.is_file() or item.name.startswith('.'):
+                    continue
+                present.add(relative_path)
+                if dir_changed and self._update_entry(item, relative_path):
+                    changed = True
+
+            if dir_changed:
+                prefix = f"{relative_dir}/" if relative_dir else ""
+                for path in [p for p in self._entries if p.startswith(prefix) and "/" not in p[len(prefix):]]:
+                    if path not in present:
+                        del self._entries[path]
+                        changed = True
+
+        # Directories that disappeared take their files with them
+        for relative_dir in [d for d in self._dir_mtimes if d not in seen_dirs]:
+            del self._dir_mtimes[relative_dir]
+            prefix = f"{relative_dir}/"
+            for path in [p for p in self._entries if p.startswith(prefix)]:
+                del self._entries[path]
+                changed = True
+        return changed
+
+    def _update_entry(self, item, relative_path):
+        try:
+            file_stat = item.stat()
+        except OSError:
+            return False
+        existing = self._entries.get(relative_path)
+        if existing and existing.size == file_stat.st_size and existing.mtime == file_stat.st_mtime:
+            return False
+        try:
+            content_hash = hash_file(item.path)
+        except OSError:
+            return False
+        self._entries[relative_path] = ManifestEntry(
+            item.name, relative_path, file_stat.st_size, file_stat.st_mtime, content_hash
+        )
+        return True
+
+    def _rebuild_index(self):
+        index = {}
+        for path, entry in self._entries.items():
+            for gram in _trigrams(entry.name.lower()) | _trigrams(path.lower()):
+                index.setdefault(gram, set()).add(path)
+        self._trigram_index = index
@@ -5,11 +5,25 @@ CDN Server for Telegram Bot Assets
 Serves files directly like: https://test.asadffastest.store/api/new_gift_cards/Electric_Skull_card.webp
 """
 
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, send_file, request
+from werkzeug.security import safe_join
 import os
+import sys
+import stat
+import time
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
-import mimetypes
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+from config.paths import PROJECT_ROOT
+from services.cdn_manifest import FolderManifest, file_type
+from services import image_variants
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +34,13 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Base directory - use script_dir for Docker compatibility
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Base directory - served folders live at the project root
+BASE_DIR = PROJECT_ROOT
+
+# In-memory hot-file cache (per worker process)
+HOT_CACHE_MAX_BYTES = int(os.environ.get("CDN_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+HOT_CACHE_MAX_FILE_BYTES = 4 * 1024 * 1024  # Larger files always go through sendfile
+HOT_CACHE_REVALIDATE_SECONDS = 2  # How often a cached file is re-stat'ed for changes
 
 
 # Define the folders to serve
@@ -33,43 +52,17 @@ FOLDERS = {
     "assets": "assets"
 }
 
-def get_file_info(file_path):
-    """Get file information including size and modification time"""
-    try:
-        stat = os.stat(file_path)
-        return {
-            "size": stat.st_size,
-            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-            "exists": True
-        }
-    except OSError:
-        return {"exists": False}
+# Per-folder manifests; listing and search never walk the disk
+manifests = {
+    key: FolderManifest(os.path.join(BASE_DIR, folder_name), recursive=(key == "sticker_collections"))
+    for key, folder_name in FOLDERS.items()
+}
 
-def list_files_recursive(folder_path, base_path=""):
-    """Recursively list all files in a folder and its subfolders"""
-    files = []
-    try:
-        for item in os.listdir(folder_path):
-            item_path = os.path.join(folder_path, item)
-            relative_path = os.path.join(base_path, item) if base_path else item
-            
-            if os.path.isfile(item_path):
-                file_info = get_file_info(item_path)
-                files.append({
-                    "name": item,
-                    "path": relative_path,
-                    "size": file_info.get("size", 0),
-                    "modified": file_info.get("modified"),
-                    "url": f"/api/sticker_collections/{relative_path}"
-                })
-            elif os.path.isdir(item_path):
-                # Recursively get files from subdirectories
-                subfiles = list_files_recursive(item_path, relative_path)
-                files.extend(subfiles)
-    except Exception as e:
-        logger.error(f"Error listing files in {folder_path}: {e}")
-    
-    return files
+def build_manifests():
+    """Scan every served folder once so the first requests are answered from memory."""
+    for key, manifest in manifests.items():
+        manifest.refresh(force=True)
+        logger.info(f"Manifest for {key}: {len(manifest.entries())} files")
 
 @app.route("/")
 def index():
@@ -83,6 +76,7 @@ def index():
             "list_files": "/api/<folder_key>",
             "serve_file": "/api/<folder_key>/<filename>",
             "file_info": "/api/<folder_key>/<filename>/info",
+            "thumbnail": "/api/<folder_key>/<filename>?size=<px>",
             "search": "/api/<folder_key>/search_files?q=<query>",
             "sticker_collections": "/api/sticker_collections/<collection>/<pack>/<filename>"
         },
@@ -103,23 +97,7 @@ def list_folder(folder_key):
         return jsonify({"error": "Folder not found"}), 404
     
     try:
-        # Special handling for sticker_collections (recursive)
-        if folder_key == "sticker_collections":
-            files = list_files_recursive(folder_path)
-        else:
-            # Regular flat folder listing
-            files = []
-            for item in os.listdir(folder_path):
-                item_path = os.path.join(folder_path, item)
-                if os.path.isfile(item_path):
-                    file_info = get_file_info(item_path)
-                    files.append({
-                        "name": item,
-                        "path": item,
-                        "size": file_info.get("size", 0),
-                        "modified": file_info.get("modified"),
-                        "url": f"/api/{folder_key}/{item}"
-                    })
+        files = [entry.to_dict(f"/api/{folder_key}") for entry in manifests[folder_key].entries()]
         
         return jsonify({
             "folder": folder_key,
@@ -131,86 +109,198 @@ def list_folder(folder_key):
         logger.error(f"Error listing folder {folder_key}: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route("/api/<folder_key>/<path:filename>")
-def serve_file(folder_key, filename):
-    """Serve a specific file from a folder - DIRECT FILE SERVING"""
+def make_etag(file_stat):
+    """Strong validator that changes whenever a file is rewritten."""
+    return f"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}-{file_stat.st_ino:x}"
+
+def resolve_file_path(folder_key, filename):
+    """Absolute path for a file under a served folder, or None if invalid."""
     folder_name = FOLDERS.get(folder_key)
     if not folder_name:
-        return jsonify({"error": "Invalid folder key"}), 404
+        return None
+    return safe_join(os.path.join(BASE_DIR, folder_name), filename)
+
+class CachedFile:
+    """File bytes plus the validators and headers needed to answer from memory."""
     
-    folder_path = os.path.join(BASE_DIR, folder_name)
+    __slots__ = ("body", "signature", "etag", "last_modified", "headers", "checked_at")
     
-    # Special handling for sticker_collections (nested paths)
-    if folder_key == "sticker_collections":
-        file_path = os.path.join(folder_path, filename)
-        # Extract the directory part for send_from_directory
-        file_dir = os.path.dirname(file_path)
-        file_name = os.path.basename(file_path)
-        
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
-            return jsonify({"error": "File not found"}), 404
+    def __init__(self, body, file_stat, headers):
+        self.body = body
+        self.signature = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        self.etag = make_etag(file_stat)
+        self.last_modified = file_stat.st_mtime
+        self.headers = headers
+        self.checked_at = time.monotonic()
+
+
+class HotFileCache:
+    """
+    LRU of small served files, bounded by HOT_CACHE_MAX_BYTES.
+    
+    An entry is re-stat'ed at most every HOT_CACHE_REVALIDATE_SECONDS and
+    dropped as soon as the file's size, mtime or inode change, so cards
+    rewritten by the generators are picked up on the next check.
+    """
+    
+    def __init__(self, max_bytes=HOT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    
+    def get(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(path)
+            if time.monotonic() - entry.checked_at < HOT_CACHE_REVALIDATE_SECONDS:
+                self.stats['hits'] += 1
+                return entry
         
         try:
-            # Set appropriate headers for different file types
-            mime_type, _ = mimetypes.guess_type(filename)
-            
-            # Handle _png files as PNG images
-            if filename.endswith('_png'):
-                mime_type = 'image/png'
-            elif filename.endswith('.webp'):
-                mime_type = 'image/png'
-            elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                mime_type = 'image/jpeg'
-            elif filename.endswith('.gif'):
-                mime_type = 'image/gif'
-            elif filename.endswith('.webp'):
-                mime_type = 'image/webp'
-            
-            response = send_from_directory(file_dir, file_name)
-            if mime_type:
-                response.headers['Content-Type'] = mime_type
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'  # No caching - always fresh
-            response.headers['Pragma'] = 'no-cache'  # HTTP/1.0 compatibility
-            response.headers['Expires'] = '0'  # Expire immediately
-            response.headers['Content-Disposition'] = 'inline'  # Display in browser, don't download
-            return response
-        except Exception as e:
-            logger.error(f"Error serving file {filename} from {folder_key}: {e}")
-            return jsonify({"error": "Internal server error"}), 500
-    else:
-        # Regular flat folder serving
-        file_path = os.path.join(folder_path, filename)
+            file_stat = os.stat(path)
+            current = (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino)
+        except OSError:
+            current = None
         
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
+        with self._lock:
+            if current == entry.signature:
+                entry.checked_at = time.monotonic()
+                self.stats['hits'] += 1
+                return entry
+            self._remove(path)
+            self.stats['invalidations'] += 1
+            return None
+    
+    def load(self, path, file_stat, headers):
+        """Read a file into the cache; returns the entry or None if it is too big or changed."""
+        if file_stat.st_size > HOT_CACHE_MAX_FILE_BYTES:
+            return None
+        with open(path, 'rb') as f:
+            body = f.read()
+        if len(body) != file_stat.st_size:
+            # Rewritten while we were reading; serve it from disk this time
+            return None
+        
+        entry = CachedFile(body, file_stat, headers)
+        with self._lock:
+            self._remove(path)
+            self._entries[path] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+        return entry
+    
+    def invalidate(self, path=None):
+        """Drop one cached file, or everything when path is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._remove(path)
+    
+    def size_bytes(self):
+        return self._bytes
+    
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+
+# Global hot-file cache instance
+hot_cache = HotFileCache()
+
+def file_headers(filename, entry=None):
+    """Headers sent with every response for a file, from its manifest entry when known."""
+    if entry is not None:
+        content_type, cache_control = entry.content_type, entry.cache_control
+    else:
+        content_type, cache_control = file_type(filename)
+    return {
+        'Content-Type': content_type,
+        'Cache-Control': cache_control,
+        'Content-Disposition': 'inline'  # Display in browser, don't download
+    }
+
+def respond_from_cache(entry):
+    """Build a (possibly 304 or 206) response from a cached file."""
+    response = Response(entry.body, headers=entry.headers)
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(entry.body))
+
+@app.route("/api/<folder_key>/<path:filename>")
+def serve_file(folder_key, filename):
+    """Serve a specific file from a folder - DIRECT FILE SERVING
+    
+    Small hot files are answered from the in-memory cache; everything else
+    takes one stat and goes to the server's wsgi.file_wrapper (sendfile under
+    Gunicorn). Responses carry a strong ETag and Last-Modified, so
+    revalidations answer 304 and Range requests answer 206.
+    
+    ?size=<px> serves a downscaled WebP variant (see image_variants), built
+    on first use and rebuilt when the source file changes.
+    """
+    if folder_key not in FOLDERS:
+        return jsonify({"error": "Invalid folder key"}), 404
+    
+    file_path = resolve_file_path(folder_key, filename)
+    manifest_entry = None
+    
+    size = request.args.get('size')
+    if size is not None:
+        if not size.isdigit() or int(size) not in image_variants.VARIANT_SIZES:
+            return jsonify({
+                "error": "Unsupported size",
+                "sizes": list(image_variants.VARIANT_SIZES)
+            }), 400
+        if not file_path or not os.path.isfile(file_path):
             return jsonify({"error": "File not found"}), 404
+        variant = image_variants.get_variant(file_path, int(size))
+        # Files that cannot be decoded as images are served as-is
+        if variant:
+            file_path = variant
+            filename = os.path.basename(variant)
+    if file_path:
+        entry = hot_cache.get(file_path)
+        if entry is not None:
+            return respond_from_cache(entry)
+    
+    try:
+        file_stat = os.stat(file_path) if file_path else None
+    except OSError:
+        file_stat = None
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+        return jsonify({"error": "File not found"}), 404
+    
+    try:
+        if size is None:
+            manifest_entry = manifests[folder_key].get(filename)
+        headers = file_headers(filename, manifest_entry)
+        entry = hot_cache.load(file_path, file_stat, headers)
+        if entry is not None:
+            return respond_from_cache(entry)
         
-        try:
-            # Set appropriate headers for different file types
-            mime_type, _ = mimetypes.guess_type(filename)
-            
-            # Handle _png files as PNG images
-            if filename.endswith('_png'):
-                mime_type = 'image/png'
-            elif filename.endswith('.webp'):
-                mime_type = 'image/png'
-            elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                mime_type = 'image/jpeg'
-            elif filename.endswith('.gif'):
-                mime_type = 'image/gif'
-            elif filename.endswith('.webp'):
-                mime_type = 'image/webp'
-            
-            response = send_from_directory(folder_path, filename)
-            if mime_type:
-                response.headers['Content-Type'] = mime_type
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'  # No caching - always fresh
-            response.headers['Pragma'] = 'no-cache'  # HTTP/1.0 compatibility
-            response.headers['Expires'] = '0'  # Expire immediately
-            response.headers['Content-Disposition'] = 'inline'  # Display in browser, don't download
-            return response
-        except Exception as e:
-            logger.error(f"Error serving file {filename} from {folder_key}: {e}")
-            return jsonify({"error": "Internal server error"}), 500
+        response = send_file(
+            file_path,
+            mimetype=headers['Content-Type'],
+            conditional=True,
+            etag=make_etag(file_stat),
+            last_modified=file_stat.st_mtime,
+            max_age=None
+        )
+        response.headers.update(headers)
+        return response
+    except Exception as e:
+        logger.error(f"Error serving file {filename} from {folder_key}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/api/<folder_key>/<path:filename>/info")
 def file_info(folder_key, filename):
@@ -219,32 +309,20 @@ def file_info(folder_key, filename):
     if not folder_name:
         return jsonify({"error": "Invalid folder key"}), 404
     
-    folder_path = os.path.join(BASE_DIR, folder_name)
-    
-    # Special handling for sticker_collections (nested paths)
-    if folder_key == "sticker_collections":
-        file_path = os.path.join(folder_path, filename)
-    else:
-        file_path = os.path.join(folder_path, filename)
-    
-    if not os.path.exists(file_path):
+    entry = manifests[folder_key].get(filename)
+    if entry is None:
         return jsonify({"error": "File not found"}), 404
     
     try:
-        file_info = get_file_info(file_path)
-        if not file_info["exists"]:
-            return jsonify({"error": "File not accessible"}), 500
-        
-        mime_type, encoding = mimetypes.guess_type(filename)
-        
         return jsonify({
             "filename": os.path.basename(filename),
             "path": filename,
             "folder": folder_key,
-            "size": file_info["size"],
-            "modified": file_info["modified"],
-            "mime_type": mime_type,
-            "encoding": encoding,
+            "size": entry.size,
+            "modified": datetime.fromtimestamp(entry.mtime).isoformat(),
+            "hash": entry.hash,
+            "mime_type": entry.content_type,
+            "cache_control": entry.cache_control,
             "url": f"https://giftschart.the01studio.xyz/api/{folder_key}/{filename}",
             "info_url": f"https://giftschart.the01studio.xyz/api/{folder_key}/{filename}/info"
         })
@@ -268,28 +346,9 @@ def search_files(folder_key):
         return jsonify({"error": "Folder not found"}), 404
     
     try:
-        matching_files = []
-        
-        # Special handling for sticker_collections (recursive search)
-        if folder_key == "sticker_collections":
-            all_files = list_files_recursive(folder_path)
-            for file_info in all_files:
-                if query in file_info["name"].lower() or query in file_info["path"].lower():
-                    matching_files.append(file_info)
-        else:
-            # Regular flat folder search
-            for item in os.listdir(folder_path):
-                if query in item.lower():
-                    item_path = os.path.join(folder_path, item)
-                    if os.path.isfile(item_path):
-                        file_info = get_file_info(item_path)
-                        matching_files.append({
-                            "name": item,
-                            "path": item,
-                            "size": file_info.get("size", 0),
-                            "modified": file_info.get("modified"),
-                            "url": f"/api/{folder_key}/{item}"
-                        })
+        matching_files = [
+            entry.to_dict(f"/api/{folder_key}") for entry in manifests[folder_key].search(query)
+        ]
         
         return jsonify({
             "folder": folder_key,
@@ -304,22 +363,19 @@ def search_files(folder_key):
 @app.route("/api/sticker_collections/<collection>")
 def list_collection(collection):
     """List all packs in a specific sticker collection"""
-    folder_path = os.path.join(BASE_DIR, "sticker_collections", collection)
-    if not os.path.exists(folder_path):
+    manifest = manifests["sticker_collections"]
+    if not manifest.has_directory(collection):
         return jsonify({"error": "Collection not found"}), 404
     
     try:
         packs = []
-        for item in os.listdir(folder_path):
-            item_path = os.path.join(folder_path, item)
-            if os.path.isdir(item_path):
-                # Count files in this pack
-                pack_files = list_files_recursive(item_path, item)
-                packs.append({
-                    "name": item,
-                    "total_files": len(pack_files),
-                    "url": f"/api/sticker_collections/{collection}/{item}"
-                })
+        for item in manifest.subdirectories(collection):
+            # Count files in this pack
+            packs.append({
+                "name": item,
+                "total_files": len(manifest.entries(f"{collection}/{item}/")),
+                "url": f"/api/sticker_collections/{collection}/{item}"
+            })
         
         return jsonify({
             "collection": collection,
@@ -333,12 +389,15 @@ def list_collection(collection):
 @app.route("/api/sticker_collections/<collection>/<pack>")
 def list_pack(collection, pack):
     """List all files in a specific sticker pack"""
-    pack_path = os.path.join(BASE_DIR, "sticker_collections", collection, pack)
-    if not os.path.exists(pack_path):
+    manifest = manifests["sticker_collections"]
+    if not manifest.has_directory(f"{collection}/{pack}"):
         return jsonify({"error": "Pack not found"}), 404
     
     try:
-        files = list_files_recursive(pack_path, f"{collection}/{pack}")
+        files = [
+            entry.to_dict("/api/sticker_collections")
+            for entry in manifest.entries(f"{collection}/{pack}/")
+        ]
         
         return jsonify({
             "collection": collection,
@@ -366,7 +425,9 @@ def health_check():
         return jsonify({
             "status": "healthy",
             "server_time": datetime.now().isoformat(),
-            "folders": folder_status
+            "folders": folder_status,
+            "hot_cache": dict(hot_cache.stats, bytes=hot_cache.size_bytes()),
+            "manifest_files": {key: len(manifest.entries()) for key, manifest in manifests.items()}
         })
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -382,6 +443,9 @@ def internal_error(error):
     """Handle 500 errors"""
     return jsonify({"error": "Internal server error"}), 500
 
+# Built on import, i.e. once per Gunicorn worker at startup
+build_manifests()
+
 if __name__ == "__main__":
     # Configuration
     HOST = "0.0.0.0"  # Listen on all interfaces
@@ -403,8 +467,7 @@ if __name__ == "__main__":
     logger.info(f"Available folders: {list(FOLDERS.keys())}")
     
     # IMPORTANT: This script should ONLY be run via Gunicorn (managed by PM2)
-    # Do NOT run this directly - use: gunicorn --bind 0.0.0.0:8081 cdn_server:app
-    import os
+    # Do NOT run this directly - use: gunicorn -c services/gunicorn_cdn.conf.py services.cdn_server:app
     if os.environ.get('GUNICORN_CMD_ARGS') or 'gunicorn' in os.environ.get('_', ''):
         # Running under Gunicorn - don't start Flask dev server
         logger.info("Running under Gunicorn - Flask app ready")
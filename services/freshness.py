@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Card Freshness Scheduler
+
+Decides when a card is old enough to re-render. Instead of one fixed age for
+every card, each item gets its own target age:
+
+- volatile items (large recent price moves in price_history) are refreshed
+  more often, quiet ones less often
+- popular items (many card views in the last day) are refreshed more often
+- items without price history use DEFAULT_REFRESH_MINUTES
+
+Target ages are clamped to [MIN_REFRESH_MINUTES, MAX_REFRESH_MINUTES].
+
+Re-rendering a gift card fetches fresh prices upstream, so refreshes share a
+budget of UPSTREAM_CALLS_PER_HOUR. Batch runs ask plan_refresh() for the most
+overdue items that fit in the budget; on-demand renders ask should_refresh().
+
+Views and budget spend are stored in freshness.db, so the bot (which records
+views) and the refresh orchestrator (which plans batches) see the same data.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from config.paths import FRESHNESS_DB_FILE
+from core import storage
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = FRESHNESS_DB_FILE
+
+# Item kinds
+KIND_GIFT = "gift"
+KIND_STICKER = "sticker"
+
+# Bounds on any card's target age (minutes)
+MIN_REFRESH_MINUTES = 10
+MAX_REFRESH_MINUTES = 120
+
+# Target age of an item with no price history and no views (minutes)
+DEFAULT_REFRESH_MINUTES = 30
+
+# Upstream calls all card refreshes may make per hour
+UPSTREAM_CALLS_PER_HOUR = int(os.getenv("FRESHNESS_UPSTREAM_CALLS_PER_HOUR", "300"))
+
+# Price change measured over this window (hours)
+VOLATILITY_WINDOW_HOURS = 6
+
+# A move of this size over the window halves a card's target age (percent)
+VOLATILE_CHANGE_PERCENT = 2.0
+
+# Views counted over this window (hours)
+POPULARITY_WINDOW_HOURS = 24
+
+# This many views per hour halves a card's target age
+POPULAR_VIEWS_PER_HOUR = 10.0
+
+# Reuse volatility and popularity lookups for this long (seconds)
+SCORE_CACHE_SECONDS = 300
+
+# Write buffered views to the database at most this often (seconds)
+VIEW_FLUSH_SECONDS = 60
+
+# Views not yet written: (kind, item) -> count
+_pending_views = Counter()
+_pending_views_lock = threading.Lock()
+_views_flushed_at = time.time()
+
+# (kind, item) -> (looked up at, percent change or None)
+_volatility_cache = {}
+
+# (looked up at, {(kind, item): views in the window})
+_popularity_cache = (0, {})
+
+
+def init_database():
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_views (
+            kind TEXT NOT NULL,
+            item TEXT NOT NULL,
+            hour_start INTEGER NOT NULL,
+            views INTEGER NOT NULL,
+            PRIMARY KEY (kind, item, hour_start)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_spend (
+            ts INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            calls INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_refresh_spend_ts ON refresh_spend (ts)')
+    conn.commit()
+    conn.close()
+
+
+def _ensure_database():
+    storage.run_migration(DB_FILE, "freshness", init_database)
+
+
+# =============================================================================
+# Popularity
+# =============================================================================
+
+def record_view(kind: str, item: str):
+    """Count a card view. Cheap enough for the event loop; writes happen in the background."""
+    global _views_flushed_at
+    with _pending_views_lock:
+        _pending_views[(kind, item)] += 1
+        if time.time() - _views_flushed_at < VIEW_FLUSH_SECONDS:
+            return
+        _views_flushed_at = time.time()
+    threading.Thread(target=flush_views, name="freshness-views", daemon=True).start()
+
+
+def flush_views():
+    """Write buffered views to the database and drop views older than the window."""
+    with _pending_views_lock:
+        pending = dict(_pending_views)
+        _pending_views.clear()
+    if not pending:
+        return
+    try:
+        _ensure_database()
+        now = int(time.time())
+        hour_start = now - now % 3600
+        conn = storage.connect(DB_FILE)
+        conn.executemany('''
+            INSERT INTO card_views (kind, item, hour_start, views) VALUES (?, ?, ?, ?)
+            ON CONFLICT (kind, item, hour_start) DO UPDATE SET views = views + excluded.views
+        ''', [(kind, item, hour_start, views) for (kind, item), views in pending.items()])
+        conn.execute("DELETE FROM card_views WHERE hour_start < ?",
+                     (now - POPULARITY_WINDOW_HOURS * 3600 - 3600,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Failed to store card views: {e}")
+
+
+def views_per_hour(kind: str, item: str) -> float:
+    """Average views per hour over POPULARITY_WINDOW_HOURS (one query per SCORE_CACHE_SECONDS)."""
+    global _popularity_cache
+    fetched_at, views = _popularity_cache
+    if time.time() - fetched_at > SCORE_CACHE_SECONDS:
+        try:
+            _ensure_database()
+            conn = storage.connect(DB_FILE)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT kind, item, SUM(views) FROM card_views
+                WHERE hour_start >= ?
+                GROUP BY kind, item
+            ''', (int(time.time()) - POPULARITY_WINDOW_HOURS * 3600,))
+            views = {(row_kind, row_item): total for row_kind, row_item, total in cursor.fetchall()}
+            conn.close()
+        except Exception as e:
+            logger.error(f"Failed to load card views: {e}")
+            views = {}
+        _popularity_cache = (time.time(), views)
+    return views.get((kind, item), 0) / POPULARITY_WINDOW_HOURS
+
+
+# =============================================================================
+# Volatility
+# =============================================================================
+
+def price_change_percent(kind: str, item: str) -> Optional[float]:
+    """Absolute price change over VOLATILITY_WINDOW_HOURS, or None without history.
+
+    Only gifts have price history; stickers always return None.
+    """
+    if kind != KIND_GIFT:
+        return None
+    cached = _volatility_cache.get((kind, item))
+    if cached and time.time() - cached[0] <= SCORE_CACHE_SECONDS:
+        return cached[1]
+    try:
+        from services import price_history
+        change = price_history.get_percentage_change(item, VOLATILITY_WINDOW_HOURS)
+    except Exception as e:
+        logger.error(f"Failed to get price change for {item}: {e}")
+        change = None
+    change = abs(change) if change is not None else None
+    _volatility_cache[(kind, item)] = (time.time(), change)
+    return change
+
+
+# =============================================================================
+# Scheduling
+# =============================================================================
+
+def target_age_seconds(kind: str, item: str) -> float:
+    """How old this item's card may get before it is due for a refresh."""
+    change = price_change_percent(kind, item)
+    if change is None:
+        minutes = DEFAULT_REFRESH_MINUTES
+    else:
+        minutes = MAX_REFRESH_MINUTES / (1 + change / VOLATILE_CHANGE_PERCENT)
+    minutes /= 1 + views_per_hour(kind, item) / POPULAR_VIEWS_PER_HOUR
+    return min(max(minutes, MIN_REFRESH_MINUTES), MAX_REFRESH_MINUTES) * 60
+
+
+def is_stale(kind: str, item: str, age_seconds: float) -> bool:
+    """Whether a card of this age is due for a refresh (may hit SQLite; keep off the event loop)."""
+    if age_seconds < MIN_REFRESH_MINUTES * 60:
+        return False
+    return age_seconds >= target_age_seconds(kind, item)
+
+
+def calls_this_hour(now: Optional[float] = None) -> int:
+    _ensure_database()
+    now = time.time() if now is None else now
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(SUM(calls), 0) FROM refresh_spend WHERE ts > ?", (int(now) - 3600,))
+    spent = cursor.fetchone()[0]
+    conn.close()
+    return spent
+
+
+def remaining_budget(now: Optional[float] = None) -> int:
+    """Upstream calls left in the rolling hour."""
+    try:
+        return max(UPSTREAM_CALLS_PER_HOUR - calls_this_hour(now), 0)
+    except Exception as e:
+        logger.error(f"Failed to read refresh budget: {e}")
+        return UPSTREAM_CALLS_PER_HOUR
+
+
+def spend(kind: str, calls: int = 1):
+    """Charge refreshes that already happened (or were queued) to the budget."""
+    if calls <= 0:
+        return
+    try:
+        _ensure_database()
+        now = int(time.time())
+        conn = storage.connect(DB_FILE)
+        conn.execute("INSERT INTO refresh_spend (ts, kind, calls) VALUES (?, ?, ?)", (now, kind, calls))
+        conn.execute("DELETE FROM refresh_spend WHERE ts <= ?", (now - 3600,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Failed to record refresh spend: {e}")
+
+
+def should_refresh(kind: str, item: str, age_seconds: float, calls: int = 1) -> bool:
+    """Whether an on-demand refresh should happen now.
+
+    True only if the card is stale and the budget has room; the calls are
+    charged to the budget when it returns True.
+    """
+    if not is_stale(kind, item, age_seconds):
+        return False
+    if remaining_budget() < calls:
+        logger.info(f"Refresh budget exhausted, serving stale {kind} card for {item}")
+        return False
+    spend(kind, calls)
+    return True
+
+
+def plan_refresh(kind: str, ages: Dict[str, Optional[float]], lookahead_seconds: float = 0,
+                 calls_per_item: int = 1) -> List[str]:
+    """Items due for a batch refresh, most overdue first, cut to the remaining budget.
+
+    ages maps item -> card age in seconds (None if the card does not exist;
+    missing cards come first). Items that fall due within lookahead_seconds
+    (e.g. before the next batch) are included. The caller charges what it
+    renders with spend().
+    """
+    due = []
+    for item, age in ages.items():
+        if age is None:
+            due.append((math.inf, item))
+        elif is_stale(kind, item, age + lookahead_seconds):
+            due.append((age / target_age_seconds(kind, item), item))
+    due.sort(key=lambda entry: entry[0], reverse=True)
+
+    allowed = remaining_budget() // max(calls_per_item, 1)
+    if len(due) > allowed:
+        logger.warning(f"⏳ {len(due)} {kind} cards due, refresh budget allows {allowed} this hour")
+    logger.info(f"🗓️ {min(len(due), allowed)} of {len(ages)} {kind} cards due for refresh")
+    return [item for _, item in due[:allowed]]
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for the CDN (services/cdn_server.py)
+
+    gunicorn -c services/gunicorn_cdn.conf.py services.cdn_server:app
+
+Threaded workers keep many Telegram fetches in flight per process, and
+sendfile lets the kernel copy file bodies straight to the socket.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("CDN_BIND", "0.0.0.0:4000")
+
+# Requests are I/O bound (stat + sendfile), so a few processes with threads
+workers = int(os.environ.get("CDN_WORKERS", min(4, multiprocessing.cpu_count() * 2)))
+worker_class = "gthread"
+threads = int(os.environ.get("CDN_THREADS", 8))
+
+# Zero-copy file bodies via wsgi.file_wrapper
+sendfile = True
+
+# Telegram reuses connections for bursts of inline thumbnails
+keepalive = 15
+timeout = 30
+graceful_timeout = 10
+
+# Recycle workers occasionally to bound memory growth
+max_requests = 20000
+max_requests_jitter = 2000
+
+accesslog = None
+errorlog = "-"
+loglevel = "info"
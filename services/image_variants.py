@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Downscaled Image Variants
+
+Small copies of served images (cards, gift images, sticker frames) for inline
+result thumbnails. Variants live under IMAGE_VARIANTS_DIR, mirroring the
+source path, and carry the source file's mtime: a variant is reused while the
+mtimes match and rebuilt as soon as the source is rewritten.
+
+Generators call write_variants() right after saving a card so the CDN rarely
+has to build one on request; get_variant() builds missing or stale variants
+on demand.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import logging
+import threading
+
+from config.paths import IMAGE_VARIANTS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Supported variant sizes (longest edge in pixels)
+VARIANT_SIZES = (320,)
+
+# Size used for inline result thumbnails
+THUMBNAIL_SIZE = 320
+
+# WebP quality for variants
+VARIANT_QUALITY = 80
+
+
+def variant_path(source_path, size, variants_dir=IMAGE_VARIANTS_DIR):
+    """Where the size variant of source_path is stored (always WebP)."""
+    relative = os.path.splitdrive(os.path.abspath(source_path))[1].lstrip(os.sep)
+    if not relative.lower().endswith('.webp'):
+        relative += '.webp'
+    return os.path.join(variants_dir, str(size), relative)
+
+
+def is_fresh(source_path, path):
+    """True if the variant at path was built from the current source file."""
+    try:
+        return os.stat(path).st_mtime_ns == os.stat(source_path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def write_variant(source_path, size, image=None, variants_dir=IMAGE_VARIANTS_DIR):
+    """Build one variant, from an already-open image if given. Returns its path."""
+    from PIL import Image
+
+    source_stat = os.stat(source_path)
+    if image is None:
+        with Image.open(source_path) as source:
+            variant = source.copy()
+    else:
+        variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+
+    path = variant_path(source_path, size, variants_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        variant.save(tmp_path, 'WEBP', quality=VARIANT_QUALITY, method=4)
+        # Stamp the source mtime so freshness is a single stat comparison
+        os.utime(tmp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def write_variants(source_path, image=None, variants_dir=IMAGE_VARIANTS_DIR):
+    """Build every size variant of a freshly saved image; failures are logged, not raised."""
+    for size in VARIANT_SIZES:
+        try:
+            write_variant(source_path, size, image, variants_dir)
+        except Exception as e:
+            logger.error(f"Error writing {size}px variant of {source_path}: {e}")
+
+
+def get_variant(source_path, size, variants_dir=IMAGE_VARIANTS_DIR):
+    """Path of an up-to-date size variant of source_path, or None if it cannot be built."""
+    if size not in VARIANT_SIZES:
+        raise ValueError(f"Unsupported variant size: {size}")
+
+    path = variant_path(source_path, size, variants_dir)
+    if is_fresh(source_path, path):
+        return path
+    try:
+        return write_variant(source_path, size, variants_dir=variants_dir)
+    except Exception as e:
+        logger.error(f"Error building {size}px variant of {source_path}: {e}")
+        return None
@@ -476,6 +476,11 @@ async def fetch_gift_data(gift_name: str) -> Optional[Dict[str, Any]]:
         except Exception as e:
             api_logger.warning(f"[{gift_name}] Live API failed: {e}")
             result = None
+        
+        if result and result.get('priceTon'):
+            from services import price_history
+            await asyncio.to_thread(price_history.record_price, gift_name, result['priceTon'],
+                                    "mrkt" if is_mrkt_gift(gift_id) else "quant")
     else:
         api_logger.warning(f"[{gift_name}] Telegram credentials not configured, using fallback")
     
@@ -394,6 +394,10 @@ async def fetch_gift_data_with_retry(gift_name: str, max_retries: int = 3, is_pr
                 except ImportError:
                     ton_price_usd = 2.10  # Fallback value
                 
+                # Every successful live fetch feeds the price history
+                from services import price_history
+                await asyncio.to_thread(price_history.record_price, gift_name, price_val, "portal")
+                
                 return {
                     "name": gift.get("name"),
                     "priceUsd": price_val * ton_price_usd,
@@ -507,6 +511,13 @@ async def fetch_chart_data(gift_name: str) -> Optional[list]:
         list: Chart data points or mock data if not available
     """
     try:
+        # Prefer our own recorded prices when they cover the last 24 hours
+        from services import price_history
+        chart_data = await asyncio.to_thread(price_history.get_chart_data, gift_name)
+        if chart_data:
+            api_logger.info(f"[Chart API] Gift: {gift_name} | Served {len(chart_data)} points from price history")
+            return chart_data
+        
         # Portal API doesn't provide chart data, so use legacy API
         from urllib.parse import quote
         encoded_name = quote(gift_name)
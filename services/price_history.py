@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Gift Price History
+
+Time-series store for gift prices in historical_prices.db:
+
+- price_samples: one raw row per successful fetch, from every source
+- price_rollups: hourly and daily OHLC buckets, updated on every sample
+- fetch_stats: one row per upstream fetch attempt (success and latency),
+  so scheduler reliability survives restarts
+
+Charts, percentage changes and price fallbacks read from here instead of
+calling the upstream APIs again. Old raw samples and hourly buckets are
+trimmed by retention policies; daily buckets are kept. Retention runs as a
+refresh orchestrator job, never on the write path.
+
+Writes are synchronous SQLite calls; async callers run them with
+asyncio.to_thread so the event loop never waits on the database.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import time
+import logging
+import datetime
+from typing import Optional, List, Dict
+
+from config.paths import HISTORICAL_PRICES_DB_FILE
+from core import storage
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = HISTORICAL_PRICES_DB_FILE
+
+# Rollup resolutions: name -> bucket width in seconds
+RESOLUTIONS = {
+    "1h": 3600,
+    "1d": 86400,
+}
+
+# How long each tier is kept (seconds); None keeps everything
+RETENTION_SECONDS = {
+    "raw": 7 * 86400,
+    "1h": 90 * 86400,
+    "1d": None,
+    "fetch_stats": 30 * 86400,
+}
+
+# Rows removed per transaction when applying retention
+RETENTION_CHUNK_ROWS = 5000
+
+# Minimum hourly buckets in the window before a chart is served from history
+MIN_CHART_POINTS = 12
+
+
+def init_database():
+    """Create the time-series tables and import the legacy daily price_history rows."""
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_samples (
+            gift_name TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            price_ton REAL NOT NULL,
+            source TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_samples_gift_ts ON price_samples (gift_name, ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_samples_ts ON price_samples (ts)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            gift_name TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            open_ts INTEGER NOT NULL,
+            close_ts INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (gift_name, resolution, bucket_start)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_rollups_age ON price_rollups (resolution, bucket_start)')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fetch_stats (
+            source TEXT NOT NULL,
+            gift_name TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            success INTEGER NOT NULL,
+            latency_ms INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fetch_stats_source_ts ON fetch_stats (source, ts)')
+
+    # One-time import of the old one-row-per-day table
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='price_history'")
+    has_legacy = cursor.fetchone() is not None
+    cursor.execute("SELECT COUNT(*) FROM price_samples")
+    if has_legacy and cursor.fetchone()[0] == 0:
+        cursor.execute("SELECT gift_name, price_ton, timestamp, source FROM price_history")
+        legacy_rows = cursor.fetchall()
+        for gift_name, price_ton, timestamp, source in legacy_rows:
+            try:
+                ts = int(datetime.datetime.fromisoformat(str(timestamp)).timestamp())
+            except ValueError:
+                continue
+            _insert_sample(cursor, gift_name, ts, price_ton, source)
+        if legacy_rows:
+            logger.info(f"📚 Imported {len(legacy_rows)} legacy price_history rows")
+
+    conn.commit()
+    conn.close()
+
+
+def _ensure_database():
+    storage.run_migration(DB_FILE, "price_history_timeseries", init_database)
+
+
+def _insert_sample(cursor, gift_name, ts, price_ton, source):
+    cursor.execute(
+        "INSERT INTO price_samples (gift_name, ts, price_ton, source) VALUES (?, ?, ?, ?)",
+        (gift_name, ts, price_ton, source)
+    )
+    for resolution, width in RESOLUTIONS.items():
+        bucket_start = ts - ts % width
+        cursor.execute('''
+            INSERT INTO price_rollups
+                (gift_name, resolution, bucket_start, open, high, low, close, open_ts, close_ts, samples)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT (gift_name, resolution, bucket_start) DO UPDATE SET
+                open = CASE WHEN excluded.open_ts < open_ts THEN excluded.open ELSE open END,
+                open_ts = MIN(open_ts, excluded.open_ts),
+                close = CASE WHEN excluded.close_ts >= close_ts THEN excluded.close ELSE close END,
+                close_ts = MAX(close_ts, excluded.close_ts),
+                high = MAX(high, excluded.high),
+                low = MIN(low, excluded.low),
+                samples = samples + 1
+        ''', (gift_name, resolution, bucket_start, price_ton, price_ton, price_ton, price_ton, ts, ts))
+
+
+def record_price(gift_name: str, price_ton: float, source: str, ts: Optional[int] = None):
+    """Store a successful price fetch and fold it into the hourly/daily rollups."""
+    try:
+        if not price_ton or price_ton <= 0:
+            return
+        _ensure_database()
+        ts = int(ts if ts is not None else time.time())
+        conn = storage.connect(DB_FILE)
+        cursor = conn.cursor()
+        _insert_sample(cursor, gift_name, ts, float(price_ton), source)
+        conn.commit()
+        conn.close()
+        logger.info(f"💾 Stored price for {gift_name}: {price_ton} TON (source: {source})")
+    except Exception as e:
+        logger.error(f"Failed to store price history: {e}")
+
+
+def record_fetches(source: str, attempts: List[Dict], ts: Optional[int] = None):
+    """Store fetch attempts ({gift_name, success, latency}) from one run in one transaction."""
+    try:
+        if not attempts:
+            return
+        _ensure_database()
+        ts = int(ts if ts is not None else time.time())
+        conn = storage.connect(DB_FILE)
+        conn.executemany(
+            "INSERT INTO fetch_stats (source, gift_name, ts, success, latency_ms) VALUES (?, ?, ?, ?, ?)",
+            [(source, a["gift_name"], ts, 1 if a["success"] else 0, int(a["latency"] * 1000)) for a in attempts]
+        )
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Failed to store fetch stats: {e}")
+
+
+def get_fetch_stats(source: str, since_ts: int) -> Dict[str, Dict]:
+    """Per-gift fetch reliability since since_ts: attempts, successes, average latency, last success."""
+    _ensure_database()
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT gift_name, COUNT(*), SUM(success), AVG(latency_ms),
+               MAX(CASE WHEN success THEN ts END)
+        FROM fetch_stats
+        WHERE source = ? AND ts >= ?
+        GROUP BY gift_name
+    ''', (source, since_ts))
+    rows = cursor.fetchall()
+    conn.close()
+    return {
+        gift_name: {
+            "attempts": attempts,
+            "successes": successes,
+            "avg_latency_ms": round(avg_latency, 1),
+            "last_success_ts": last_success,
+        }
+        for gift_name, attempts, successes, avg_latency, last_success in rows
+    }
+
+
+def get_latest_price(gift_name: str, max_age_seconds: int) -> Optional[Dict]:
+    """Most recent raw sample within max_age_seconds, as {price_ton, ts, source}."""
+    try:
+        _ensure_database()
+        conn = storage.connect(DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT price_ton, ts, source FROM price_samples
+            WHERE gift_name = ? AND ts > ?
+            ORDER BY ts DESC LIMIT 1
+        ''', (gift_name, int(time.time()) - max_age_seconds))
+        result = cursor.fetchone()
+
+        if result is None:
+            # Raw samples may have aged out; fall back to the rollups
+            cursor.execute('''
+                SELECT close, close_ts, 'rollup' FROM price_rollups
+                WHERE gift_name = ? AND close_ts > ?
+                ORDER BY close_ts DESC LIMIT 1
+            ''', (gift_name, int(time.time()) - max_age_seconds))
+            result = cursor.fetchone()
+        conn.close()
+
+        if result:
+            return {"price_ton": result[0], "ts": result[1], "source": result[2]}
+        return None
+    except Exception as e:
+        logger.error(f"Failed to get historical price: {e}")
+        return None
+
+
+def get_samples(gift_name: str, start_ts: int, end_ts: int) -> List[Dict]:
+    """Raw samples for a gift in [start_ts, end_ts), oldest first."""
+    _ensure_database()
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT ts, price_ton, source FROM price_samples
+        WHERE gift_name = ? AND ts >= ? AND ts < ?
+        ORDER BY ts
+    ''', (gift_name, start_ts, end_ts))
+    rows = cursor.fetchall()
+    conn.close()
+    return [{"ts": ts, "price_ton": price, "source": source} for ts, price, source in rows]
+
+
+def get_rollups(gift_name: str, resolution: str, start_ts: int, end_ts: int) -> List[Dict]:
+    """OHLC buckets for a gift whose bucket_start is in [start_ts, end_ts), oldest first."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    _ensure_database()
+    conn = storage.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT bucket_start, open, high, low, close, samples FROM price_rollups
+        WHERE gift_name = ? AND resolution = ? AND bucket_start >= ? AND bucket_start < ?
+        ORDER BY bucket_start
+    ''', (gift_name, resolution, start_ts, end_ts))
+    rows = cursor.fetchall()
+    conn.close()
+    return [
+        {"bucket_start": b, "open": o, "high": h, "low": l, "close": c, "samples": n}
+        for b, o, h, l, c, n in rows
+    ]
+
+
+def get_chart_data(gift_name: str, hours: int = 24, ton_price_usd: Optional[float] = None) -> List[Dict]:
+    """
+    Hourly chart points for the last `hours` hours in the chart format used by
+    the card generator ({price, priceUsd, timestamp, time}).
+
+    Returns [] when history covers fewer than MIN_CHART_POINTS hours, so the
+    caller can fall back to an upstream chart.
+    """
+    try:
+        now = int(time.time())
+        buckets = get_rollups(gift_name, "1h", now - hours * 3600, now + 1)
+        if len(buckets) < min(MIN_CHART_POINTS, hours):
+            return []
+
+        if ton_price_usd is None:
+            try:
+                from ton_price_utils import get_ton_price_usd
+                ton_price_usd = get_ton_price_usd()
+            except ImportError:
+                ton_price_usd = 2.10  # Fallback value
+
+        return [
+            {
+                "price": bucket["close"],
+                "priceUsd": bucket["close"] * ton_price_usd,
+                "timestamp": bucket["bucket_start"],
+                "time": datetime.datetime.fromtimestamp(bucket["bucket_start"]).strftime("%H:%M"),
+            }
+            for bucket in buckets
+        ]
+    except Exception as e:
+        logger.error(f"Failed to build chart from price history for {gift_name}: {e}")
+        return []
+
+
+def get_percentage_change(gift_name: str, hours: int = 24) -> Optional[float]:
+    """Change from the first open to the last close over the window, or None without data."""
+    now = int(time.time())
+    buckets = get_rollups(gift_name, "1h", now - hours * 3600, now + 1)
+    if len(buckets) < 2 or buckets[0]["open"] <= 0:
+        return None
+    return round((buckets[-1]["close"] - buckets[0]["open"]) / buckets[0]["open"] * 100, 2)
+
+
+def _delete_older_than(cursor, table, column, cutoff, extra_where="", params=()):
+    deleted = 0
+    while True:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE rowid IN "
+            f"(SELECT rowid FROM {table} WHERE {column} < ? {extra_where} LIMIT ?)",
+            (cutoff, *params, RETENTION_CHUNK_ROWS)
+        )
+        chunk = cursor.rowcount
+        cursor.connection.commit()
+        deleted += chunk
+        if chunk < RETENTION_CHUNK_ROWS:
+            return deleted
+
+
+def apply_retention():
+    """Drop raw samples, rollups and fetch stats older than their RETENTION_SECONDS.
+
+    Deletes in chunks with a commit per chunk; run it from a scheduler, not
+    from request handlers. Returns the number of rows removed.
+    """
+    try:
+        _ensure_database()
+        now = int(time.time())
+        conn = storage.connect(DB_FILE)
+        cursor = conn.cursor()
+
+        deleted = 0
+        if RETENTION_SECONDS["raw"] is not None:
+            deleted += _delete_older_than(cursor, "price_samples", "ts", now - RETENTION_SECONDS["raw"])
+        if RETENTION_SECONDS["fetch_stats"] is not None:
+            deleted += _delete_older_than(cursor, "fetch_stats", "ts", now - RETENTION_SECONDS["fetch_stats"])
+        for resolution in RESOLUTIONS:
+            keep = RETENTION_SECONDS.get(resolution)
+            if keep is not None:
+                deleted += _delete_older_than(
+                    cursor, "price_rollups", "bucket_start", now - keep,
+                    "AND resolution = ?", (resolution,)
+                )
+        conn.close()
+
+        if deleted:
+            logger.info(f"🧹 Price history retention removed {deleted} rows")
+        return deleted
+    except Exception as e:
+        logger.error(f"Failed to apply price history retention: {e}")
+        return 0
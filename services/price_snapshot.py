@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Compact Sticker Price Snapshot
+
+A columnar, memory-mappable copy of sticker_price_results.json that the
+refresh pipeline writes next to the JSON. Opening it is one mmap and a header
+read; columns are read in place through typed memoryviews. The bot's sticker
+catalog, price-ordered sticker list and on-demand card prices are read from
+here instead of parsing the JSON.
+
+Layout (native byte order, every section 8-byte aligned):
+
+    header    magic, version, byte order, sticker count, section table
+    price     float64 per sticker (TON floor price)
+    price_usd float64 per sticker (NaN when unknown)
+    supply    int64 per sticker (-1 when unknown)
+    initial_supply, init_price_usd
+              int64 / float64 per sticker, as on the price card
+    strings   collection and sticker names, each as uint32 offsets + one
+              UTF-8 blob
+    orders    uint32 row indices: by price (highest first, ties by name) and
+              by (collection, sticker) name
+    groups    uint32 start of each collection's run in the name order, plus
+              the total count at the end
+
+Readers use load_snapshot() or load_catalog(), which keep the mapping (and
+the catalog built from it) until the file is replaced.
+"""
+
+import os
+import sys
+
+# Add project root to path for config imports
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import mmap
+import math
+import struct
+import logging
+import threading
+from array import array
+
+from core import publication
+
+logger = logging.getLogger(__name__)
+
+# File identification; bump SNAPSHOT_VERSION when the layout changes
+SNAPSHOT_MAGIC = b"GCPS"
+SNAPSHOT_VERSION = 3
+
+# Sections, in file order
+SECTIONS = (
+    "price", "price_usd", "supply", "initial_supply", "init_price_usd",
+    "collection_offsets", "collection_blob",
+    "sticker_offsets", "sticker_blob",
+    "order_by_price", "order_by_name",
+    "group_starts",
+)
+
+# magic, version, byte order (b"<" or b">"), padding, sticker count
+_HEADER = struct.Struct("<4sHcxI")
+# offset, length per section
+_SECTION = struct.Struct("<QQ")
+
+_BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+# Loaded snapshots: path -> (stat signature, PriceSnapshot)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def _string_column(values):
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = array("I", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _number(value, default):
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def build_snapshot(stickers):
+    """Encode a stickers_with_prices list as snapshot bytes."""
+    rows = [item for item in stickers if item.get("collection") and item.get("sticker")]
+    collections = [item["collection"] for item in rows]
+    names = [item["sticker"] for item in rows]
+    prices = array("d", (_number(item.get("price"), 0.0) for item in rows))
+    prices_usd = array("d", (_number(item.get("price_usd"), math.nan) for item in rows))
+    supplies = array("q", (int(_number(item.get("supply"), -1)) for item in rows))
+    initial_supplies = array("q", (int(_number(item.get("initial_supply"), -1)) for item in rows))
+    init_prices_usd = array("d", (_number(item.get("init_price_usd"), math.nan) for item in rows))
+
+    count = len(rows)
+    by_name = sorted(range(count), key=lambda i: (collections[i], names[i]))
+    by_price = sorted(range(count), key=lambda i: (-prices[i], collections[i], names[i]))
+    group_starts = array("I", (position for position, i in enumerate(by_name)
+                               if position == 0 or collections[by_name[position - 1]] != collections[i]))
+    group_starts.append(count)
+
+    columns = {
+        "price": prices.tobytes(),
+        "price_usd": prices_usd.tobytes(),
+        "supply": supplies.tobytes(),
+        "initial_supply": initial_supplies.tobytes(),
+        "init_price_usd": init_prices_usd.tobytes(),
+        "order_by_price": array("I", by_price).tobytes(),
+        "order_by_name": array("I", by_name).tobytes(),
+        "group_starts": group_starts.tobytes(),
+    }
+    for column, values in (("collection", collections), ("sticker", names)):
+        columns[f"{column}_offsets"], columns[f"{column}_blob"] = _string_column(values)
+
+    header_size = _HEADER.size + _SECTION.size * len(SECTIONS)
+    position = header_size
+    table = []
+    body = []
+    for name in SECTIONS:
+        padding = -position % 8
+        body.append(b"\0" * padding)
+        position += padding
+        table.append(_SECTION.pack(position, len(columns[name])))
+        body.append(columns[name])
+        position += len(columns[name])
+
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, _BYTE_ORDER, count)
+    return header + b"".join(table) + b"".join(body)
+
+
+def write_snapshot(path, stickers):
+    """Atomically replace the snapshot file (the caller records it in the publication manifest)."""
+    publication.write_bytes(path, build_snapshot(stickers))
+
+
+class _Strings:
+    """A string column read in place."""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __getitem__(self, i):
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+
+class PriceSnapshot:
+    """Read-only view over a mapped snapshot file. Rows are addressed by index."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, version, byte_order, count = _HEADER.unpack_from(view, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} price snapshot")
+        if byte_order != _BYTE_ORDER:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        sections = {}
+        for n, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(view, _HEADER.size + n * _SECTION.size)
+            sections[name] = view[offset:offset + length]
+
+        self.count = count
+        self.prices = sections["price"].cast("d")
+        self.prices_usd = sections["price_usd"].cast("d")
+        self.supplies = sections["supply"].cast("q")
+        self.initial_supplies = sections["initial_supply"].cast("q")
+        self.init_prices_usd = sections["init_price_usd"].cast("d")
+        self.collections = _Strings(sections["collection_offsets"].cast("I"), sections["collection_blob"])
+        self.stickers = _Strings(sections["sticker_offsets"].cast("I"), sections["sticker_blob"])
+        self.order_by_price = sections["order_by_price"].cast("I")
+        self.order_by_name = sections["order_by_name"].cast("I")
+        self._group_starts = sections["group_starts"].cast("I")
+        self._catalog = None
+
+    def __len__(self):
+        return self.count
+
+    def catalog(self):
+        """(sorted collections, {collection: sorted sticker names}), built once per snapshot."""
+        if self._catalog is None:
+            by_collection = {}
+            starts = self._group_starts
+            for group in range(len(starts) - 1):
+                rows = self.order_by_name[starts[group]:starts[group + 1]]
+                by_collection[self.collections[rows[0]]] = [self.stickers[i] for i in rows]
+            self._catalog = (list(by_collection), by_collection)
+        return self._catalog
+
+    def price_info(self, i):
+        """Row i as the price info dict the price card generators take (unknowns as 0)."""
+        def known(value):
+            return 0 if value != value or value < 0 else value
+        return {
+            'floor_price_ton': self.prices[i],
+            'floor_price_usd': known(self.prices_usd[i]),
+            'supply': known(self.supplies[i]),
+            'initial_supply': known(self.initial_supplies[i]),
+            'init_price_usd': known(self.init_prices_usd[i]),
+        }
+
+    def by_price(self):
+        """(collection, sticker, price) for every sticker, highest price first."""
+        for i in self.order_by_price:
+            yield self.collections[i], self.stickers[i], self.prices[i]
+
+
+def load_snapshot(path):
+    """The mapped snapshot at path, reused until the file is replaced. None if missing or invalid."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _snapshots_lock:
+        cached = _snapshots.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            snapshot = PriceSnapshot(path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"Error loading price snapshot {path}: {e}")
+            return None
+        _snapshots[path] = (signature, snapshot)
+        return snapshot
+
+
+def load_catalog(path):
+    """The catalog of the snapshot at path, or ([], {}) if there is none."""
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        return [], {}
+    return snapshot.catalog()
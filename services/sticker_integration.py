@@ -7,7 +7,6 @@ providing the same functionality as gift cards but for stickers.
 """
 
 import os
-import json
 import logging
 import re
 import time
@@ -20,6 +19,10 @@ from difflib import get_close_matches
 from core.premium_system import premium_system
 from core.bot_config import DEFAULT_MRKT_LINK, DEFAULT_PALACE_LINK
 from services import stickers_tools_api as sticker_api
+from core import publication
+from config.paths import STICKER_PRICE_SNAPSHOT_FILE
+from services import freshness, price_snapshot
+from generators.render_daemon import RenderDaemon, PRIORITY_USER
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -30,6 +33,22 @@ PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)  # Go up one level from services/
 STICKER_PRICE_DATA_FILE = os.path.join(PROJECT_ROOT, "data", "sticker_price_results.json")
 STICKER_CARDS_DIR = os.path.join(PROJECT_ROOT, "Sticker_Price_Cards")
 
+# How long a user waits for a stale card to be re-rendered before the
+# existing file is served instead (seconds)
+STALE_STICKER_CARD_DEADLINE_SECONDS = 2
+
+# How long a user waits for a card that does not exist yet (seconds)
+MISSING_STICKER_CARD_DEADLINE_SECONDS = 30
+
+# Collections rendered by the Goodies card generator
+GOODIES_CARD_COLLECTIONS = {
+    'teddie', 'lamborghini', 'not_wise', 'oracle_red_bull_racing', 'wsb', 'cool_cats', 'doodles',
+    'moonbirds', 'pudgy_penguins_x_kung_fu_panda', 'neiro', 'steady_teddys', 'bonk', 'goodies_blindbox'
+}
+
+# (snapshot, {(normalized collection, normalized sticker): row}) for price lookups
+_price_rows = (None, {})
+
 # Sticker keyword mappings for better matching
 STICKER_KEYWORDS = {
     # Natural language mappings
@@ -667,19 +686,22 @@ STICKER_KEYWORDS = {
 }
 
 def load_sticker_price_data():
-    """Load sticker price data from JSON file."""
+    """Load sticker price data from JSON file.
+    
+    The parsed file is cached until the refresh pipeline publishes a new one;
+    callers must not modify the result.
+    """
     try:
         if os.path.exists(STICKER_PRICE_DATA_FILE):
-            with open(STICKER_PRICE_DATA_FILE, 'r') as f:
-                data = json.load(f)
-                
-                # Handle both old format (dict with stickers_with_prices key) and new format (array)
-                if isinstance(data, list):
-                    # New format: convert to old format
-                    data = {"stickers_with_prices": data}
-                
-                logger.info(f"Loaded sticker price data with {len(data.get('stickers_with_prices', []))} entries")
-                return data
+            data = publication.load_json(STICKER_PRICE_DATA_FILE, default={"stickers_with_prices": []})
+            
+            # Handle both old format (dict with stickers_with_prices key) and new format (array)
+            if isinstance(data, list):
+                # New format: convert to old format
+                data = {"stickers_with_prices": data}
+            
+            logger.debug(f"Loaded sticker price data with {len(data.get('stickers_with_prices', []))} entries")
+            return data
         else:
             logger.warning(f"Sticker price data file not found: {STICKER_PRICE_DATA_FILE}")
             return {"stickers_with_prices": []}
@@ -687,64 +709,99 @@ def load_sticker_price_data():
         logger.error(f"Error loading sticker price data: {e}")
         return {"stickers_with_prices": []}
 
-def get_sticker_card_path(collection, sticker):
-    """Get the path to a sticker price card."""
-    # Use the same normalization as the price card generator
-    def normalize_name(name):
-        import re
-        name = name.strip().lower()
-        name = re.sub(r'[^a-z0-9]', '_', name)
-        name = re.sub(r'_+', '_', name)
-        return name.strip('_')
+def _sticker_price_info(collection, sticker):
+    """Price info from the snapshot published by the refresh pipeline, or None if unpriced.
     
-    # Normalize collection and sticker names for file matching
-    collection_normalized = normalize_name(collection)
-    sticker_normalized = normalize_name(sticker)
+    Never calls stickers.tools; the row index is rebuilt once per published snapshot.
+    """
+    global _price_rows
+    snapshot = price_snapshot.load_snapshot(STICKER_PRICE_SNAPSHOT_FILE)
+    if snapshot is None:
+        return None
+    indexed, rows = _price_rows
+    if indexed is not snapshot:
+        rows = {}
+        for i in range(len(snapshot)):
+            key = (sticker_api.normalize_name(snapshot.collections[i]), sticker_api.normalize_name(snapshot.stickers[i]))
+            rows.setdefault(key, i)
+        _price_rows = (snapshot, rows)
+    i = rows.get((sticker_api.normalize_name(collection), sticker_api.normalize_name(sticker)))
+    if i is None or snapshot.prices[i] <= 0:
+        return None
+    return snapshot.price_info(i)
+
+def _render_sticker_card(key, collection, sticker):
+    """Render one sticker card in this process (runs on a render daemon worker).
     
-    filename = f"{collection_normalized}_{sticker_normalized}_price_card.webp"
-    filepath = os.path.join(STICKER_CARDS_DIR, filename)
+    The generator modules stay imported, so fonts and gradients are warm
+    after the first card. Prices come from the published price snapshot.
+    """
+    if sticker_api.normalize_name(collection) in GOODIES_CARD_COLLECTIONS:
+        from generators import goodies_price_card_generator
+        return goodies_price_card_generator.generate_price_card(collection, sticker, 0, STICKER_CARDS_DIR)
     
-    # Check if file exists and is fresh (less than 32 minutes old)
-    should_generate = False
-    if not os.path.exists(filepath):
-        should_generate = True
-    else:
-        # Check freshness
-        try:
-            mtime = os.path.getmtime(filepath)
-            if (time.time() - mtime) > (30 * 60):
-                should_generate = True
-                logger.info(f"Card for {collection} - {sticker} is stale (>30m), regenerating...")
-        except (OSError, IOError) as e:
-            logger.warning(f"Error checking file modification time for {filepath}: {e}")
-            should_generate = True
+    from generators import sticker_price_card_generator
+    price_info = _sticker_price_info(collection, sticker)
+    if not price_info:
+        logger.warning(f"No price info for {collection} - {sticker}, not rendering card")
+        return None
+    return sticker_price_card_generator.generate_price_card(
+        collection, sticker, price_info['floor_price_ton'], STICKER_CARDS_DIR, price_info=price_info
+    )
 
-    if should_generate:
-        try:
-            logger.info(f"Generating price card for {collection} - {sticker}...")
-            # Determine which generator to use
-            if collection.lower() in ['teddie', 'lamborghini', 'not_wise', 'oracle_red_bull_racing', 'wsb', 'cool_cats', 'doodles', 'moonbirds', 'pudgy_penguins_x_kung_fu_panda', 'neiro', 'steady_teddys', 'bonk', 'goodies_blindbox']:
-                cmd = [sys.executable, os.path.join(SCRIPT_DIR, "goodies_price_card_generator.py"), collection, sticker, "0"]
-            else:
-                cmd = [sys.executable, os.path.join(SCRIPT_DIR, "sticker_price_card_generator.py"), collection, sticker, "0"]
-            
-            import subprocess
-            subprocess.run(cmd, check=True, timeout=30)
-        except Exception as e:
-            logger.error(f"Failed to generate card for {collection} - {sticker}: {e}")
-            if not os.path.exists(filepath):
-                 return None
+# One worker: on-demand sticker renders are rare and each takes tens of milliseconds
+sticker_render_daemon = RenderDaemon(_render_sticker_card, workers=1, name="sticker-render")
 
-    return filepath
+async def get_sticker_card_path(collection, sticker):
+    """Get the path to a sticker price card, rendering it if missing or stale.
+    
+    Stale cards (per services.freshness) are re-rendered in process; if that
+    misses its deadline the existing card is served.
+    """
+    filename = f"{sticker_api.normalize_name(collection)}_{sticker_api.normalize_name(sticker)}_price_card.webp"
+    filepath = os.path.join(STICKER_CARDS_DIR, filename)
+    item = f"{collection} - {sticker}"
+    freshness.record_view(freshness.KIND_STICKER, item)
+    
+    try:
+        age = time.time() - os.path.getmtime(filepath)
+    except FileNotFoundError:
+        age = None
+    except OSError as e:
+        logger.warning(f"Error checking file modification time for {filepath}: {e}")
+        age = None
+    
+    if age is not None and age < freshness.MIN_REFRESH_MINUTES * 60:
+        return filepath
+    # Renders reuse one stats download, so stickers do not spend the upstream budget
+    if age is not None and not await asyncio.to_thread(freshness.is_stale, freshness.KIND_STICKER, item, age):
+        return filepath
+    
+    if age is None:
+        logger.info(f"Generating price card for {collection} - {sticker}...")
+        deadline = MISSING_STICKER_CARD_DEADLINE_SECONDS
+    else:
+        logger.info(f"Card for {collection} - {sticker} is stale ({age / 60:.0f}m), regenerating...")
+        deadline = STALE_STICKER_CARD_DEADLINE_SECONDS
+    
+    try:
+        rendered_path = await sticker_render_daemon.render(
+            filename, collection, sticker, priority=PRIORITY_USER, deadline=deadline
+        )
+        if rendered_path:
+            return rendered_path
+    except asyncio.TimeoutError:
+        logger.info(f"Render for {collection} - {sticker} missed its {deadline}s deadline, serving existing card")
+    except Exception as e:
+        logger.error(f"Failed to generate card for {collection} - {sticker}: {e}")
+    
+    return filepath if age is not None else None
 
 def find_matching_stickers(query):
     """Find stickers that match the query with exact name matching only."""
     query_lower = query.lower().strip()
     
-    # Load sticker data
-    sticker_data = load_sticker_price_data()
-    stickers = sticker_data.get("stickers_with_prices", [])
-    collections = set(item["collection"] for item in stickers)
+    collections, by_collection = get_sticker_catalog()
     
     # 1. Try exact collection name match (case-insensitive, whole phrase)
     for collection in collections:
@@ -754,17 +811,16 @@ def find_matching_stickers(query):
     
     # 2. Try exact sticker name matching only
     matches = []
-    for sticker_info in stickers:
-        collection = sticker_info["collection"]
-        sticker = sticker_info["sticker"]
-        sticker_lower = sticker.lower()
-        
-        # Only exact matches allowed
-        if query_lower == sticker_lower:
-            matches.append((collection, sticker))
-        # Also check collection + sticker format
-        elif query_lower == f"{collection.lower()} {sticker_lower}":
-            matches.append((collection, sticker))
+    for collection in collections:
+        for sticker in by_collection[collection]:
+            sticker_lower = sticker.lower()
+            
+            # Only exact matches allowed
+            if query_lower == sticker_lower:
+                matches.append((collection, sticker))
+            # Also check collection + sticker format
+            elif query_lower == f"{collection.lower()} {sticker_lower}":
+                matches.append((collection, sticker))
     
     # Remove duplicates while preserving order
     seen = set()
@@ -863,7 +919,7 @@ def format_sticker_price_message(sticker_info):
 async def send_sticker_card(update: Update, context: ContextTypes.DEFAULT_TYPE, collection, sticker, edit_message_id=None, chat_id=None, user_id=None):
     """Send a sticker price card with buttons."""
     # Get the card path
-    card_path = get_sticker_card_path(collection, sticker)
+    card_path = await get_sticker_card_path(collection, sticker)
     
     if not card_path:
         error_msg = f"Sorry, couldn't find the sticker card for {collection} - {sticker}."
@@ -880,12 +936,12 @@ async def send_sticker_card(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 await update.callback_query.answer(error_msg, show_alert=True)
         return
     
-    # Get sticker price info from stickers.tools API (run in executor to avoid blocking)
+    # Get sticker price info from the published snapshot (run in executor to avoid blocking)
     try:
         loop = asyncio.get_running_loop()
         price_info = await loop.run_in_executor(
             None,
-            functools.partial(sticker_api.get_sticker_price, collection, sticker)
+            functools.partial(_sticker_price_info, collection, sticker)
         )
     except Exception as e:
         logger.error(f"Error fetching sticker price for {collection} - {sticker}: {e}")
@@ -969,7 +1025,7 @@ async def send_sticker_card(update: Update, context: ContextTypes.DEFAULT_TYPE,
             # Register the new message owner if user_id is provided
             if user_id:
                 try:
-                    from rate_limiter import register_message
+                    from core.rate_limiter import register_message
                     register_message(user_id, chat_id, edit_message_id)
                     logger.info(f"✅ REGISTERED: Edited sticker card message {edit_message_id} to user {user_id} in chat {chat_id}")
                 except ImportError:
@@ -987,7 +1043,7 @@ async def send_sticker_card(update: Update, context: ContextTypes.DEFAULT_TYPE,
             
             # Register the message owner in the database for delete permission tracking
             try:
-                from rate_limiter import register_message
+                from core.rate_limiter import register_message
                 user_id = user_id or update.effective_user.id
                 chat_id = chat_id or update.effective_chat.id
                 register_message(user_id, chat_id, sent_message.message_id)
@@ -1010,26 +1066,24 @@ async def send_sticker_card(update: Update, context: ContextTypes.DEFAULT_TYPE,
             except Exception as e2:
                 logger.error(f"Error editing message caption as fallback: {e2}")
 
+def get_sticker_catalog():
+    """Return (sorted collections, {collection: sorted stickers}).
+    
+    Read from the mapped price snapshot and rebuilt only when a new snapshot
+    is published, so repeat calls (one per collection in an inline query)
+    neither read a file nor regroup the stickers. Callers must not modify it.
+    """
+    return price_snapshot.load_catalog(STICKER_PRICE_SNAPSHOT_FILE)
+
 def get_sticker_collections():
     """Get list of all available sticker collections."""
-    sticker_data = load_sticker_price_data()
-    collections = set()
-    
-    for item in sticker_data.get("stickers_with_prices", []):
-        collections.add(item["collection"])
-    
-    return sorted(list(collections))
+    collections, _ = get_sticker_catalog()
+    return list(collections)
 
 def get_stickers_in_collection(collection):
     """Get all stickers in a specific collection."""
-    sticker_data = load_sticker_price_data()
-    stickers = []
-    
-    for item in sticker_data.get("stickers_with_prices", []):
-        if item["collection"] == collection:
-            stickers.append(item["sticker"])
-    
-    return sorted(stickers)
+    _, by_collection = get_sticker_catalog()
+    return list(by_collection.get(collection, []))
 
 def get_sticker_keyboard(collection=None, page=0):
     """Get keyboard for sticker browsing with pagination."""
@@ -1146,7 +1200,7 @@ async def handle_sticker_callback(update: Update, context: ContextTypes.DEFAULT_
     # Check ownership for ALL button interactions (except delete which has its own check)
     if data != "delete":
         try:
-            from rate_limiter import can_delete_message, get_message_owner
+            from core.rate_limiter import can_delete_message, get_message_owner
             logger.info(f"🔒 Checking ownership for button '{data}' - User: {user_id}, Chat: {chat_id}, Message: {message_id}")
             
             # First, try the normal ownership check
@@ -1179,7 +1233,7 @@ async def handle_sticker_callback(update: Update, context: ContextTypes.DEFAULT_
     if data == "delete":
         # Check if the user is the owner of this message
         try:
-            from rate_limiter import can_delete_message, get_message_owner
+            from core.rate_limiter import can_delete_message, get_message_owner
             is_owner = can_delete_message(user_id, chat_id, message_id)
             
             if not is_owner:
@@ -1230,7 +1284,7 @@ async def handle_sticker_callback(update: Update, context: ContextTypes.DEFAULT_
             
             # Register the message owner for the new collections message
             try:
-                from rate_limiter import register_message
+                from core.rate_limiter import register_message
                 register_message(user_id, chat_id, sent_message.message_id)
                 logger.info(f"✅ REGISTERED: Collections message {sent_message.message_id} to user {user_id} in chat {chat_id}")
             except ImportError:
@@ -1254,7 +1308,7 @@ async def handle_sticker_callback(update: Update, context: ContextTypes.DEFAULT_
                     )
                     # Register the message owner
                     try:
-                        from rate_limiter import register_message
+                        from core.rate_limiter import register_message
                         register_message(user_id, chat_id, sent_message.message_id)
                         logger.info(f"✅ REGISTERED: Fallback collections message {sent_message.message_id} to user {user_id} in chat {chat_id}")
                     except ImportError:
@@ -1336,9 +1390,9 @@ async def handle_sticker_callback(update: Update, context: ContextTypes.DEFAULT_
         prefix = "sticker_"
         remaining = data[len(prefix):]
         
-        # Try to split and match against known collections
-        sticker_data = load_sticker_price_data()
-        collections_list = list(set(item["collection"] for item in sticker_data.get("stickers_with_prices", [])))
+        # Try to split and match against known collections, longest name
+        # first so "Dogs OG" wins over a "Dogs" prefix
+        collections_list = sorted(get_sticker_collections(), key=len, reverse=True)
         
         # Find the matching collection
         collection = None
@@ -15,6 +15,35 @@ def get_sticker_stats(force_refresh=False):
     response.raise_for_status()
     return response.json()
 
+def _safe_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _price_info(s):
+    return {
+        'floor_price_ton': _safe_float(s.get('floor_price_ton', 0)),
+        'floor_price_usd': _safe_float(s.get('floor_price_usd', 0)),
+        'supply': s.get('supply', 0),
+        'initial_supply': s.get('initial_supply', 0),
+        'init_price_usd': _safe_float(s.get('init_price_usd', 0)),
+        'median_price_ton': _safe_float(s.get('median_price_ton', 0)),
+        'median_price_usd': _safe_float(s.get('median_price_usd', 0))
+    }
+
+def build_price_index(stats):
+    """Map (normalized collection, normalized sticker) -> price info for a whole stats payload."""
+    index = {}
+    for c in stats['collections'].values():
+        collection_norm = normalize_name(c['name'])
+        for s in c['stickers']:
+            # Skip invalid stickers (API sometimes returns issuer metadata entries)
+            if not isinstance(s, dict) or 'name' not in s:
+                continue
+            index.setdefault((collection_norm, normalize_name(s['name'])), _price_info(s))
+    return index
+
 def get_sticker_price(collection, sticker, force_refresh=True):
     stats = get_sticker_stats(force_refresh=force_refresh)
     collection_norm = normalize_name(collection)
@@ -26,16 +55,5 @@ def get_sticker_price(collection, sticker, force_refresh=True):
                 if not isinstance(s, dict) or 'name' not in s:
                     continue
                 if normalize_name(s['name']) == sticker_norm:
-                    def safe_float(val):
-                        try:
-                            return float(val)
-                        except (TypeError, ValueError):
-                            return 0.0
-                    return {
-                        'floor_price_ton': safe_float(s.get('floor_price_ton', 0)),
-                        'floor_price_usd': safe_float(s.get('floor_price_usd', 0)),
-                        'supply': s.get('supply', 0),
-                        'initial_supply': s.get('initial_supply', 0),
-                        'init_price_usd': safe_float(s.get('init_price_usd', 0))
-                    }
-    return None 
\ No newline at end of file
+                    return _price_info(s)
+    return None
@@ -10,9 +10,7 @@ except Exception:
 import time
 import os
 import json
-import sqlite3
 import requests
-from datetime import datetime, timedelta
 from urllib.parse import quote
 import sys
 
@@ -89,6 +87,7 @@ def clear_price_cache():
 
 # Historical price database setup - using centralized config
 from config.paths import HISTORICAL_PRICES_DB_FILE
+from services import price_history
 PRICE_DB_FILE = HISTORICAL_PRICES_DB_FILE
 
 def get_legacy_supply_data(gift_name: str) -> Any:
@@ -207,93 +206,35 @@ def calculate_premarket_percentage_change(chart_data: List[Dict]) -> float:
 
 def init_price_database():
     """Initialize the historical price database."""
-    # Ensure sqlite_data directory exists
-    os.makedirs(os.path.dirname(PRICE_DB_FILE), exist_ok=True)
-    
-    conn = sqlite3.connect(PRICE_DB_FILE)
-    cursor = conn.cursor()
-    
-    # Create table for historical prices (simplified schema)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            gift_name TEXT NOT NULL,
-            price_ton REAL NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            source TEXT NOT NULL,
-            success_count INTEGER DEFAULT 1
-        )
-    ''')
-    
-    # Create index for faster lookups
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_gift_timestamp ON price_history(gift_name, timestamp DESC)')
-    
-    conn.commit()
-    conn.close()
+    price_history.init_database()
 
 def store_successful_price(gift_name: str, price_ton: float, source: str):
     """Store a successful price fetch in the historical database."""
-    try:
-        conn = sqlite3.connect(PRICE_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if we already have a price for today for this gift
-        today = datetime.now().date().isoformat()
-        cursor.execute('''
-            SELECT id FROM price_history 
-            WHERE gift_name = ? AND DATE(timestamp) = ? 
-            LIMIT 1
-        ''', (gift_name, today))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing entry
-            cursor.execute('''
-                UPDATE price_history 
-                SET price_ton = ?, source = ?, timestamp = ?, success_count = success_count + 1
-                WHERE id = ?
-            ''', (price_ton, source, datetime.now().isoformat(), existing[0]))
-        else:
-            # Insert new entry
-            cursor.execute('''
-                INSERT INTO price_history (gift_name, price_ton, source, timestamp) 
-                VALUES (?, ?, ?, ?)
-            ''', (gift_name, price_ton, source, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"💾 Stored price for {gift_name}: {price_ton} TON (source: {source})")
-    except Exception as e:
-        logger.error(f"Failed to store price history: {e}")
+    price_history.record_price(gift_name, price_ton, source)
 
 def get_historical_price(gift_name: str, max_age_days: int = 7) -> Optional[float]:
     """Get the most recent historical price for a gift within max_age_days."""
-    try:
-        conn = sqlite3.connect(PRICE_DB_FILE)
-        cursor = conn.cursor()
-        
-        cutoff_date = (datetime.now() - timedelta(days=max_age_days)).isoformat()
-        
-        cursor.execute('''
-            SELECT price_ton, timestamp, source FROM price_history 
-            WHERE gift_name = ? AND timestamp > ? 
-            ORDER BY timestamp DESC LIMIT 1
-        ''', (gift_name, cutoff_date))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            price, timestamp, source = result
-            age_hours = (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds() / 3600
-            logger.info(f"📚 Using historical price for {gift_name}: {price} TON (age: {age_hours:.1f}h, source: {source})")
-            return price
-            
-        return None
-    except Exception as e:
-        logger.error(f"Failed to get historical price: {e}")
-        return None
+    result = price_history.get_latest_price(gift_name, max_age_days * 86400)
+    if result:
+        age_hours = (time.time() - result["ts"]) / 3600
+        logger.info(f"📚 Using historical price for {gift_name}: {result['price_ton']} TON (age: {age_hours:.1f}h, source: {result['source']})")
+        return result["price_ton"]
+    return None
+
+async def get_tonnel_chart_data(gift_name: str, force_fresh: bool = False) -> List[Dict]:
+    """Chart data for a premarket gift, from recorded price history when it covers the window."""
+    if not force_fresh:
+        chart_data = await asyncio.to_thread(price_history.get_chart_data, gift_name)
+        if chart_data:
+            logger.info(f"📚 Using price history chart for {gift_name} ({len(chart_data)} points)")
+            return chart_data
+    
+    display_name = PREMARKET_GIFTS.get(gift_name, gift_name)
+    return await asyncio.to_thread(get_legacy_chart_data, display_name)
+
+def calculate_percentage_change_from_chart(chart_data: List[Dict]) -> float:
+    """Percentage change for chart data from either price history or the Legacy API."""
+    return calculate_premarket_percentage_change(chart_data)
 
 def apply_rate_limiting():
     """Apply rate limiting to API requests."""
@@ -335,9 +276,6 @@ async def get_tonnel_gift_price(gift_name: str, force_fresh: bool = False) -> Op
     """
     start_time = time.time()
     
-    # Initialize database if needed
-    init_price_database()
-    
     # If tonnelmp is unavailable, skip live fetch methods
     if not TONNEL_AVAILABLE:
         logger.warning("tonnelmp module not available; skipping Tonnel live methods")
@@ -376,7 +314,8 @@ async def get_tonnel_gift_price(gift_name: str, force_fresh: bool = False) -> Op
             price = float(gifts[0].get('price', 0))
             if price > 0:
                 logger.info(f"✅ METHOD 1 SUCCESS: {api_gift_name} = {price} TON")
-                store_successful_price(gift_name, price, "getGifts_premarket" if is_premarket else "getGifts_no_auth")
+                await asyncio.to_thread(store_successful_price, gift_name, price,
+                                        "getGifts_premarket" if is_premarket else "getGifts_no_auth")
                 if not force_fresh:  # Only cache if not forcing fresh
                     cache_price(gift_name, price)
                 return price
@@ -405,7 +344,7 @@ async def get_tonnel_gift_price(gift_name: str, force_fresh: bool = False) -> Op
                         floor_price = gift_data.get('data', {}).get('floorPrice')
                         if floor_price and floor_price > 0:
                             logger.info(f"✅ METHOD 2 SUCCESS: {api_gift_name} = {floor_price} TON (floor)")
-                            store_successful_price(gift_name, floor_price, "filterStatsPretty")
+                            await asyncio.to_thread(store_successful_price, gift_name, floor_price, "filterStatsPretty")
                             if not force_fresh:  # Only cache if not forcing fresh
                                 cache_price(gift_name, floor_price)
                             return floor_price
@@ -448,9 +387,11 @@ async def get_tonnel_gift_price(gift_name: str, force_fresh: bool = False) -> Op
 # Export all important functions
 __all__ = [
     'get_tonnel_gift_price', 
+    'get_tonnel_chart_data', 
     'get_legacy_chart_data', 
     'get_legacy_supply_data', 
     'calculate_premarket_percentage_change', 
+    'calculate_percentage_change_from_chart', 
     'clear_all_caches',
     'clear_price_cache',
     'PREMARKET_GIFTS'
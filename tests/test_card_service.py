@@ -0,0 +1,205 @@
+"""
+Tests for the async gift card service.
+"""
+import pytest
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import card_service, freshness, price_history
+from services.card_service import CardService, card_filenames
+from generators.render_daemon import RenderDaemon, PRIORITY_USER, PRIORITY_BATCH
+
+
+class TestCardManifest:
+    """Test manifest-backed card lookups."""
+
+    def test_find_card_uses_manifest(self, tmp_path):
+        """Test that cards are resolved from the manifest after a rebuild."""
+        (tmp_path / "Plush_Pepe_card.webp").write_bytes(b"card")
+        service = CardService(cards_dir=str(tmp_path))
+        service.manifest.rebuild()
+
+        assert service.find_card("Plush Pepe") == str(tmp_path / "Plush_Pepe_card.webp")
+        assert service.find_card("Unknown Gift") is None
+
+    def test_card_filenames_normalization(self):
+        """Test that special gift names map to their card filenames."""
+        assert card_filenames("Durov's Cap")[0] == "Durovs_Cap_card.webp"
+
+
+class TestBatchRefresh:
+    """Test queueing stale cards for batch regeneration."""
+
+    def test_stale_cards_queued_by_gift_name(self, tmp_path, monkeypatch):
+        """Test that batch jobs use gift list names and skip timestamped refresh cards."""
+        monkeypatch.setattr(card_service, "LAST_GENERATION_TIME_FILE", str(tmp_path / "missing.txt"))
+        monkeypatch.setattr(freshness, "DB_FILE", str(tmp_path / "freshness.db"))
+        monkeypatch.setattr(price_history, "DB_FILE", str(tmp_path / "historical_prices.db"))
+        cards = tmp_path / "cards"
+        cards.mkdir()
+        stale = time.time() - 3 * 3600
+        for filename in ["Durovs_Cap_card.webp", "Plush_Pepe_1760000000_card.webp", "Jack_in_the_Box_card.webp"]:
+            (cards / filename).write_bytes(b"card")
+            os.utime(cards / filename, (stale, stale))
+        (cards / "Tama_Gadget_card.webp").write_bytes(b"card")
+
+        service = CardService(cards_dir=str(cards),
+                              gift_names=lambda: ["Durov's Cap", "Jack-in-the-Box", "Plush Pepe", "Tama Gadget"])
+        service._rebuild()
+        queued = []
+        service.daemon.submit = lambda key, *args, priority: queued.append((key, args[0]))
+        service._enqueue_stale_cards()
+
+        assert sorted(queued) == [("Durovs_Cap", "Durov's Cap"), ("Jack_in_the_Box", "Jack-in-the-Box"),
+                                  ("Plush_Pepe", "Plush Pepe")]
+
+    def test_missing_cards_queued_first(self, tmp_path, monkeypatch):
+        """Test that gifts without a card are regenerated, ahead of stale ones."""
+        monkeypatch.setattr(card_service, "LAST_GENERATION_TIME_FILE", str(tmp_path / "missing.txt"))
+        monkeypatch.setattr(freshness, "DB_FILE", str(tmp_path / "freshness.db"))
+        monkeypatch.setattr(price_history, "DB_FILE", str(tmp_path / "historical_prices.db"))
+        cards = tmp_path / "cards"
+        cards.mkdir()
+        stale = time.time() - 3 * 3600
+        (cards / "Plush_Pepe_card.webp").write_bytes(b"card")
+        os.utime(cards / "Plush_Pepe_card.webp", (stale, stale))
+
+        service = CardService(cards_dir=str(cards), gift_names=lambda: ["Plush Pepe", "Lol Pop"])
+        service._rebuild()
+        queued = []
+        service.daemon.submit = lambda key, *args, priority: queued.append((key, args[0]))
+        service._enqueue_stale_cards()
+
+        assert queued == [("Lol_Pop", "Lol Pop"), ("Plush_Pepe", "Plush Pepe")]
+
+
+class TestFreshnessKeys:
+    """Test that freshness lookups use one name per gift."""
+
+    def test_views_and_refreshes_use_gift_list_name(self, tmp_path, monkeypatch):
+        """Test that a filename-style request is counted under the gift list name."""
+        card = tmp_path / "Durovs_Cap_card.webp"
+        card.write_bytes(b"card")
+        stale = time.time() - 3 * 3600
+        os.utime(card, (stale, stale))
+        service = CardService(cards_dir=str(tmp_path), gift_names=lambda: ["Durov's Cap"])
+        service._rebuild()
+        items = []
+        monkeypatch.setattr(freshness, "record_view", lambda kind, item: items.append(("view", item)))
+        monkeypatch.setattr(freshness, "should_refresh", lambda kind, item, age: items.append(("refresh", item)))
+
+        for requested in ["Durovs_Cap", "Durov's Cap"]:
+            assert asyncio.run(service.get_gift_card(requested)) == str(card)
+
+        assert items == [("view", "Durov's Cap"), ("refresh", "Durov's Cap")] * 2
+
+
+class TestInflightDedupe:
+    """Test that concurrent misses share one render."""
+
+    def test_concurrent_misses_render_once(self, tmp_path):
+        """Test that one render serves all concurrent requests for a gift."""
+        service = CardService(cards_dir=str(tmp_path))
+        service.manifest.rebuild()
+        service._schedule_batch_refresh = lambda: None
+        calls = []
+        release = threading.Event()
+
+        def fake_render(key, gift_display_name, filename_suffix=""):
+            calls.append(key)
+            release.wait(timeout=5)
+            path = tmp_path / "Tama_Gadget_card.webp"
+            path.write_bytes(b"card")
+            service.manifest.record(str(path))
+            return str(path)
+
+        service.daemon.render_func = fake_render
+
+        async def run():
+            tasks = [asyncio.create_task(service.get_gift_card("Tama Gadget")) for _ in range(5)]
+            await asyncio.sleep(0.05)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(result == str(tmp_path / "Tama_Gadget_card.webp") for result in results)
+
+
+class TestRenderDaemon:
+    """Test render daemon priority ordering."""
+
+    def test_user_jobs_jump_ahead_of_batch(self):
+        """Test that a user job queued behind batch jobs is rendered first."""
+        order = []
+        started = threading.Event()
+        gate = threading.Event()
+
+        def render(key):
+            started.set()
+            gate.wait(timeout=5)
+            order.append(key)
+            return key
+
+        daemon = RenderDaemon(render, workers=1)
+        first = daemon.submit("running", priority=PRIORITY_BATCH)
+        started.wait(timeout=5)
+        batch = [daemon.submit(f"batch_{i}", priority=PRIORITY_BATCH) for i in range(3)]
+        user = daemon.submit("user", priority=PRIORITY_USER)
+        gate.set()
+        for future in [first, user] + batch:
+            future.result(timeout=5)
+        daemon.stop()
+
+        assert order[:2] == ["running", "user"]
+
+    def test_promotes_queued_batch_job(self):
+        """Test that a user request for a queued batch job promotes it."""
+        started = threading.Event()
+        gate = threading.Event()
+
+        def render(key):
+            started.set()
+            gate.wait(timeout=5)
+            return key
+
+        daemon = RenderDaemon(render, workers=1)
+        daemon.submit("running", priority=PRIORITY_BATCH)
+        started.wait(timeout=5)
+        batch_future = daemon.submit("Plush_Pepe", priority=PRIORITY_BATCH)
+        user_future = daemon.submit("Plush_Pepe", priority=PRIORITY_USER)
+        gate.set()
+
+        assert user_future is batch_future
+        assert user_future.result(timeout=5) == "Plush_Pepe"
+        daemon.stop()
+
+    def test_finished_job_not_reused(self):
+        """Test that a submit made as a job resolves starts a new job."""
+        calls = []
+        resubmitted = []
+
+        def render(key):
+            calls.append(key)
+            return len(calls)
+
+        daemon = RenderDaemon(render, workers=1)
+        first = daemon.submit("Plush_Pepe")
+        first.add_done_callback(lambda _: resubmitted.append(daemon.submit("Plush_Pepe")))
+        first.result(timeout=5)
+        second = resubmitted[0]
+
+        assert second is not first
+        assert second.result(timeout=5) == 2
+        assert daemon.stats['completed'] == 2
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,102 @@
+"""
+Tests for the CDN folder manifests.
+"""
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.publication import hash_file
+from services.cdn_manifest import FolderManifest, file_type, CACHE_LONG_LIVED
+
+
+def make_collection(root):
+    pack = root / "Blum" / "Cap"
+    pack.mkdir(parents=True)
+    (pack / "1.png").write_bytes(b"one")
+    (pack / "2.png").write_bytes(b"two")
+    (root / "Blum" / "Bunny").mkdir()
+    (root / "Blum" / "Bunny" / "1.png").write_bytes(b"bunny")
+    return root
+
+
+class TestFolderManifest:
+    """Test manifest building, listing and incremental refresh."""
+
+    def test_recursive_listing(self, tmp_path):
+        """Test that a recursive manifest lists nested files with hashes."""
+        make_collection(tmp_path)
+        manifest = FolderManifest(str(tmp_path), recursive=True)
+        manifest.refresh(force=True)
+
+        paths = [entry.path for entry in manifest.entries()]
+        assert paths == ["Blum/Bunny/1.png", "Blum/Cap/1.png", "Blum/Cap/2.png"]
+        entry = manifest.get("Blum/Cap/1.png")
+        assert entry.size == 3
+        assert entry.hash == hash_file(str(tmp_path / "Blum" / "Cap" / "1.png"))
+        assert manifest.subdirectories("Blum") == ["Bunny", "Cap"]
+
+    def test_flat_listing_skips_subdirectories(self, tmp_path):
+        """Test that a flat manifest only lists top-level files."""
+        (tmp_path / "card.webp").write_bytes(b"card")
+        (tmp_path / "nested").mkdir()
+        (tmp_path / "nested" / "skip.webp").write_bytes(b"skip")
+        manifest = FolderManifest(str(tmp_path))
+        manifest.refresh(force=True)
+
+        entries = manifest.entries()
+        assert [entry.path for entry in entries] == ["card.webp"]
+        assert entries[0].to_dict("/api/new_gift_cards")["url"] == "/api/new_gift_cards/card.webp"
+
+    def test_refresh_picks_up_added_and_removed_files(self, tmp_path):
+        """Test that changed directories are rescanned on refresh."""
+        make_collection(tmp_path)
+        manifest = FolderManifest(str(tmp_path), recursive=True)
+        manifest.refresh(force=True)
+
+        (tmp_path / "Blum" / "Cap" / "3.png").write_bytes(b"three")
+        os.remove(tmp_path / "Blum" / "Cap" / "1.png")
+        manifest.refresh(force=True)
+
+        assert [entry.path for entry in manifest.entries("Blum/Cap/")] == ["Blum/Cap/2.png", "Blum/Cap/3.png"]
+        assert manifest.search("3.png")[0].path == "Blum/Cap/3.png"
+
+    def test_search_substring(self, tmp_path):
+        """Test case-insensitive substring search over names and paths."""
+        make_collection(tmp_path)
+        manifest = FolderManifest(str(tmp_path), recursive=True)
+        manifest.refresh(force=True)
+
+        assert [entry.path for entry in manifest.search("bunny")] == ["Blum/Bunny/1.png"]
+        assert len(manifest.search("CAP/")) == 2
+        assert len(manifest.search("1")) == 2
+        assert manifest.search("missing") == []
+
+
+class TestFileTypes:
+    """Test the extension -> (content type, cache policy) table."""
+
+    def test_webp_is_served_as_webp(self):
+        """Test that WebP cards are not labelled as PNG."""
+        assert file_type("Plush_Pepe_card.webp")[0] == "image/webp"
+        assert file_type("LOGO.PNG")[0] == "image/png"
+        assert file_type("gift_png")[0] == "image/png"
+
+    def test_cache_policy_and_default(self):
+        """Test per-extension cache policies and the unknown-extension default."""
+        assert file_type("font.otf") == ("font/otf", CACHE_LONG_LIVED)
+        assert file_type("blob.bin")[0] == "application/octet-stream"
+
+    def test_entry_carries_type(self, tmp_path):
+        """Test that manifest entries resolve their type once."""
+        (tmp_path / "card.webp").write_bytes(b"card")
+        manifest = FolderManifest(str(tmp_path))
+        manifest.refresh(force=True)
+
+        assert manifest.get("card.webp").content_type == "image/webp"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,161 @@
+"""
+Tests for CDN file serving.
+"""
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("flask")
+
+from services import cdn_server
+from services.cdn_manifest import FolderManifest
+
+
+@pytest.fixture
+def cards_dir(tmp_path, monkeypatch):
+    """CDN app serving a temporary new_gift_cards folder with an empty hot cache."""
+    folder = tmp_path / "new_gift_cards"
+    folder.mkdir()
+    monkeypatch.setattr(cdn_server, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(cdn_server, "FOLDERS", {"new_gift_cards": "new_gift_cards"})
+    monkeypatch.setattr(cdn_server, "manifests", {"new_gift_cards": FolderManifest(str(folder))})
+    monkeypatch.setattr(cdn_server, "hot_cache", cdn_server.HotFileCache())
+    return folder
+
+
+@pytest.fixture
+def client(cards_dir):
+    return cdn_server.app.test_client()
+
+
+class TestConditionalResponses:
+    """Test validators, revalidation and range requests."""
+
+    def test_etag_revalidation_answers_304(self, cards_dir, client):
+        """Test that a matching If-None-Match gets 304 without a body."""
+        (cards_dir / "Plush_Pepe_card.webp").write_bytes(b"card bytes")
+
+        first = client.get("/api/new_gift_cards/Plush_Pepe_card.webp")
+        assert first.status_code == 200
+        assert first.data == b"card bytes"
+        etag = first.headers["ETag"]
+
+        second = client.get("/api/new_gift_cards/Plush_Pepe_card.webp", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.data == b""
+
+    def test_rewritten_file_gets_new_etag(self, cards_dir, client):
+        """Test that a stale If-None-Match after a rewrite gets the new file."""
+        card = cards_dir / "Plush_Pepe_card.webp"
+        card.write_bytes(b"old")
+        etag = client.get("/api/new_gift_cards/Plush_Pepe_card.webp").headers["ETag"]
+        card.write_bytes(b"new card")
+        cdn_server.hot_cache.invalidate()
+
+        response = client.get("/api/new_gift_cards/Plush_Pepe_card.webp", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.data == b"new card"
+
+    def test_range_request_answers_206(self, cards_dir, client):
+        """Test that a byte range is served as partial content."""
+        (cards_dir / "Plush_Pepe_card.webp").write_bytes(b"0123456789")
+
+        response = client.get("/api/new_gift_cards/Plush_Pepe_card.webp", headers={"Range": "bytes=2-5"})
+        assert response.status_code == 206
+        assert response.data == b"2345"
+        assert response.headers["Content-Range"] == "bytes 2-5/10"
+
+    def test_large_file_served_from_disk_with_range(self, cards_dir, client, monkeypatch):
+        """Test that files too big for the hot cache still support ETags and ranges."""
+        monkeypatch.setattr(cdn_server, "HOT_CACHE_MAX_FILE_BYTES", 4)
+        (cards_dir / "Plush_Pepe_card.webp").write_bytes(b"0123456789")
+
+        full = client.get("/api/new_gift_cards/Plush_Pepe_card.webp")
+        assert full.data == b"0123456789"
+        assert cdn_server.hot_cache.size_bytes() == 0
+
+        partial = client.get("/api/new_gift_cards/Plush_Pepe_card.webp", headers={"Range": "bytes=0-3"})
+        assert partial.status_code == 206
+        assert partial.data == b"0123"
+        revalidated = client.get("/api/new_gift_cards/Plush_Pepe_card.webp",
+                                 headers={"If-None-Match": full.headers["ETag"]})
+        assert revalidated.status_code == 304
+
+
+class TestHotFileCache:
+    """Test the in-memory LRU of small served files."""
+
+    def load(self, cache, path, body):
+        path.write_bytes(body)
+        return cache.load(str(path), os.stat(path), {})
+
+    def test_least_recently_used_evicted(self, tmp_path):
+        """Test that the byte budget evicts the least recently used file."""
+        cache = cdn_server.HotFileCache(max_bytes=10)
+        self.load(cache, tmp_path / "a", b"aaaa")
+        self.load(cache, tmp_path / "b", b"bbbb")
+        assert cache.get(str(tmp_path / "a")) is not None
+        self.load(cache, tmp_path / "c", b"cccc")
+
+        assert cache.get(str(tmp_path / "b")) is None
+        assert cache.get(str(tmp_path / "a")).body == b"aaaa"
+        assert cache.get(str(tmp_path / "c")).body == b"cccc"
+        assert cache.size_bytes() == 8
+
+    def test_files_over_cap_not_cached(self, tmp_path):
+        """Test that files above HOT_CACHE_MAX_FILE_BYTES are left to sendfile."""
+        cache = cdn_server.HotFileCache()
+        big = tmp_path / "big.webp"
+        big.write_bytes(b"\0" * (cdn_server.HOT_CACHE_MAX_FILE_BYTES + 1))
+
+        assert cache.load(str(big), os.stat(big), {}) is None
+        assert self.load(cache, tmp_path / "small.webp", b"\0" * cdn_server.HOT_CACHE_MAX_FILE_BYTES)
+        assert cache.size_bytes() == cdn_server.HOT_CACHE_MAX_FILE_BYTES
+
+    def test_rewritten_file_dropped_on_revalidation(self, tmp_path):
+        """Test that a changed file is only noticed once the revalidation interval passes."""
+        cache = cdn_server.HotFileCache()
+        card = tmp_path / "card.webp"
+        entry = self.load(cache, card, b"old")
+        card.write_bytes(b"new card")
+
+        assert cache.get(str(card)) is entry
+        entry.checked_at -= cdn_server.HOT_CACHE_REVALIDATE_SECONDS
+        assert cache.get(str(card)) is None
+        assert cache.stats['invalidations'] == 1
+        assert cache.size_bytes() == 0
+
+    def test_unchanged_file_kept_on_revalidation(self, tmp_path):
+        """Test that a file whose stat matches stays cached."""
+        cache = cdn_server.HotFileCache()
+        card = tmp_path / "card.webp"
+        entry = self.load(cache, card, b"card")
+        entry.checked_at -= cdn_server.HOT_CACHE_REVALIDATE_SECONDS
+
+        assert cache.get(str(card)) is entry
+        assert cache.stats['invalidations'] == 0
+
+
+class TestPathSafety:
+    """Test that requests cannot leave the served folders."""
+
+    def test_traversal_rejected(self, cards_dir, client):
+        """Test that ../ paths are not resolved or served."""
+        (cards_dir.parent / "secret.txt").write_bytes(b"secret")
+
+        assert cdn_server.resolve_file_path("new_gift_cards", "../secret.txt") is None
+        response = client.get("/api/new_gift_cards/..%2Fsecret.txt")
+        assert response.status_code == 404
+        assert b"secret" not in response.data
+
+    def test_unknown_folder_rejected(self, client):
+        """Test that only configured folders are served."""
+        assert cdn_server.resolve_file_path("sqlite_data", "premium_system.db") is None
+        assert client.get("/api/sqlite_data/premium_system.db").status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,66 @@
+"""
+Tests for the database backup scheduler.
+"""
+import pytest
+import os
+import sys
+import time
+import zipfile
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("schedule")
+
+from core import storage
+from schedulers import database_backup
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Two databases and a backup folder under a temporary directory."""
+    backup_dir = tmp_path / "backups"
+    monkeypatch.setattr(database_backup, "BACKUP_STATE_FILE", str(backup_dir / "backup_state.json"))
+    for name in ("premium_system.db", "user_requests.db"):
+        conn = storage.connect(str(tmp_path / name))
+        conn.execute("CREATE TABLE items (id INTEGER)")
+        conn.commit()
+    return tmp_path
+
+
+def run_backup(data_dir):
+    backup = database_backup.create_backup(str(data_dir), str(data_dir / "backups"))
+    if backup is None:
+        return None
+    zip_path, backup_info, state = backup
+    database_backup.save_backup_state(state)
+    with zipfile.ZipFile(zip_path) as zipf:
+        return sorted(name for name in zipf.namelist() if name.endswith('.db'))
+
+
+class TestIncrementalBackups:
+    """Test skipping unchanged databases and periodic full backups."""
+
+    def test_only_changed_databases_included(self, data_dir):
+        """Test that a backup after a full one holds only the changed database."""
+        assert run_backup(data_dir) == ["premium_system.db", "user_requests.db"]
+        assert run_backup(data_dir) is None
+
+        conn = storage.connect(str(data_dir / "user_requests.db"))
+        conn.execute("INSERT INTO items VALUES (1)")
+        conn.commit()
+        assert run_backup(data_dir) == ["user_requests.db"]
+
+    def test_unchanged_databases_included_in_periodic_full_backup(self, data_dir):
+        """Test that every database is backed up again once the full interval passes."""
+        run_backup(data_dir)
+        state = database_backup.load_backup_state()
+        state[database_backup.FULL_BACKUP_STATE_KEY] = time.time() - database_backup.FULL_BACKUP_INTERVAL_HOURS * 3600
+        database_backup.save_backup_state(state)
+
+        assert run_backup(data_dir) == ["premium_system.db", "user_requests.db"]
+        assert run_backup(data_dir) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
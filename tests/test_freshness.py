@@ -0,0 +1,85 @@
+"""
+Tests for the card freshness scheduler.
+"""
+import pytest
+import time
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import freshness, price_history
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    """Freshness module and price history pointed at temporary databases."""
+    monkeypatch.setattr(freshness, "DB_FILE", str(tmp_path / "freshness.db"))
+    monkeypatch.setattr(freshness, "_volatility_cache", {})
+    monkeypatch.setattr(freshness, "_popularity_cache", (0, {}))
+    monkeypatch.setattr(price_history, "DB_FILE", str(tmp_path / "historical_prices.db"))
+    return freshness
+
+
+class TestTargetAge:
+    """Test per-item target ages."""
+
+    def test_unknown_item_uses_default(self, scheduler):
+        """Test that an item without history or views gets the default age."""
+        assert scheduler.target_age_seconds("sticker", "Dogs OG - Sheikh") == scheduler.DEFAULT_REFRESH_MINUTES * 60
+
+    def test_volatile_gift_refreshed_sooner_than_quiet_one(self, scheduler):
+        """Test that a large recent price move shortens the target age."""
+        hour = int(time.time()) // 3600 * 3600
+        for offset, volatile, quiet in [(-7200, 10.0, 5.0), (-3600, 12.0, 5.0), (60, 15.0, 5.0)]:
+            price_history.record_price("Plush Pepe", volatile, "portal", ts=hour + offset)
+            price_history.record_price("Desk Calendar", quiet, "portal", ts=hour + offset)
+
+        volatile_age = scheduler.target_age_seconds("gift", "Plush Pepe")
+        quiet_age = scheduler.target_age_seconds("gift", "Desk Calendar")
+        assert volatile_age == scheduler.MIN_REFRESH_MINUTES * 60
+        assert quiet_age == scheduler.MAX_REFRESH_MINUTES * 60
+
+    def test_views_shorten_target_age(self, scheduler):
+        """Test that flushed views make an item refresh more often."""
+        for _ in range(int(scheduler.POPULAR_VIEWS_PER_HOUR * scheduler.POPULARITY_WINDOW_HOURS)):
+            scheduler.record_view("sticker", "Blum - Cap")
+        scheduler.flush_views()
+
+        assert scheduler.target_age_seconds("sticker", "Blum - Cap") == scheduler.DEFAULT_REFRESH_MINUTES * 30
+
+
+class TestRefreshBudget:
+    """Test planning refreshes within the hourly budget."""
+
+    def test_plan_orders_by_overdue_and_respects_budget(self, scheduler, monkeypatch):
+        """Test that missing cards come first and the plan stops at the budget."""
+        monkeypatch.setattr(scheduler, "UPSTREAM_CALLS_PER_HOUR", 3)
+        default = scheduler.DEFAULT_REFRESH_MINUTES * 60
+        ages = {"Fresh": 60, "Late": default * 2, "Later": default * 3, "Missing": None, "Due": default + 1}
+
+        assert scheduler.plan_refresh("gift", ages) == ["Missing", "Later", "Late"]
+        scheduler.spend("gift", 3)
+        assert scheduler.plan_refresh("gift", ages) == []
+
+    def test_lookahead_includes_cards_due_before_next_batch(self, scheduler):
+        """Test that cards falling due within the lookahead are planned."""
+        ages = {"Almost": scheduler.DEFAULT_REFRESH_MINUTES * 60 - 300}
+
+        assert scheduler.plan_refresh("gift", ages) == []
+        assert scheduler.plan_refresh("gift", ages, lookahead_seconds=600) == ["Almost"]
+
+    def test_should_refresh_spends_budget(self, scheduler, monkeypatch):
+        """Test that on-demand refreshes stop once the budget is used up."""
+        monkeypatch.setattr(scheduler, "UPSTREAM_CALLS_PER_HOUR", 1)
+        stale_age = scheduler.DEFAULT_REFRESH_MINUTES * 60 + 1
+
+        assert not scheduler.should_refresh("gift", "Plush Pepe", 60)
+        assert scheduler.should_refresh("gift", "Plush Pepe", stale_age)
+        assert not scheduler.should_refresh("gift", "Plush Pepe", stale_age)
+        assert scheduler.remaining_budget() == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,66 @@
+"""
+Tests for downscaled image variants.
+"""
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import image_variants
+from services.image_variants import variant_path, is_fresh, get_variant, THUMBNAIL_SIZE
+
+
+class TestImageVariants:
+    """Test variant paths and source-driven freshness."""
+
+    def test_variant_path_is_webp_per_size(self, tmp_path):
+        """Test that variants are stored per size and always as WebP."""
+        source = tmp_path / "1.png"
+        path = variant_path(str(source), 320, str(tmp_path / "variants"))
+
+        assert path.startswith(str(tmp_path / "variants" / "320"))
+        assert path.endswith("1.png.webp")
+        assert variant_path(str(tmp_path / "card.webp"), 320, "v").endswith("card.webp")
+
+    def test_fresh_variant_is_reused(self, tmp_path, monkeypatch):
+        """Test that a variant stamped with the source mtime is not rebuilt."""
+        source = tmp_path / "card.webp"
+        source.write_bytes(b"card")
+        variants_dir = str(tmp_path / "variants")
+        path = variant_path(str(source), THUMBNAIL_SIZE, variants_dir)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"small")
+        source_stat = os.stat(source)
+        os.utime(path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("variant should not be rebuilt")
+
+        monkeypatch.setattr(image_variants, "write_variant", fail)
+        assert get_variant(str(source), THUMBNAIL_SIZE, variants_dir) == path
+
+    def test_rewritten_source_makes_variant_stale(self, tmp_path, monkeypatch):
+        """Test that a source rewrite triggers a rebuild."""
+        source = tmp_path / "card.webp"
+        source.write_bytes(b"card")
+        path = variant_path(str(source), THUMBNAIL_SIZE, str(tmp_path))
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(b"small")
+        os.utime(path, ns=(0, os.stat(source).st_mtime_ns - 10**9))
+
+        assert not is_fresh(str(source), path)
+        monkeypatch.setattr(image_variants, "write_variant", lambda *args, **kwargs: "rebuilt")
+        assert get_variant(str(source), THUMBNAIL_SIZE, str(tmp_path)) == "rebuilt"
+
+    def test_unknown_size_rejected(self, tmp_path):
+        """Test that only configured sizes are accepted."""
+        with pytest.raises(ValueError):
+            get_variant(str(tmp_path / "card.webp"), 999)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,100 @@
+"""
+Tests for the gift price history store.
+"""
+import pytest
+import time
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import price_history
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    """Price history module pointed at a temporary database."""
+    monkeypatch.setattr(price_history, "DB_FILE", str(tmp_path / "historical_prices.db"))
+    return price_history
+
+
+class TestRollups:
+    """Test incremental OHLC rollups."""
+    
+    def test_hourly_ohlc(self, history):
+        """Test that samples in one hour fold into a single OHLC bucket."""
+        base = (int(time.time()) // 3600 - 1) * 3600
+        for offset, price in [(60, 2.0), (600, 3.0), (300, 1.5), (1200, 2.5)]:
+            history.record_price("Plush Pepe", price, "portal", ts=base + offset)
+        
+        buckets = history.get_rollups("Plush Pepe", "1h", base, base + 3600)
+        assert len(buckets) == 1
+        bucket = buckets[0]
+        assert (bucket["open"], bucket["high"], bucket["low"], bucket["close"]) == (2.0, 3.0, 1.5, 2.5)
+        assert bucket["samples"] == 4
+    
+    def test_latest_price_and_change(self, history):
+        """Test fallback lookups and percentage change from history."""
+        now = int(time.time())
+        history.record_price("Tama Gadget", 10.0, "tonnel", ts=now - 5 * 3600)
+        history.record_price("Tama Gadget", 12.0, "tonnel", ts=now - 60)
+        
+        assert history.get_latest_price("Tama Gadget", 3600)["price_ton"] == 12.0
+        assert history.get_latest_price("Unknown", 3600) is None
+        assert history.get_percentage_change("Tama Gadget") == 20.0
+    
+    def test_chart_needs_coverage(self, history):
+        """Test that charts are only served once history covers the window."""
+        now = int(time.time())
+        history.record_price("Snoop Dogg", 5.0, "portal", ts=now - 60)
+        assert history.get_chart_data("Snoop Dogg", ton_price_usd=3.0) == []
+        
+        for hour in range(1, 24):
+            history.record_price("Snoop Dogg", 5.0, "portal", ts=now - hour * 3600)
+        chart = history.get_chart_data("Snoop Dogg", ton_price_usd=3.0)
+        assert len(chart) >= 12
+        assert chart[-1]["priceUsd"] == 15.0
+
+
+class TestRetention:
+    """Test retention of raw samples."""
+    
+    def test_old_samples_removed(self, history):
+        """Test that raw samples past retention are dropped but daily rollups stay."""
+        old = int(time.time()) - 30 * 86400
+        history.record_price("Plush Pepe", 2.0, "portal", ts=old)
+        history.record_price("Plush Pepe", 2.5, "portal")
+        
+        # Writes never prune; retention only runs when a scheduler asks for it
+        assert len(history.get_samples("Plush Pepe", old - 1, old + 1)) == 1
+        assert history.apply_retention() == 1
+        assert history.get_samples("Plush Pepe", old - 1, old + 1) == []
+        assert len(history.get_rollups("Plush Pepe", "1d", old - 86400, old + 86400)) == 1
+
+
+class TestFetchStats:
+    """Test persisted upstream fetch reliability."""
+    
+    def test_stats_aggregated_per_gift(self, history):
+        """Test that attempts roll up into per-gift success counts and latency."""
+        now = int(time.time())
+        history.record_fetches("tonnel_premarket", [
+            {"gift_name": "Happy_Brownie", "success": True, "latency": 1.0},
+            {"gift_name": "Ice_Cream", "success": False, "latency": 3.0},
+        ], ts=now - 60)
+        history.record_fetches("tonnel_premarket", [
+            {"gift_name": "Happy_Brownie", "success": True, "latency": 2.0},
+        ], ts=now)
+        history.record_fetches("other", [{"gift_name": "Ice_Cream", "success": True, "latency": 1.0}], ts=now)
+        
+        stats = history.get_fetch_stats("tonnel_premarket", now - 3600)
+        assert stats["Happy_Brownie"] == {
+            "attempts": 2, "successes": 2, "avg_latency_ms": 1500.0, "last_success_ts": now
+        }
+        assert stats["Ice_Cream"]["successes"] == 0
+        assert stats["Ice_Cream"]["last_success_ts"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
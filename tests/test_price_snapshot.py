@@ -0,0 +1,102 @@
+"""
+Tests for the compact sticker price snapshot.
+"""
+import pytest
+import os
+import sys
+import json
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import price_snapshot
+
+
+STICKERS = [
+    {"collection": "Dogs OG", "sticker": "Sheikh", "price": 12.5, "price_usd": 40.0, "supply": 500},
+    {"collection": "Blum", "sticker": "Cap", "price": 30.0},
+    {"collection": "Dogs OG", "sticker": "King", "price": 5.0, "supply": 100},
+    {"collection": "Blum", "sticker": "Bunny", "price": 30.0, "price_usd": 96.0},
+]
+
+
+@pytest.fixture
+def snapshot_file(tmp_path):
+    path = str(tmp_path / "sticker_prices.snapshot")
+    price_snapshot.write_snapshot(path, STICKERS)
+    return path
+
+
+class TestPriceSnapshot:
+    """Test writing, mapping and querying the snapshot."""
+
+    def test_columns(self, snapshot_file):
+        """Test that rows keep their values, with gaps for unknown USD prices and supply."""
+        snapshot = price_snapshot.PriceSnapshot(snapshot_file)
+
+        assert len(snapshot) == 4
+        assert (snapshot.collections[0], snapshot.stickers[0], snapshot.prices[0]) == ("Dogs OG", "Sheikh", 12.5)
+        assert snapshot.supplies[1] == -1
+        assert snapshot.prices_usd[2] != snapshot.prices_usd[2]
+
+    def test_price_info_fills_unknowns(self, snapshot_file):
+        """Test that a row converts to card price info with unknown values as 0."""
+        snapshot = price_snapshot.PriceSnapshot(snapshot_file)
+
+        assert snapshot.price_info(0) == {'floor_price_ton': 12.5, 'floor_price_usd': 40.0, 'supply': 500,
+                                          'initial_supply': 0, 'init_price_usd': 0}
+        assert snapshot.price_info(1)['supply'] == 0
+
+    def test_price_order(self, snapshot_file):
+        """Test that stickers come highest price first, ties by name."""
+        snapshot = price_snapshot.PriceSnapshot(snapshot_file)
+
+        assert list(snapshot.by_price()) == [
+            ("Blum", "Bunny", 30.0), ("Blum", "Cap", 30.0), ("Dogs OG", "Sheikh", 12.5), ("Dogs OG", "King", 5.0)
+        ]
+
+    def test_catalog_from_groups(self, snapshot_file):
+        """Test that the catalog lists sorted collections and sorted stickers per collection."""
+        collections, by_collection = price_snapshot.load_catalog(snapshot_file)
+
+        assert collections == ["Blum", "Dogs OG"]
+        assert by_collection == {"Blum": ["Bunny", "Cap"], "Dogs OG": ["King", "Sheikh"]}
+
+    def test_catalog_rebuilt_only_for_new_snapshot(self, snapshot_file, tmp_path):
+        """Test that the catalog is reused until a new snapshot is published."""
+        catalog = price_snapshot.load_catalog(snapshot_file)
+        assert price_snapshot.load_catalog(snapshot_file) is catalog
+
+        price_snapshot.write_snapshot(snapshot_file, [{"collection": "Blum", "sticker": "Cap", "price": 1.0}])
+        assert price_snapshot.load_catalog(snapshot_file) == (["Blum"], {"Blum": ["Cap"]})
+        assert price_snapshot.load_catalog(str(tmp_path / "missing.snapshot")) == ([], {})
+
+    def test_load_reuses_mapping_until_replaced(self, snapshot_file):
+        """Test that load_snapshot maps the file once per published version."""
+        first = price_snapshot.load_snapshot(snapshot_file)
+        assert price_snapshot.load_snapshot(snapshot_file) is first
+
+        price_snapshot.write_snapshot(snapshot_file, STICKERS[:1])
+        assert len(price_snapshot.load_snapshot(snapshot_file)) == 1
+
+    def test_invalid_file_rejected(self, tmp_path):
+        """Test that a file that is not a snapshot loads as None."""
+        path = tmp_path / "prices.json"
+        path.write_text(json.dumps({"stickers_with_prices": STICKERS}))
+
+        assert price_snapshot.load_snapshot(str(path)) is None
+        assert price_snapshot.load_snapshot(str(tmp_path / "missing.snapshot")) is None
+
+    def test_empty_snapshot(self, tmp_path):
+        """Test that an empty sticker list still produces a loadable snapshot."""
+        path = str(tmp_path / "empty.snapshot")
+        price_snapshot.write_snapshot(path, [])
+        snapshot = price_snapshot.load_snapshot(path)
+
+        assert len(snapshot) == 0
+        assert snapshot.catalog() == ([], {})
+        assert list(snapshot.by_price()) == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
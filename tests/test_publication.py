@@ -0,0 +1,77 @@
+"""
+Tests for atomic, versioned publication of price files.
+"""
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import publication
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """Point the publication manifest at a temporary directory."""
+    monkeypatch.setattr(publication, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(publication, "PUBLICATION_MANIFEST_FILE", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(publication, "_manifest_cache", (None, None))
+    return tmp_path
+
+
+class TestPublication:
+    """Test atomic writes, generations and cached reads."""
+
+    def test_publish_bumps_generation_only_on_change(self, manifest):
+        """Test that republishing identical content keeps the generation."""
+        prices = str(manifest / "prices.json")
+        assert publication.current_generation() == 0
+
+        assert publication.publish_json(prices, {"price": 1}) == 1
+        assert publication.publish_json(prices, {"price": 1}) == 1
+        assert publication.publish_json(prices, {"price": 2}) == 2
+        assert publication.file_generation(prices) == 2
+
+    def test_changed_since(self, manifest):
+        """Test that readers can tell which files changed after a generation."""
+        prices = str(manifest / "prices.json")
+        status = str(manifest / "status.json")
+        publication.publish_json(prices, {"price": 1})
+        seen = publication.publish_json(status, {"ok": True})
+
+        assert not publication.changed_since(seen)
+        publication.publish_json(status, {"ok": False})
+        assert publication.changed_since(seen)
+        assert publication.changed_since(seen, [status])
+        assert not publication.changed_since(seen, [prices])
+
+    def test_no_temp_files_left_behind(self, manifest):
+        """Test that the rename leaves only the published file."""
+        publication.write_json(str(manifest / "prices.json"), {"price": 1})
+        assert sorted(os.listdir(manifest)) == ["prices.json"]
+
+    def test_failed_write_keeps_old_file(self, manifest):
+        """Test that a failing write leaves the previous version intact."""
+        prices = str(manifest / "prices.json")
+        publication.write_json(prices, {"price": 1})
+        with pytest.raises(TypeError):
+            publication.write_json(prices, {"price": object()})
+
+        assert publication.load_json(prices) == {"price": 1}
+        assert sorted(os.listdir(manifest)) == ["prices.json"]
+
+    def test_load_json_cached_until_replaced(self, manifest):
+        """Test that parsed data is reused until a new version is published."""
+        prices = str(manifest / "prices.json")
+        publication.write_json(prices, {"price": 1})
+        first = publication.load_json(prices)
+
+        assert publication.load_json(prices) is first
+        publication.write_json(prices, {"price": 2})
+        assert publication.load_json(prices) == {"price": 2}
+        assert publication.load_json(str(manifest / "missing.json"), default={}) == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -5,6 +5,7 @@ import pytest
 import time
 import os
 import sys
+import sqlite3
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -46,5 +47,99 @@ class TestRateLimiting:
         assert not is_exceeded, "Rate limit should not be exceeded"
 
 
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    """Rate limiter module pointed at a temporary database with a fresh store."""
+    from core import rate_limiter
+    monkeypatch.setattr(rate_limiter, "DB_FILE", str(tmp_path / "user_requests.db"))
+    store = rate_limiter.RateLimitStore(persist_interval=3600)
+    writer = rate_limiter.MessageOwnershipWriter(flush_interval_ms=3600000)
+    monkeypatch.setattr(rate_limiter, "rate_limit_store", store)
+    monkeypatch.setattr(rate_limiter, "message_writer", writer)
+    yield rate_limiter
+    # Drain buffers while still pointed at the temporary database
+    store.flush()
+    writer.flush()
+
+
+class TestRateLimitStore:
+    """Test the in-memory rate limit store."""
+    
+    def test_command_cooldown(self, limiter):
+        """Test that a second command inside the cooldown is blocked."""
+        allowed, _ = limiter.can_user_use_command(1, -100, "price")
+        assert allowed
+        allowed, remaining = limiter.can_user_use_command(1, -100, "price")
+        assert not allowed
+        assert 0 < remaining <= 60
+        
+        # Other users and commands are tracked separately
+        assert limiter.can_user_use_command(2, -100, "price")[0]
+        assert limiter.can_user_use_command(1, -100, "premium_info")[0]
+    
+    def test_gift_request_and_reset(self, limiter):
+        """Test the per-minute gift limit and cooldown reset."""
+        assert limiter.can_user_request(1, -100, "Plush Pepe")[0]
+        assert not limiter.can_user_request(1, -100, "Plush Pepe")[0]
+        limiter.reset_user_cooldown(1, -100)
+        assert limiter.can_user_request(1, -100, "Plush Pepe")[0]
+    
+    def test_checks_do_not_touch_disk(self, limiter):
+        """Test that checks stay in memory until the store is flushed."""
+        limiter.can_user_use_command(1, -100, "price")
+        assert not os.path.exists(limiter.DB_FILE)
+        
+        assert limiter.rate_limit_store.flush() == 1
+        conn = sqlite3.connect(limiter.DB_FILE)
+        rows = conn.execute("SELECT user_id, chat_id, command_name FROM command_requests").fetchall()
+        conn.close()
+        assert rows == [(1, -100, "price")]
+
+
+
+class TestMessageOwnership:
+    """Test buffered message ownership registration."""
+    
+    def test_owner_served_before_flush(self, limiter):
+        """Test that a registered owner is visible before the batch is written."""
+        limiter.register_message(7, -100, 501)
+        assert not os.path.exists(limiter.DB_FILE)
+        assert limiter.get_message_owner(-100, 501) == 7
+        assert limiter.can_delete_message(7, -100, 501)
+        assert not limiter.can_delete_message(8, -100, 501)
+    
+    def test_batch_written_in_one_flush(self, limiter):
+        """Test that buffered rows land in SQLite on flush."""
+        for message_id in range(10):
+            limiter.register_message(7, -100, message_id)
+        limiter.register_linked_message(7, -100, 0, 900)
+        
+        assert limiter.message_writer.flush() == 11
+        assert limiter.get_message_ownership_stats() == {"total_messages": 10, "total_linked_messages": 1}
+        assert limiter.get_linked_messages(-100, 0) == [900]
+    
+    def test_linked_messages_read_without_flush(self, limiter):
+        """Test that buffered links are returned without writing the batch."""
+        limiter.register_linked_message(7, -100, 0, 900)
+        assert limiter.get_linked_messages(-100, 0) == [900]
+        assert not os.path.exists(limiter.DB_FILE)
+        
+        limiter.message_writer.flush()
+        limiter.register_linked_message(7, -100, 0, 901)
+        assert limiter.get_linked_messages(-100, 0) == [900, 901]
+    
+    def test_cleanup_removes_expired_rows(self, limiter):
+        """Test that cleanup deletes only rows older than the cutoff."""
+        old = int(time.time()) - 48 * 3600
+        limiter.message_writer.add_owner(1, -100, 7, old)
+        limiter.register_message(7, -100, 2)
+        limiter.message_writer.flush()
+        
+        limiter.cleanup_old_message_ownership(max_age_hours=24)
+        assert limiter.get_message_owner(-100, 1) is None
+        assert limiter.get_message_owner(-100, 2) == 7
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+Tests for the refresh orchestrator job graph.
+"""
+import pytest
+import os
+import sys
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import schedulers.refresh_orchestrator as refresh_orchestrator
+from schedulers.refresh_orchestrator import (
+    Job, RefreshOrchestrator, STATUS_OK, STATUS_FAILED, STATUS_SKIPPED, full_sweep_due
+)
+
+
+class TestRefreshOrchestrator:
+    """Test job ordering, failure handling and overlap protection."""
+
+    def test_dependencies_run_first_and_share_state(self):
+        """Test that jobs see the results of the jobs they depend on."""
+        order = []
+
+        def fetch(state):
+            order.append("fetch")
+            return {"price": 5}
+
+        def render(state):
+            order.append("render")
+            return state["fetch"]["price"] * 2
+
+        orchestrator = RefreshOrchestrator([
+            Job("render", render, depends=["fetch"]),
+            Job("fetch", fetch),
+        ])
+        report = orchestrator.run_cycle()
+
+        assert order == ["fetch", "render"]
+        assert orchestrator.state["render"] == 10
+        assert report["jobs"]["render"]["status"] == STATUS_OK
+
+    def test_failed_dependency_skips_dependents(self):
+        """Test that a failed job skips hard dependents but not soft ones."""
+        def fail(state):
+            raise RuntimeError("upstream down")
+
+        ran = []
+        orchestrator = RefreshOrchestrator([
+            Job("fetch", fail),
+            Job("render", lambda state: ran.append("render"), depends=["fetch"]),
+            Job("publish", lambda state: ran.append("publish"), after=["render"]),
+        ])
+        report = orchestrator.run_cycle()
+
+        assert report["jobs"]["fetch"]["status"] == STATUS_FAILED
+        assert report["jobs"]["render"]["status"] == STATUS_SKIPPED
+        assert ran == ["publish"]
+
+    def test_overlapping_cycle_is_skipped(self):
+        """Test that a cycle started while one is running is skipped."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(state):
+            started.set()
+            release.wait(timeout=5)
+
+        orchestrator = RefreshOrchestrator([Job("slow", slow)])
+        thread = threading.Thread(target=orchestrator.run_cycle)
+        thread.start()
+        started.wait(timeout=5)
+
+        assert orchestrator.run_cycle() is None
+        assert orchestrator.start_cycle() is False
+        release.set()
+        thread.join(timeout=5)
+        assert orchestrator.cycle_count == 1
+
+    def test_invalid_graph_rejected(self):
+        """Test that unknown dependencies and cycles are rejected up front."""
+        with pytest.raises(ValueError):
+            RefreshOrchestrator([Job("a", lambda state: None, depends=["missing"])])
+        with pytest.raises(ValueError):
+            RefreshOrchestrator([
+                Job("a", lambda state: None, depends=["b"]),
+                Job("b", lambda state: None, depends=["a"]),
+            ])
+
+
+class TestStickerFullSweep:
+    """Test when every sticker card is re-rendered instead of only changed ones."""
+
+    def test_first_cycle_sweeps(self):
+        """Test that a fresh process renders every card once."""
+        assert full_sweep_due({}) is True
+
+    def test_sweep_after_interval(self, monkeypatch):
+        """Test that a sweep is due only once the interval has passed."""
+        monkeypatch.setattr(refresh_orchestrator, "STICKER_FULL_SWEEP_HOURS", 6)
+        state = {"last_full_sticker_sweep": 1000.0}
+        assert full_sweep_due(state, now=1000.0 + 5 * 3600) is False
+        assert full_sweep_due(state, now=1000.0 + 6 * 3600) is True
+
+    def test_sweep_disabled(self, monkeypatch):
+        """Test that a zero interval turns off periodic sweeps."""
+        monkeypatch.setattr(refresh_orchestrator, "STICKER_FULL_SWEEP_HOURS", 0)
+        assert full_sweep_due({"last_full_sticker_sweep": 0.0}, now=10 ** 9) is False
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -4,6 +4,8 @@ Tests for sticker integration functionality.
 import pytest
 import os
 import sys
+import time
+import asyncio
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -44,5 +46,131 @@ class TestStickerNameNormalization:
         assert normalized == "dogs_og", f"Expected 'dogs_og', got '{normalized}'"
 
 
+class TestStickerPriceIndex:
+    """Test the one-pass price index over a stats snapshot."""
+    
+    def test_index_matches_per_sticker_lookup(self):
+        """Test that snapshot lookups use the same normalization as the API helper."""
+        sticker_api = pytest.importorskip("services.stickers_tools_api")
+        stats = {"collections": {
+            "1": {"name": "Dogs OG", "stickers": [
+                {"name": "Sheikh", "floor_price_ton": "12.5", "floor_price_usd": 40, "supply": 500},
+                {"issuer": "metadata only"}
+            ]}
+        }}
+        index = sticker_api.build_price_index(stats)
+        
+        assert list(index) == [("dogs_og", "sheikh")]
+        assert index[("dogs_og", "sheikh")]["floor_price_ton"] == 12.5
+        assert index[("dogs_og", "sheikh")]["supply"] == 500
+
+
+class TestStickerPriceUpdate:
+    """Test joining a price index into the stored sticker list."""
+    
+    def test_join_reports_changed_stickers(self):
+        """Test that only stickers with new displayed values are reported as changed."""
+        updater = pytest.importorskip("schedulers.update_sticker_prices")
+        stickers = [
+            {"collection": "Dogs OG", "sticker": "Sheikh", "price": 10.0},
+            {"collection": "Dogs OG", "sticker": "King", "price": 5.0, "price_usd": 15.0, "supply": 100,
+             "init_price_usd": 2.0, "median_price_ton": 6.0, "median_price_usd": 18.0},
+            {"collection": "Dogs OG", "sticker": "Unlisted", "price": 1.0},
+        ]
+        index = {
+            ("dogs_og", "sheikh"): {"floor_price_ton": 12.5, "floor_price_usd": 40.0, "supply": 500,
+                                    "initial_supply": 1000, "init_price_usd": 3.0,
+                                    "median_price_ton": 13.0, "median_price_usd": 41.0},
+            ("dogs_og", "king"): {"floor_price_ton": 5.0, "floor_price_usd": 15.0, "supply": 100,
+                                  "initial_supply": 200, "init_price_usd": 2.0,
+                                  "median_price_ton": 6.0, "median_price_usd": 18.0},
+        }
+        changed, updated, skipped = updater.apply_price_index(stickers, index)
+        
+        assert changed == [("Dogs OG", "Sheikh")]
+        assert (updated, skipped) == (2, 1)
+        assert stickers[0]["price"] == 12.5
+        assert stickers[0]["init_price_usd"] == 3.0
+        assert stickers[2]["price"] == 1.0
+
+
+class TestStickerCatalog:
+    """Test the sticker catalog served from the price snapshot."""
+    
+    def test_catalog_follows_published_snapshot(self, tmp_path, monkeypatch):
+        """Test that accessors read the current snapshot and return copies."""
+        sticker_integration = pytest.importorskip("services.sticker_integration")
+        from services import price_snapshot
+        path = str(tmp_path / "sticker_prices.snapshot")
+        monkeypatch.setattr(sticker_integration, "STICKER_PRICE_SNAPSHOT_FILE", path)
+        price_snapshot.write_snapshot(path, [
+            {"collection": "Dogs OG", "sticker": "Sheikh", "price": 1.0},
+            {"collection": "Blum", "sticker": "Cap", "price": 2.0},
+            {"collection": "Dogs OG", "sticker": "King", "price": 3.0},
+        ])
+        
+        assert sticker_integration.get_sticker_collections() == ["Blum", "Dogs OG"]
+        assert sticker_integration.get_stickers_in_collection("Dogs OG") == ["King", "Sheikh"]
+        sticker_integration.get_sticker_collections().append("Mutated")
+        assert sticker_integration.get_sticker_collections() == ["Blum", "Dogs OG"]
+        
+        price_snapshot.write_snapshot(path, [{"collection": "Blum", "sticker": "Bunny", "price": 1.0}])
+        assert sticker_integration.get_sticker_collections() == ["Blum"]
+        assert sticker_integration.get_stickers_in_collection("Dogs OG") == []
+    
+    def test_render_prices_read_from_snapshot(self, tmp_path, monkeypatch):
+        """Test that on-demand renders look prices up in the snapshot, never upstream."""
+        sticker_integration = pytest.importorskip("services.sticker_integration")
+        from services import price_snapshot
+        path = str(tmp_path / "sticker_prices.snapshot")
+        monkeypatch.setattr(sticker_integration, "STICKER_PRICE_SNAPSHOT_FILE", path)
+        
+        def upstream():
+            raise AssertionError("stickers.tools should not be called")
+        
+        monkeypatch.setattr(sticker_integration.sticker_api, "get_sticker_stats", upstream)
+        price_snapshot.write_snapshot(path, [
+            {"collection": "Dogs OG", "sticker": "Sheikh", "price": 12.5, "supply": 500, "init_price_usd": 3.0},
+            {"collection": "Blum", "sticker": "Cap", "price": 0},
+        ])
+        
+        info = sticker_integration._sticker_price_info("dogs og", "Sheikh")
+        assert (info["floor_price_ton"], info["supply"], info["init_price_usd"]) == (12.5, 500, 3.0)
+        assert sticker_integration._sticker_price_info("Blum", "Cap") is None
+        assert sticker_integration._sticker_price_info("Blum", "Bunny") is None
+
+
+class TestStickerCardRendering:
+    """Test in-process rendering of missing and stale sticker cards."""
+    
+    def test_fresh_card_served_stale_card_rendered(self, tmp_path, monkeypatch):
+        """Test that only missing or stale cards go to the render daemon."""
+        sticker_integration = pytest.importorskip("services.sticker_integration")
+        monkeypatch.setattr(sticker_integration.freshness, "DB_FILE", str(tmp_path / "freshness.db"))
+        rendered = []
+        
+        def fake_render(key, collection, sticker):
+            rendered.append(key)
+            path = tmp_path / key
+            path.write_bytes(b"card")
+            return str(path)
+        
+        daemon = sticker_integration.RenderDaemon(fake_render, workers=1, name="test-sticker-render")
+        monkeypatch.setattr(sticker_integration, "sticker_render_daemon", daemon)
+        monkeypatch.setattr(sticker_integration, "STICKER_CARDS_DIR", str(tmp_path))
+        
+        card = tmp_path / "dogs_og_sheikh_price_card.webp"
+        card.write_bytes(b"old")
+        assert asyncio.run(sticker_integration.get_sticker_card_path("Dogs OG", "Sheikh")) == str(card)
+        assert rendered == []
+        
+        stale = time.time() - (sticker_integration.freshness.DEFAULT_REFRESH_MINUTES + 1) * 60
+        os.utime(card, (stale, stale))
+        assert asyncio.run(sticker_integration.get_sticker_card_path("Dogs OG", "Sheikh")) == str(card)
+        assert asyncio.run(sticker_integration.get_sticker_card_path("Blum", "Cap")) == str(tmp_path / "blum_cap_price_card.webp")
+        assert rendered == ["dogs_og_sheikh_price_card.webp", "blum_cap_price_card.webp"]
+        daemon.stop()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+Tests for the shared SQLite connection manager.
+"""
+import pytest
+import os
+import sys
+import sqlite3
+import threading
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import storage
+
+
+class TestSharedConnections:
+    """Test per-thread connection reuse."""
+    
+    def test_connection_uses_wal(self, tmp_path):
+        """Test that connections are opened in WAL mode."""
+        conn = storage.connect(str(tmp_path / "test.db"))
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    
+    def test_close_keeps_connection_for_thread(self, tmp_path):
+        """Test that close() rolls back but the connection is reused."""
+        db_file = str(tmp_path / "test.db")
+        conn = storage.connect(db_file)
+        conn.execute("CREATE TABLE items (id INTEGER)")
+        conn.execute("INSERT INTO items VALUES (1)")
+        conn.close()
+        
+        again = storage.connect(db_file)
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+    
+    def test_open_transaction_rolled_back_with_warning(self, tmp_path, caplog):
+        """Test that writes left uncommitted on a shared connection are not dropped silently."""
+        db_file = str(tmp_path / "test.db")
+        conn = storage.connect(db_file)
+        conn.execute("CREATE TABLE items (id INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO items VALUES (1)")
+        
+        with caplog.at_level("WARNING", logger="core.storage"):
+            again = storage.connect(db_file)
+        assert again.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+        assert "uncommitted changes" in caplog.text
+    
+    def test_threads_get_their_own_connection(self, tmp_path):
+        """Test that each thread has a separate connection."""
+        db_file = str(tmp_path / "test.db")
+        main_conn = storage.connect(db_file)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(storage.connect(db_file)))
+        thread.start()
+        thread.join()
+        assert other[0] is not main_conn
+
+
+class TestMigrations:
+    """Test run-once schema migrations."""
+    
+    def test_migration_runs_once(self, tmp_path):
+        """Test that a migration only runs the first time it is requested."""
+        db_file = str(tmp_path / "test.db")
+        calls = []
+        
+        def migrate():
+            calls.append(1)
+            conn = storage.connect(db_file)
+            conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER)")
+            conn.commit()
+            conn.close()
+        
+        storage.run_migration(db_file, "items", migrate)
+        storage.run_migration(db_file, "items", migrate)
+        assert len(calls) == 1
+
+
+
+class TestSnapshots:
+    """Test online database snapshots."""
+    
+    def test_snapshot_includes_uncheckpointed_writes(self, tmp_path):
+        """Test that a snapshot contains rows still sitting in the WAL."""
+        db_file = str(tmp_path / "live.db")
+        conn = storage.connect(db_file)
+        conn.execute("CREATE TABLE items (id INTEGER)")
+        conn.execute("INSERT INTO items VALUES (1)")
+        conn.commit()
+        
+        copy_file = str(tmp_path / "copy.db")
+        storage.snapshot(db_file, copy_file)
+        copy = sqlite3.connect(copy_file)
+        assert copy.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+        copy.close()
+    
+    def test_signature_changes_on_write(self, tmp_path):
+        """Test that writes change the content signature."""
+        db_file = str(tmp_path / "live.db")
+        conn = storage.connect(db_file)
+        conn.execute("CREATE TABLE items (id INTEGER)")
+        conn.commit()
+        before = storage.content_signature(db_file)
+        conn.execute("INSERT INTO items VALUES (1)")
+        conn.commit()
+        assert storage.content_signature(db_file) != before
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
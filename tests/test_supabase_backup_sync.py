@@ -0,0 +1,149 @@
+"""
+Tests for the incremental Supabase backup sync (SQLite side only).
+"""
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("dotenv")
+
+from core import storage
+from schedulers import supabase_backup_sync
+from schedulers.supabase_backup_sync import SupabaseBackupSync
+
+COLUMNS = ['user_id', 'chat_id', 'gift_name', 'minute']
+
+
+@pytest.fixture
+def sqlite_conn(tmp_path):
+    """A user_requests table with two rows in a temporary database."""
+    conn = storage.connect(str(tmp_path / "user_requests.db"))
+    conn.execute('''
+        CREATE TABLE user_requests (
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            gift_name TEXT NOT NULL,
+            minute INTEGER NOT NULL,
+            PRIMARY KEY (user_id, chat_id, gift_name)
+        )
+    ''')
+    conn.executemany("INSERT INTO user_requests VALUES (?, ?, ?, ?)",
+                     [(1, 10, "Plush Pepe", 100), (2, 10, "Durov's Cap", 100)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def sync(syncer, sqlite_conn):
+    return syncer.sync_table(sqlite_conn, None, 'user_requests', COLUMNS)
+
+
+class TestWatermark:
+    """Test that only changed rows are shipped and the watermark moves on success."""
+
+    def test_only_changed_rows_fetched_after_sync(self, sqlite_conn):
+        """Test that the first sync ships every row and later ones only changed rows."""
+        syncer = SupabaseBackupSync()
+        rows, high_seq = syncer.fetch_changed_rows(sqlite_conn, 'user_requests', COLUMNS)
+        assert len(rows) == 2
+        syncer.mark_synced(sqlite_conn, 'user_requests', high_seq)
+
+        assert syncer.fetch_changed_rows(sqlite_conn, 'user_requests', COLUMNS)[0] == []
+        sqlite_conn.execute("UPDATE user_requests SET minute = 101 WHERE user_id = 1")
+        sqlite_conn.commit()
+        rows, _ = syncer.fetch_changed_rows(sqlite_conn, 'user_requests', COLUMNS)
+        assert rows == [(1, 10, "Plush Pepe", 101)]
+
+    def test_failed_batch_keeps_watermark(self, sqlite_conn, monkeypatch):
+        """Test that a statement-level failure sends the same rows again next run."""
+        syncer = SupabaseBackupSync()
+
+        def broken(pg_conn, upsert_query, rows):
+            raise RuntimeError('relation "user_requests" does not exist')
+
+        monkeypatch.setattr(syncer, "upsert_rows", broken)
+        assert sync(syncer, sqlite_conn)["aborted"]
+
+        sent = []
+
+        def upsert(pg_conn, upsert_query, rows):
+            sent.extend(rows)
+            return len(rows), []
+
+        monkeypatch.setattr(syncer, "upsert_rows", upsert)
+        assert sync(syncer, sqlite_conn) == {"synced": 2, "errors": 0}
+        assert len(sent) == 2
+        assert sync(syncer, sqlite_conn) == {"synced": 0, "errors": 0}
+
+    def test_rejected_rows_quarantined_and_skipped(self, sqlite_conn, monkeypatch):
+        """Test that rows Supabase rejects are quarantined and the watermark moves past them."""
+        syncer = SupabaseBackupSync()
+        monkeypatch.setattr(syncer, "upsert_rows",
+                            lambda pg_conn, query, rows: (len(rows) - 1, [(rows[0], "value too long")]))
+
+        assert sync(syncer, sqlite_conn) == {"synced": 1, "errors": 1}
+        quarantined = sqlite_conn.execute("SELECT table_name, error FROM sync_quarantine").fetchall()
+        assert quarantined == [('user_requests', 'value too long')]
+        assert syncer.fetch_changed_rows(sqlite_conn, 'user_requests', COLUMNS)[0] == []
+
+    def test_quarantine_capped(self, sqlite_conn, monkeypatch):
+        """Test that only the newest SYNC_QUARANTINE_MAX_ROWS rejected rows are kept."""
+        monkeypatch.setattr(supabase_backup_sync, "SYNC_QUARANTINE_MAX_ROWS", 3)
+        syncer = SupabaseBackupSync()
+        syncer.ensure_change_tracking(sqlite_conn, 'user_requests')
+        syncer.quarantine_rows(sqlite_conn, 'user_requests', [((i,), "bad") for i in range(5)])
+
+        rows = sqlite_conn.execute("SELECT row_data FROM sync_quarantine ORDER BY id").fetchall()
+        assert rows == [("[2]",), ("[3]",), ("[4]",)]
+
+
+class TestUpsertRows:
+    """Test which upsert errors are treated as bad rows."""
+
+    class Connection:
+        closed = 0
+
+        def cursor(self):
+            return None
+
+        def commit(self):
+            pass
+
+        def rollback(self):
+            pass
+
+    def test_row_errors_retried_per_row(self, monkeypatch):
+        """Test that a DataError narrows down to the rejected row."""
+        psycopg2 = pytest.importorskip("psycopg2")
+        import psycopg2.extras
+
+        def execute_values(cursor, query, rows, page_size):
+            if (2,) in rows:
+                raise psycopg2.DataError("invalid input syntax")
+
+        monkeypatch.setattr(psycopg2.extras, "execute_values", execute_values)
+        synced, failed = SupabaseBackupSync().upsert_rows(self.Connection(), "query", [(1,), (2,), (3,)])
+        assert synced == 2
+        assert [row for row, _ in failed] == [(2,)]
+
+    def test_statement_errors_raised(self, monkeypatch):
+        """Test that errors breaking every statement are not retried row by row."""
+        psycopg2 = pytest.importorskip("psycopg2")
+        import psycopg2.extras
+        calls = []
+
+        def execute_values(cursor, query, rows, page_size):
+            calls.append(rows)
+            raise psycopg2.ProgrammingError('relation "rate_limit_user_requests" does not exist')
+
+        monkeypatch.setattr(psycopg2.extras, "execute_values", execute_values)
+        with pytest.raises(psycopg2.ProgrammingError):
+            SupabaseBackupSync().upsert_rows(self.Connection(), "query", [(1,), (2,)])
+        assert len(calls) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])